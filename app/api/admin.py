@@ -0,0 +1,76 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.core.logger import get_logger
+from app.query.retriever import get_retriever
+from app.schemas.admin import RevokeTokenRequest
+from app.security.jwt_auth import require_group, token_verifier
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+logger = get_logger()
+
+ADMIN_GROUP = os.getenv("ADMIN_GROUP", "RAG-App-Admins")
+
+
+require_admin = require_group(ADMIN_GROUP, detail="Admin privileges required")
+
+
+@router.post("/reload-index", summary="Hot-swap to the latest published index")
+def reload_index(user=Depends(require_admin)):
+    """
+    Load the version referenced by the vector store manifest and swap it in
+    without downtime. No-op if that version is already being served.
+    """
+    retriever = get_retriever()
+    swapped = retriever.reload()
+
+    logger.info(
+        f"user={user.get('sub', 'unknown')} action=reload_index "
+        f"swapped={swapped} version={retriever.version}"
+    )
+
+    return {"swapped": swapped, "version": retriever.version}
+
+
+@router.post("/revoke-token", summary="Deny a JWT before it expires")
+def revoke_token(req: RevokeTokenRequest, user=Depends(require_admin)):
+    """
+    Add a token (or every token with a jti) to this worker's deny-list.
+    For all workers, list it in JWT_DENYLIST_FILE instead.
+    """
+    if not req.token and not req.jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a token or a jti",
+        )
+
+    token_verifier.revoke(token=req.token, jti=req.jti, expires_at=req.exp)
+
+    logger.info(
+        f"user={user.get('sub', 'unknown')} action=revoke_token "
+        f"jti={req.jti or '-'} token={'yes' if req.token else 'no'}"
+    )
+
+    return {"revoked": True}
+
+
+@router.post("/clear-revocation", summary="Accept a revoked JWT again")
+def clear_revocation(req: RevokeTokenRequest, user=Depends(require_admin)):
+    """
+    Remove a token (or jti) from this worker's deny-list. Entries without
+    an expiry (JWT_MAX_TOKEN_LIFETIME_SECONDS=0) stay until cleared here.
+    """
+    if not req.token and not req.jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a token or a jti",
+        )
+
+    token_verifier.clear_revocation(token=req.token, jti=req.jti)
+
+    logger.info(
+        f"user={user.get('sub', 'unknown')} action=clear_revocation "
+        f"jti={req.jti or '-'} token={'yes' if req.token else 'no'}"
+    )
+
+    return {"cleared": True}
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
+
+from app.core import metrics
+from app.query.retriever import get_retriever
 ### Azure changes
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -7,4 +11,26 @@ router = APIRouter(prefix="/health", tags=["health"])
 async def health():
     """Simple health endpoint returning service status and timestamp."""
     return {"status": "ok", "timestamp": datetime.utcnow().isoformat() + "Z"}
- 
+
+
+@router.get("/ready", summary="Readiness check")
+async def ready():
+    """Readiness endpoint: 200 once the retriever is loaded and warmed up, 503 otherwise."""
+    retriever = get_retriever()
+    is_ready = retriever.ready
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "loading",
+            "retriever_ready": is_ready,
+            "index_version": retriever.version,
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+        },
+    )
+
+
+@router.get("/metrics", summary="In-process metrics")
+async def metrics_snapshot():
+    """Counters and histograms of this worker process (batching, caches, ...)."""
+    return metrics.snapshot()
+
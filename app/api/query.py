@@ -1,24 +1,200 @@
+import asyncio
+import json
 import time
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from app.schemas.query import QueryRequest, QueryResponse
 from app.security.jwt_auth import verify_jwt
 from app.core.logger import get_logger
+from app.core import metrics
 
+from app.ingestion.dedup import SOURCE_FILES_FIELD
 from app.query.clean_question import clean_question
-from app.query.retriever import retrieve_chunks
+from app.query.retriever import get_retriever
 from app.query.context_builder import build_context
 from app.query.confidence import calculate_confidence
 from app.query.llm_runner import get_rag_chain
 from app.query.prompt_builder import build_chat_prompt
+from app.query.token_budget import count_tokens
+from app.query.answer_cache import ANSWER_CACHE_ENABLED, answer_cache, history_key
+from app.query.reranker import RERANK_CANDIDATES, RERANK_TOP_K, get_reranker
+from app.query.sessions import Session, append_turn, get_session_store
+from app.query.followup import (
+    remember_retrieval,
+    retrieval_scope,
+    reusable_chunks,
+    standalone_question,
+)
 
 router = APIRouter(prefix="/query", tags=["Query"])
 logger = get_logger()
 
 rag_chain = get_rag_chain()
 
+NO_RELEVANT_DOCS_ANSWER = "No relevant information found in the knowledge base."
+
+_prompt_tokens = metrics.histogram(
+    "prompt_tokens",
+    [250, 500, 1000, 1500, 2000, 2500, 3000, 4000],
+    "Tokens per LLM prompt (context + history + question)",
+)
+
+
+async def _retrieve(
+    question: str,
+    user: dict,
+    session: Session,
+    filters: Optional[dict] = None,
+):
+    """
+    Retrieve docs + similarity scores from the resident index (loaded at startup).
+    Embedding + FAISS search run on the retriever's own executor. Only chunks
+    the user's JWT groups may see (document ACLs) are searched. With the
+    reranker on, more candidates are fetched and the best are kept.
+    Follow-ups are searched as standalone questions, or answered from the
+    previous turn's chunks when they add nothing those chunks lack.
+    """
+    retriever = get_retriever()
+    if not retriever.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Knowledge base is still loading",
+        )
+
+    groups = user.get("groups", [])
+    scope = retrieval_scope(retriever.version, filters, groups)
+    search_question, follow_up = await standalone_question(question, session)
+    if follow_up:
+        reused = reusable_chunks(question, session, scope)
+        if reused is not None:
+            return reused
+
+    reranker = get_reranker()
+
+    try:
+        retrieved = await retriever.asearch(
+            search_question,
+            top_k=RERANK_CANDIDATES if reranker else 4,
+            filters=filters,
+            groups=groups,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if reranker is not None:
+        retrieved = await reranker.arerank(search_question, retrieved, top_k=RERANK_TOP_K)
+
+    remember_retrieval(session, retrieved, scope)
+    return retrieved
+
+
+def _extract_sources(retrieved) -> list:
+    # Deduplicated chunks carry every file they appear in (source_files)
+    return list({
+        source
+        for doc, _ in retrieved
+        for source in (
+            doc.metadata.get(SOURCE_FILES_FIELD) or [doc.metadata.get("source_file")]
+        )
+        if source
+    })
+
+
+async def _open_session(req: QueryRequest, user_id: str) -> Session:
+    """
+    The request's server-side session (a new one when it has none, or an
+    unknown, expired or other user's id). Clients that send their own
+    chat_history without a session_id, or sessions being off, get a
+    stateless session over that history.
+    """
+    store = get_session_store()
+    if store is None or (req.session_id is None and req.chat_history):
+        return Session(None, user_id, list(req.chat_history))
+
+    if req.session_id:
+        session = await asyncio.to_thread(store.get, req.session_id)
+        if session is not None and session.user == user_id:
+            return session
+        logger.info(f"user={user_id} action=session_expired")
+
+    return store.create(user_id)
+
+
+async def _record_turn(session: Session, question: str, answer: str) -> None:
+    store = get_session_store()
+    if session.id is None or store is None or not answer:
+        return
+
+    append_turn(session, question, answer)
+    try:
+        await asyncio.to_thread(store.save, session)
+    except Exception as e:
+        logger.error(f"user={session.user} action=session_save failed error={e}")
+
+
+def _answer_group(retrieved, session: Session):
+    """
+    Answer-cache group: index version + retrieved chunk ids + recent history.
+    """
+    return answer_cache.group_key(
+        get_retriever().version or "",
+        [doc.id or "" for doc, _ in retrieved],
+        history_key(session.messages, summary=session.summary),
+    )
+
+
+async def _lookup_answer(question: str, group):
+    """
+    Exact match first; the question is only embedded for the semantic
+    layer when answers for the same chunks are cached.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    entry = answer_cache.get_exact(group, question)
+    if entry is None and answer_cache.has_candidates(group):
+        embedding = await get_retriever().aembed_query(question)
+        entry = answer_cache.get_semantic(group, embedding)
+
+    if entry is None:
+        answer_cache.record_miss()
+    return entry
+
+
+async def _store_answer(question: str, group, answer: str, confidence: float, sources: list):
+    if not ANSWER_CACHE_ENABLED or not answer:
+        return
+
+    embedding = await get_retriever().aembed_query(question)
+    answer_cache.put(group, question, answer, confidence, sources, embedding)
+
+
+def _build_prompt(question: str, session: Session, retrieved):
+    """
+    Token-budgeted prompt for the retrieved chunks and recent history,
+    with its token count.
+    """
+    prompt = build_chat_prompt(
+        question=question,
+        chat_history=session.messages,
+        context=build_context(retrieved),
+        summary=session.summary,
+    )
+    prompt_tokens = count_tokens(prompt, memoize=False)
+    _prompt_tokens.observe(prompt_tokens)
+    return prompt, prompt_tokens
+
+
+def _sse(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
 @router.post("/", response_model=QueryResponse)
-def query_knowledge(
+async def query_knowledge(
     req: QueryRequest,
     user=Depends(verify_jwt),
 ):
@@ -29,37 +205,51 @@ def query_knowledge(
 
     # 1️⃣ Clean question
     question = clean_question(req.question)
+    session = await _open_session(req, user_id)
 
     # 2️⃣ Retrieve docs + similarity scores
-    retrieved = retrieve_chunks(question)
+    retrieved = await _retrieve(question, user, session, req.filters)
 
     # Guard: no relevant documents found
     if not retrieved:
         logger.warning(
             f"user={user_id} action=query no_relevant_docs"
         )
+        await _record_turn(session, question, NO_RELEVANT_DOCS_ANSWER)
         return QueryResponse(
-            answer="No relevant information found in the knowledge base.",
+            answer=NO_RELEVANT_DOCS_ANSWER,
             confidence=0.0,
-            sources=[]
+            sources=[],
+            session_id=session.id,
         )
 
     # 3️⃣ Confidence calculation
     scores = [score for _, score in retrieved]
     confidence = calculate_confidence(scores)
 
-    # 4️⃣ Build document context
-    context = build_context(retrieved)
+    # Reuse a cached answer for the same / a paraphrased question on the same chunks
+    group = _answer_group(retrieved, session)
+    cached = await _lookup_answer(question, group)
+    if cached is not None:
+        await _record_turn(session, question, cached.answer)
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"user={user_id} action=query success cache=hit "
+            f"confidence={confidence} duration_ms={duration_ms}"
+        )
+        return QueryResponse(
+            answer=cached.answer,
+            confidence=confidence,
+            sources=_extract_sources(retrieved),
+            session_id=session.id,
+        )
 
-    # 5️⃣ Build conversational (ChatGPT-style) prompt
-    prompt = build_chat_prompt(
-        question=question,
-        chat_history=req.chat_history,
-        context=context,
-    )
+    # 4️⃣ + 5️⃣ Build document context + conversational (ChatGPT-style) prompt,
+    # within the prompt token budget
+    prompt, prompt_tokens = _build_prompt(question, session, retrieved)
 
-    # 6️⃣ LLM call (single prompt string)
-    llm_response = rag_chain.invoke(prompt)
+    # 6️⃣ LLM call (single prompt string, async: no thread held while waiting)
+    llm_response = await rag_chain.ainvoke(prompt)
 
     # Normalize response
     answer = (
@@ -69,21 +259,99 @@ def query_knowledge(
     )
 
     # 7️⃣ Extract sources
-    sources = list({
-        doc.metadata.get("source_file")
-        for doc, _ in retrieved
-        if doc.metadata.get("source_file")
-    })
+    sources = _extract_sources(retrieved)
+
+    await _store_answer(question, group, answer, confidence, sources)
+    await _record_turn(session, question, answer)
 
     duration_ms = int((time.time() - start_time) * 1000)
 
     logger.info(
         f"user={user_id} action=query success "
-        f"confidence={confidence} duration_ms={duration_ms}"
+        f"confidence={confidence} prompt_tokens={prompt_tokens} "
+        f"duration_ms={duration_ms}"
     )
 
     return QueryResponse(
         answer=answer,
         confidence=confidence,
-        sources=sources
+        sources=sources,
+        session_id=session.id,
+    )
+
+
+@router.post("/stream")
+async def query_knowledge_stream(
+    req: QueryRequest,
+    user=Depends(verify_jwt),
+):
+    """
+    Streaming variant of /query over Server-Sent Events:
+    `meta` (confidence + sources + session_id) as soon as retrieval finishes,
+    then one `token` event per LLM chunk, then `done` (or `error`).
+    """
+    start_time = time.time()
+    user_id = user.get("sub", "unknown")
+
+    logger.info(f"user={user_id} action=query_stream start")
+
+    question = clean_question(req.question)
+    session = await _open_session(req, user_id)
+    retrieved = await _retrieve(question, user, session, req.filters)
+
+    cached, group, prompt, prompt_tokens = None, None, None, 0
+    if retrieved:
+        confidence = calculate_confidence([score for _, score in retrieved])
+        sources = _extract_sources(retrieved)
+
+        group = _answer_group(retrieved, session)
+        cached = await _lookup_answer(question, group)
+        if cached is None:
+            prompt, prompt_tokens = _build_prompt(question, session, retrieved)
+    else:
+        logger.warning(f"user={user_id} action=query_stream no_relevant_docs")
+        confidence, sources = 0.0, []
+
+    async def event_stream():
+        yield _sse(
+            "meta",
+            {"confidence": float(confidence), "sources": sources, "session_id": session.id},
+        )
+
+        if cached is not None:
+            yield _sse("token", {"text": cached.answer})
+            await _record_turn(session, question, cached.answer)
+        elif prompt is None:
+            yield _sse("token", {"text": NO_RELEVANT_DOCS_ANSWER})
+            await _record_turn(session, question, NO_RELEVANT_DOCS_ANSWER)
+        else:
+            parts = []
+            try:
+                async for chunk in rag_chain.astream(prompt):
+                    text = chunk.content if hasattr(chunk, "content") else str(chunk)
+                    if text:
+                        parts.append(text)
+                        yield _sse("token", {"text": text})
+            except Exception as e:
+                logger.error(f"user={user_id} action=query_stream llm_error error={e}")
+                yield _sse("error", {"detail": "LLM generation failed"})
+                return
+
+            answer = "".join(parts)
+            await _store_answer(question, group, answer, confidence, sources)
+            await _record_turn(session, question, answer)
+
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"user={user_id} action=query_stream success "
+            f"cache={'hit' if cached is not None else 'miss'} "
+            f"confidence={confidence} prompt_tokens={prompt_tokens} "
+            f"duration_ms={duration_ms}"
+        )
+        yield _sse("done", {"duration_ms": duration_ms})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
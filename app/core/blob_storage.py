@@ -1,8 +1,30 @@
 # app/core/blob_storage.py
 
+import base64
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from azure.storage.blob import BlobServiceClient
+from typing import Dict, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.storage.blob import BlobBlock, BlobServiceClient, ContentSettings
+
+from app.core.logger import get_logger
+
+# Parallel blob transfers
+BLOB_SYNC_WORKERS = int(os.getenv("BLOB_SYNC_WORKERS", "8"))
+
+# Bytes per streamed download chunk / staged upload block
+BLOB_SYNC_CHUNK_SIZE = int(os.getenv("BLOB_SYNC_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Local record of what has been downloaded (etag/size per blob)
+SYNC_STATE_FILE = ".blob_sync_state.json"
+PARTIAL_SUFFIX = ".part"
+
+logger = get_logger()
 
 
 def _get_blob_service():
@@ -14,34 +36,335 @@ def _get_blob_service():
     return BlobServiceClient.from_connection_string(conn_str)
 
 
-def download_container(container_name: str, target_dir: Path):
+def _get_container(container_name: str, container=None):
+    """
+    Return a ContainerClient. Tests can pass any object with the same
+    interface (e.g. an in-process stub or an Azurite-backed client).
+    """
+    if container is not None:
+        return container
+    return _get_blob_service().get_container_client(container_name)
+
+
+def _file_md5(path: Path, chunk_size: int = BLOB_SYNC_CHUNK_SIZE) -> bytes:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def _remote_md5(blob) -> Optional[bytes]:
+    settings = getattr(blob, "content_settings", None)
+    md5 = getattr(settings, "content_md5", None) if settings else None
+    return bytes(md5) if md5 else None
+
+
+class _SyncState:
+    """
+    Thread-safe {blob name: {"etag", "size"}} map persisted next to the data,
+    used to skip unchanged blobs without hashing local files.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.entries: Dict[str, dict] = {}
+
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text())
+            except ValueError:
+                self.entries = {}
+
+    def get(self, name: str) -> Optional[dict]:
+        with self._lock:
+            return self.entries.get(name)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._dirty += 1
+
+    def set(self, name: str, entry: dict) -> None:
+        with self._lock:
+            self.entries[name] = entry
+            self._dirty += 1
+            if self._dirty >= 50:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.entries))
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+
+def _download_blob(
+    container,
+    blob,
+    target_dir: Path,
+    state: _SyncState,
+    chunk_size: int,
+) -> str:
+    local_file = target_dir / blob.name
+    size = blob.size
+    etag = blob.etag
+
+    # 1. Skip if the local copy already matches
+    if local_file.exists() and local_file.stat().st_size == size:
+        recorded = state.get(blob.name)
+        if recorded and recorded.get("etag") == etag:
+            return "skipped"
+
+        remote_md5 = _remote_md5(blob)
+        if remote_md5 and _file_md5(local_file, chunk_size) == remote_md5:
+            state.set(blob.name, {"etag": etag, "size": size})
+            return "skipped"
+
+    local_file.parent.mkdir(parents=True, exist_ok=True)
+    part_file = local_file.with_name(local_file.name + PARTIAL_SUFFIX)
+    etag_file = local_file.with_name(local_file.name + PARTIAL_SUFFIX + ".etag")
+
+    # 2. Resume a previous partial download of the same blob version
+    offset = 0
+    if (
+        part_file.exists()
+        and etag_file.exists()
+        and etag_file.read_text() == etag
+        and part_file.stat().st_size <= size
+    ):
+        offset = part_file.stat().st_size
+    else:
+        part_file.unlink(missing_ok=True)
+        etag_file.write_text(etag)
+
+    # 3. Stream the rest to disk in chunks (never buffer the whole blob)
+    if offset < size:
+        downloader = container.get_blob_client(blob.name).download_blob(
+            offset=offset,
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified,
+            max_concurrency=1,
+        )
+        with open(part_file, "ab") as f:
+            for data in downloader.chunks():
+                f.write(data)
+    else:
+        part_file.touch()
+
+    os.replace(part_file, local_file)
+    etag_file.unlink(missing_ok=True)
+    state.set(blob.name, {"etag": etag, "size": size})
+    return "resumed" if offset else "downloaded"
+
+
+def _is_stale(name: str, listed: set, prefix: str) -> bool:
+    """
+    True if name is under prefix and its blob (partial downloads, .part and
+    .part.etag, belong to their blob) is not in listed.
+    """
+    if not name.startswith(prefix):
+        return False
+    blob_name = name
+    for suffix in (PARTIAL_SUFFIX, PARTIAL_SUFFIX + ".etag"):
+        if name.endswith(suffix):
+            blob_name = name[:-len(suffix)]
+    return blob_name not in listed
+
+
+def _prune_local(
+    target_dir: Path,
+    listed: set,
+    state: _SyncState,
+    prefix: str,
+) -> int:
+    """
+    Delete local files (and their sync state) under prefix whose blob is
+    no longer in the container. Returns the number of files deleted.
+    """
+    deleted = 0
+    for local_file in sorted(target_dir.rglob("*"), reverse=True):
+        name = local_file.relative_to(target_dir).as_posix()
+        if local_file.is_dir() or not _is_stale(name, listed, prefix):
+            continue
+        if name in (SYNC_STATE_FILE, SYNC_STATE_FILE + ".tmp"):
+            continue
+
+        local_file.unlink()
+        state.discard(name)
+        deleted += 1
+
+    for name in [name for name in state.entries if _is_stale(name, listed, prefix)]:
+        state.discard(name)
+
+    # Directories emptied by the pruning
+    for directory in sorted(target_dir.rglob("*"), reverse=True):
+        if (
+            directory.is_dir()
+            and directory.relative_to(target_dir).as_posix().startswith(prefix)
+            and not any(directory.iterdir())
+        ):
+            directory.rmdir()
+    return deleted
+
+
+def download_container(
+    container_name: str,
+    target_dir: Path,
+    container=None,
+    max_workers: int = BLOB_SYNC_WORKERS,
+    chunk_size: int = BLOB_SYNC_CHUNK_SIZE,
+    prefix: str = "",
+    prune: bool = True,
+) -> Dict[str, int]:
     """
-    Download all blobs from a container into a local directory.
+    Sync the blobs under prefix from a container into a local directory.
+    Transfers run concurrently and stream to disk; blobs whose local copy
+    already matches (etag, or size + MD5) are skipped, and interrupted
+    downloads resume from their .part file. With prune, local files under
+    prefix whose blob was deleted are removed too (after a complete sync),
+    so incremental builds drop their documents.
     """
-    service = _get_blob_service()
-    container = service.get_container_client(container_name)
+    container = _get_container(container_name, container)
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    state = _SyncState(target_dir / SYNC_STATE_FILE)
 
-    for blob in container.list_blobs():
-        local_file = target_dir / blob.name
-        local_file.parent.mkdir(parents=True, exist_ok=True)
+    stats = {"downloaded": 0, "resumed": 0, "skipped": 0, "deleted": 0}
+    try:
+        blobs = list(container.list_blobs(name_starts_with=prefix or None))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_download_blob, container, blob, target_dir, state, chunk_size)
+                for blob in blobs
+            ]
+            for future in futures:
+                stats[future.result()] += 1
 
-        with open(local_file, "wb") as f:
-            f.write(container.download_blob(blob.name).readall())
+        if prune:
+            stats["deleted"] = _prune_local(
+                target_dir, {blob.name for blob in blobs}, state, prefix
+            )
+    finally:
+        state.save()
 
+    logger.info(f"action=blob_download container={container_name} {stats}")
+    return stats
 
-def upload_directory(container_name: str, source_dir: Path):
+
+def _block_id(index: int, md5: bytes) -> str:
+    return base64.b64encode(f"{index:06d}-{md5.hex()[:16]}".encode()).decode()
+
+
+def _upload_file(
+    container,
+    file: Path,
+    blob_path: str,
+    remote: Dict[str, Tuple[int, Optional[bytes]]],
+    chunk_size: int,
+) -> str:
+    size = file.stat().st_size
+    md5 = _file_md5(file, chunk_size)
+
+    # 1. Skip if the remote blob already has this content
+    if remote.get(blob_path) == (size, md5):
+        return "skipped"
+
+    blob_client = container.get_blob_client(blob_path)
+    content_settings = ContentSettings(content_md5=bytearray(md5))
+
+    if size <= chunk_size:
+        with open(file, "rb") as f:
+            blob_client.upload_blob(f, overwrite=True, content_settings=content_settings)
+        return "uploaded"
+
+    # 2. Large files: stage fixed-size blocks; blocks already staged by an
+    #    interrupted run (same content => same block ids) are not re-sent
+    try:
+        _, uncommitted = blob_client.get_block_list(block_list_type="uncommitted")
+        staged = {block.id: block.size for block in uncommitted}
+    except Exception:
+        staged = {}
+
+    block_ids = []
+    resumed = False
+    with open(file, "rb") as f:
+        for index, data in enumerate(iter(lambda: f.read(chunk_size), b"")):
+            block_id = _block_id(index, md5)
+            block_ids.append(BlobBlock(block_id=block_id))
+            if staged.get(block_id) == len(data):
+                resumed = True
+                continue
+            blob_client.stage_block(block_id, data)
+
+    blob_client.commit_block_list(block_ids, content_settings=content_settings)
+    return "resumed" if resumed else "uploaded"
+
+
+def upload_directory(
+    container_name: str,
+    source_dir: Path,
+    container=None,
+    max_workers: int = BLOB_SYNC_WORKERS,
+    chunk_size: int = BLOB_SYNC_CHUNK_SIZE,
+    publish_last: Tuple[str, ...] = ("manifest.json",),
+    prune_prefix: Optional[str] = None,
+) -> Dict[str, int]:
     """
-    Upload all files from a local directory to a Blob container.
+    Sync all files from a local directory to a Blob container.
+    Files whose remote copy has the same size and MD5 are skipped. Files
+    named in publish_last (e.g. the index manifest) are uploaded only after
+    everything else, so readers never see a manifest pointing at missing data.
+    With prune_prefix (e.g. "versions/"), remote blobs under it that no
+    longer exist locally are deleted last, once the manifest no longer
+    points at them.
     """
-    service = _get_blob_service()
-    container = service.get_container_client(container_name)
+    container = _get_container(container_name, container)
+    source_dir = Path(source_dir)
+
+    remote = {
+        blob.name: (blob.size, _remote_md5(blob))
+        for blob in container.list_blobs()
+    }
 
-    for file in source_dir.rglob("*"):
-        if file.is_file():
-            blob_path = file.relative_to(source_dir).as_posix()
-            with open(file, "rb") as f:
-                container.upload_blob(
-                    blob_path,
-                    f,
-                    overwrite=True
+    files = [
+        file for file in sorted(source_dir.rglob("*"))
+        if file.is_file()
+        and file.name != SYNC_STATE_FILE
+        and not file.name.endswith(PARTIAL_SUFFIX)
+    ]
+    first = [f for f in files if f.relative_to(source_dir).as_posix() not in publish_last]
+    last = [f for f in files if f.relative_to(source_dir).as_posix() in publish_last]
+
+    stats = {"uploaded": 0, "resumed": 0, "skipped": 0, "deleted": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for group in (first, last):
+            futures = [
+                executor.submit(
+                    _upload_file,
+                    container,
+                    file,
+                    file.relative_to(source_dir).as_posix(),
+                    remote,
+                    chunk_size,
                 )
+                for file in group
+            ]
+            for future in futures:
+                stats[future.result()] += 1
+
+        if prune_prefix is not None:
+            local = {file.relative_to(source_dir).as_posix() for file in files}
+            stale = [name for name in remote if _is_stale(name, local, prune_prefix)]
+            for future in [executor.submit(container.delete_blob, name) for name in stale]:
+                future.result()
+            stats["deleted"] = len(stale)
+
+    logger.info(f"action=blob_upload container={container_name} {stats}")
+    return stats
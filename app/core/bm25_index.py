@@ -0,0 +1,207 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from app.core.chunk_store import memmap_array
+
+# BM25 inverted index over the chunk store rows (row i = FAISS vector i):
+# bm25.json      {"docs", "terms", "avgdl", "k1", "b"}
+# bm25.vocab     terms, one per line (line number = term id)
+# bm25.offsets   uint64 start of each term's postings (terms + 1)
+# bm25.rows      uint32 chunk rows, ascending within a term
+# bm25.tf        uint16 term frequency per posting
+# bm25.doclen    uint32 token count per row
+BM25_HEADER_FILE = "bm25.json"
+BM25_VOCAB_FILE = "bm25.vocab"
+BM25_OFFSETS_FILE = "bm25.offsets"
+BM25_ROWS_FILE = "bm25.rows"
+BM25_TF_FILE = "bm25.tf"
+BM25_DOCLEN_FILE = "bm25.doclen"
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Terms in more than this fraction of chunks carry almost no signal and
+# have the longest postings: skipped at query time
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))
+
+# Words, numbers and codes such as "HR-POL-012", "form 27b" or "v2.3"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens. Codes are kept whole ("hr-pol-012") and also split
+    into their parts, so both "HR-POL-012" and "pol 012" match.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if _SPLIT_RE.search(token):
+            tokens.extend(part for part in _SPLIT_RE.split(token) if part)
+    return tokens
+
+
+class BM25Writer:
+    """
+    Builds the inverted index from chunk texts added in row order. Only
+    the compact postings (row, tf arrays per term) are held until close().
+    """
+
+    def __init__(self, directory: Path, k1: float = BM25_K1, b: float = BM25_B):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doclen = array("I")
+
+    def add(self, text: str) -> None:
+        row = len(self._doclen)
+        tokens = tokenize(text)
+        self._doclen.append(len(tokens))
+
+        for term, tf in Counter(tokens).items():
+            rows, tfs = self._postings.setdefault(term, (array("I"), array("H")))
+            rows.append(row)
+            tfs.append(min(tf, 65535))
+
+    def close(self) -> int:
+        """
+        Write the index files. Returns the number of distinct terms.
+        """
+        directory = self.directory
+        postings, doclen = self._postings, self._doclen
+        vocab = sorted(postings)
+        offsets = array("Q", [0])
+
+        with open(directory / BM25_ROWS_FILE, "wb") as rows_file, \
+                open(directory / BM25_TF_FILE, "wb") as tf_file:
+            for term in vocab:
+                rows, tfs = postings[term]
+                rows.tofile(rows_file)
+                tfs.tofile(tf_file)
+                offsets.append(offsets[-1] + len(rows))
+
+        with open(directory / BM25_VOCAB_FILE, "w", encoding="utf-8") as f:
+            f.write("\n".join(vocab))
+        with open(directory / BM25_OFFSETS_FILE, "wb") as f:
+            offsets.tofile(f)
+        with open(directory / BM25_DOCLEN_FILE, "wb") as f:
+            doclen.tofile(f)
+
+        with open(directory / BM25_HEADER_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "docs": len(doclen),
+                    "terms": len(vocab),
+                    "avgdl": (sum(doclen) / len(doclen)) if doclen else 0.0,
+                    "k1": self.k1,
+                    "b": self.b,
+                },
+                f,
+            )
+
+        return len(vocab)
+
+
+def write_bm25_index(
+    directory: Path,
+    texts: Iterable[str],
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+) -> int:
+    """
+    Build the inverted index for chunk texts given in row order.
+    Returns the number of distinct terms.
+    """
+    writer = BM25Writer(directory, k1, b)
+    for text in texts:
+        writer.add(text)
+    return writer.close()
+
+
+def has_bm25_index(directory: Path) -> bool:
+    return (Path(directory) / BM25_HEADER_FILE).exists()
+
+
+class BM25Index:
+    """
+    Read-only BM25 index. Postings are memory-mapped; the vocabulary,
+    idf and per-row length normalization are loaded once.
+    """
+
+    def __init__(self, directory: Path, max_df_ratio: float = BM25_MAX_DF_RATIO):
+        directory = Path(directory)
+
+        with open(directory / BM25_HEADER_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.docs = header["docs"]
+        self.k1 = header["k1"]
+
+        with open(directory / BM25_VOCAB_FILE, "r", encoding="utf-8") as f:
+            vocab = f.read().split("\n") if header["terms"] else []
+        self._vocab = {term: term_id for term_id, term in enumerate(vocab)}
+
+        self._offsets = np.fromfile(directory / BM25_OFFSETS_FILE, dtype=np.uint64)
+        self._rows = memmap_array(directory / BM25_ROWS_FILE, np.uint32)
+        self._tf = memmap_array(directory / BM25_TF_FILE, np.uint16)
+
+        df = np.diff(self._offsets).astype(np.float64)
+        self._idf = np.log(1 + (self.docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self._max_df = max(1, math.ceil(max_df_ratio * self.docs))
+        self._df = df
+
+        doclen = np.fromfile(directory / BM25_DOCLEN_FILE, dtype=np.uint32)
+        avgdl = header["avgdl"] or 1.0
+        b = header["b"]
+        self._norm = (self.k1 * (1 - b + b * doclen / avgdl)).astype(np.float32)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 20,
+        row_filter=None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunk rows by BM25 score: (rows, scores), best first.
+        row_filter (a RowFilter) restricts the rows before ranking.
+        """
+        term_ids = {
+            self._vocab[token] for token in tokenize(query) if token in self._vocab
+        }
+
+        row_parts, score_parts = [], []
+        for term_id in term_ids:
+            if self._df[term_id] > self._max_df:
+                continue
+            start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+            rows = self._rows[start:end]
+            tf = self._tf[start:end].astype(np.float32)
+            row_parts.append(rows)
+            score_parts.append(
+                self._idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[rows])
+            )
+
+        if not row_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if row_filter is not None:
+            keep = row_filter.contains(rows)
+            rows, scores = rows[keep], scores[keep]
+
+        if len(rows) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order].astype(np.int64), scores[order].astype(np.float32)
@@ -0,0 +1,207 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Columnar chunk store, rows in FAISS index row order (row i = vector i):
+# chunks.json       {"rows": n, "metadata": [unique metadata dicts]}
+# chunks.ids        concatenated UTF-8 chunk ids
+# chunks.ids.idx    uint64 byte offsets into chunks.ids (n + 1)
+# chunks.text       concatenated UTF-8 chunk texts
+# chunks.text.idx   uint64 byte offsets into chunks.text (n + 1)
+# chunks.meta.idx   uint32 position of each row's metadata in chunks.json (n)
+CHUNK_HEADER_FILE = "chunks.json"
+CHUNK_IDS_FILE = "chunks.ids"
+CHUNK_IDS_INDEX_FILE = "chunks.ids.idx"
+CHUNK_TEXT_FILE = "chunks.text"
+CHUNK_TEXT_INDEX_FILE = "chunks.text.idx"
+CHUNK_META_INDEX_FILE = "chunks.meta.idx"
+
+CHUNK_STORE_FILES = (
+    CHUNK_HEADER_FILE,
+    CHUNK_IDS_FILE,
+    CHUNK_IDS_INDEX_FILE,
+    CHUNK_TEXT_FILE,
+    CHUNK_TEXT_INDEX_FILE,
+    CHUNK_META_INDEX_FILE,
+)
+
+
+class ChunkStoreWriter:
+    """
+    Streams (chunk id, text, metadata) rows to disk. Metadata dicts are
+    deduplicated: chunks of the same file/page share one stored dict.
+    Only offsets and metadata references are held per row until close().
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._ids = open(self.directory / CHUNK_IDS_FILE, "wb")
+        self._text = open(self.directory / CHUNK_TEXT_FILE, "wb")
+        self._id_offsets: List[int] = [0]
+        self._text_offsets: List[int] = [0]
+        self._meta_refs: List[int] = []
+        self._metadata: List[dict] = []
+        self._metadata_index: Dict[str, int] = {}
+
+    def add(self, chunk_id: str, text: str, metadata: dict) -> None:
+        encoded_id = chunk_id.encode("utf-8")
+        self._ids.write(encoded_id)
+        self._id_offsets.append(self._id_offsets[-1] + len(encoded_id))
+
+        encoded_text = text.encode("utf-8")
+        self._text.write(encoded_text)
+        self._text_offsets.append(self._text_offsets[-1] + len(encoded_text))
+
+        self._meta_refs.append(self._metadata_ref(metadata))
+
+    def _metadata_ref(self, metadata: dict) -> int:
+        key = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+        ref = self._metadata_index.get(key)
+        if ref is None:
+            ref = self._metadata_index[key] = len(self._metadata)
+            self._metadata.append(json.loads(key))
+        return ref
+
+    def __len__(self) -> int:
+        return len(self._meta_refs)
+
+    def metadata(self, row: int) -> dict:
+        return dict(self._metadata[self._meta_refs[row]])
+
+    def set_metadata(self, row: int, metadata: dict) -> None:
+        """
+        Replace the metadata of a row already written (until close).
+        """
+        self._meta_refs[row] = self._metadata_ref(metadata)
+
+    def close(self) -> int:
+        """
+        Flush everything to disk. Returns the number of rows written.
+        """
+        for f in (self._ids, self._text):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        np.asarray(self._id_offsets, dtype=np.uint64).tofile(
+            self.directory / CHUNK_IDS_INDEX_FILE
+        )
+        np.asarray(self._text_offsets, dtype=np.uint64).tofile(
+            self.directory / CHUNK_TEXT_INDEX_FILE
+        )
+        np.asarray(self._meta_refs, dtype=np.uint32).tofile(
+            self.directory / CHUNK_META_INDEX_FILE
+        )
+
+        rows = len(self._meta_refs)
+        with open(self.directory / CHUNK_HEADER_FILE, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "metadata": self._metadata}, f, ensure_ascii=False)
+        return rows
+
+
+def write_chunk_store(
+    directory: Path,
+    rows: Iterable[Tuple[str, str, dict]],
+) -> int:
+    """
+    Write (chunk id, text, metadata) rows, in index row order.
+    Returns the number of rows.
+    """
+    writer = ChunkStoreWriter(directory)
+    for chunk_id, text, metadata in rows:
+        writer.add(chunk_id, text, metadata)
+    return writer.close()
+
+
+def has_chunk_store(directory: Path) -> bool:
+    return (Path(directory) / CHUNK_HEADER_FILE).exists()
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {sys.intern(k): _intern(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_intern(v) for v in value]
+    return value
+
+
+def memmap_array(path: Path, dtype) -> np.ndarray:
+    """
+    Read-only 1-d memory map of a file (np.memmap cannot map an empty one).
+    """
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class ChunkStore:
+    """
+    Read-only chunk store. Offset tables and texts are memory-mapped
+    (shared through the OS page cache by every worker process) and only
+    the rows a search returns are decoded. The small table of distinct
+    metadata dicts is loaded once, with keys and values interned.
+    """
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+
+        with open(directory / CHUNK_HEADER_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self._metadata: List[dict] = [_intern(meta) for meta in header["metadata"]]
+        self._rows = header["rows"]
+
+        self._ids = memmap_array(directory / CHUNK_IDS_FILE, np.uint8)
+        self._id_offsets = memmap_array(directory / CHUNK_IDS_INDEX_FILE, np.uint64)
+        self._text = memmap_array(directory / CHUNK_TEXT_FILE, np.uint8)
+        self._text_offsets = memmap_array(directory / CHUNK_TEXT_INDEX_FILE, np.uint64)
+        self._meta_refs = memmap_array(directory / CHUNK_META_INDEX_FILE, np.uint32)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @staticmethod
+    def _slice(data: np.ndarray, offsets: np.ndarray, row: int) -> str:
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return str(memoryview(data[start:end]), "utf-8")
+
+    def chunk_id(self, row: int) -> str:
+        return self._slice(self._ids, self._id_offsets, row)
+
+    def text(self, row: int) -> str:
+        return self._slice(self._text, self._text_offsets, row)
+
+    def metadata(self, row: int) -> dict:
+        # Shallow copy: callers may add keys without touching the shared dict
+        return dict(self._metadata[self._meta_refs[row]])
+
+    def document(self, row: int) -> Document:
+        return Document(
+            id=self.chunk_id(row),
+            page_content=self.text(row),
+            metadata=self.metadata(row),
+        )
+
+    @property
+    def distinct_metadata(self) -> List[dict]:
+        """
+        The deduplicated metadata dicts (shared: do not modify).
+        """
+        return self._metadata
+
+    @property
+    def metadata_refs(self) -> np.ndarray:
+        """
+        Per-row position in distinct_metadata.
+        """
+        return self._meta_refs
+
+    def __iter__(self) -> Iterator[Document]:
+        for row in range(self._rows):
+            yield self.document(row)
@@ -0,0 +1,171 @@
+import os
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Single place the embedding model is configured (build script, API, helpers)
+EMBEDDING_MODEL_NAME = os.getenv(
+    "EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"
+)
+
+# "torch" (sentence-transformers) or "onnx" (ONNX Runtime, no torch import)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+# Exported model dir for the onnx backend: model_quantized.onnx (int8) or
+# model.onnx, plus tokenizer.json
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", "./models/minilm-onnx")
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "256"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+# Min cosine similarity to the torch vectors for the onnx backend to pass
+EMBEDDING_TOLERANCE = float(os.getenv("EMBEDDING_TOLERANCE", "0.99"))
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers MiniLM on ONNX Runtime: mean pooling over the
+    attention mask + L2 normalization, as in the torch pipeline.
+    Texts are sorted by token length and batched, and each batch is only
+    padded to its own longest text.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path = Path(EMBEDDING_ONNX_PATH),
+        model_name: str = EMBEDDING_MODEL_NAME,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+        threads: int = EMBEDDING_THREADS,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / "model_quantized.onnx"
+        quantized = model_path.exists()
+        if not quantized:
+            model_path = model_dir / "model.onnx"
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+
+        self.batch_size = max(1, batch_size)
+        output_dim = self.session.get_outputs()[0].shape[-1]
+        self.dim = output_dim if isinstance(output_dim, int) else None
+        # Vectors differ slightly from torch: cache them under their own id
+        self.model_id = f"{model_name}#onnx{'-int8' if quantized else ''}"
+
+    def _embed_batch(self, encodings) -> np.ndarray:
+        length = max(len(e.ids) for e in encodings)
+
+        def _padded(rows):
+            out = np.zeros((len(rows), length), dtype=np.int64)
+            for i, row in enumerate(rows):
+                out[i, :len(row)] = row
+            return out
+
+        inputs = {
+            "input_ids": _padded([e.ids for e in encodings]),
+            "attention_mask": _padded([e.attention_mask for e in encodings]),
+            "token_type_ids": _padded([e.type_ids for e in encodings]),
+        }
+        feed = {name: value for name, value in inputs.items() if name in self._input_names}
+        hidden = self.session.run(None, feed)[0]
+
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+
+        vectors = None
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            batch_vectors = self._embed_batch([encodings[i] for i in batch])
+            if vectors is None:
+                vectors = np.zeros((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch] = batch_vectors
+
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def create_embedder(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    backend: str = EMBEDDING_BACKEND,
+) -> Embeddings:
+    """
+    Embedding model for the configured backend.
+    """
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name=model_name)
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (torch or onnx)")
+
+    # Imported lazily so the onnx backend never loads torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def embedding_model_id(embedder: Embeddings, model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    """
+    Cache key namespace of an embedder's vectors.
+    """
+    return getattr(embedder, "model_id", model_name)
+
+
+def embedding_dim(embedder: Embeddings) -> int:
+    """
+    Vector size of an embedder (`dim` attribute, or one probe embedding).
+    """
+    dim = getattr(embedder, "dim", None)
+    if isinstance(dim, int):
+        return dim
+    return len(embedder.embed_query("dimension probe"))
+
+
+def compare_embedders(
+    reference: Embeddings,
+    candidate: Embeddings,
+    texts: List[str],
+) -> dict:
+    """
+    Cosine similarity and max abs difference of candidate vs reference vectors.
+    """
+    expected = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    actual = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "max_abs_diff": round(float(np.abs(expected - actual).max()), 5),
+    }
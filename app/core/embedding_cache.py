@@ -0,0 +1,432 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core import metrics
+from app.core.embedding_backend import embedding_dim, embedding_model_id
+from app.core.logger import get_logger
+
+# Directory of the persistent ingestion embedding cache ("" disables it);
+# one subdirectory per (model id, vector size)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./_embedding_cache")
+
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+KEY_SIZE = 16
+
+logger = get_logger()
+
+
+def embedding_key(model_name: str, text: str) -> bytes:
+    """
+    Content address of an embedding: hash of model name + normalized text.
+    Whitespace runs are collapsed, which the tokenizer ignores anyway.
+    """
+    normalized = re.sub(r"\s+", " ", text).strip()
+    digest = hashlib.sha256(f"{model_name}\0{normalized}".encode("utf-8"))
+    return digest.digest()[:KEY_SIZE]
+
+
+class EmbeddingCache:
+    """
+    Append-only, content-addressed embedding cache on disk.
+
+    meta.json    model id and vector size the directory holds
+    keys.bin     N fixed-size (16 byte) keys, in row order
+    vectors.f32  N x dim float32 matrix, memory-mapped for reads
+
+    Vectors are appended before their keys, so a crash mid-write leaves
+    at most some unreferenced trailing rows, which are truncated on open.
+    Anything else (other model / size, fewer vectors than keys) raises
+    ValueError. Single writer (the build script); not safe for concurrent writers.
+    """
+
+    def __init__(self, path: Path, model_name: str, dim: int):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.model_name = model_name
+        self.dim = dim
+        self._rows: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self._open()
+
+    def _open(self) -> None:
+        meta_path = self.path / META_FILE
+        meta = {"model": self.model_name, "dim": self.dim}
+        if not meta_path.exists():
+            meta_path.write_text(json.dumps(meta))
+        elif json.loads(meta_path.read_text()) != meta:
+            raise ValueError(
+                f"Embedding cache {self.path} holds {meta_path.read_text()}, not {meta}"
+            )
+
+        keys_path = self.path / KEYS_FILE
+        vectors_path = self.path / VECTORS_FILE
+        if not keys_path.exists() or not vectors_path.exists():
+            return
+
+        keys = keys_path.read_bytes()
+        row_bytes = self.dim * 4
+        rows = len(keys) // KEY_SIZE
+        if vectors_path.stat().st_size < rows * row_bytes:
+            raise ValueError(
+                f"Embedding cache {self.path} has {rows} keys but only "
+                f"{vectors_path.stat().st_size // row_bytes} vectors of size {self.dim}"
+            )
+
+        # Drop anything a crashed writer left behind
+        if len(keys) != rows * KEY_SIZE:
+            with open(keys_path, "r+b") as f:
+                f.truncate(rows * KEY_SIZE)
+        if vectors_path.stat().st_size != rows * row_bytes:
+            with open(vectors_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+
+        self._rows = {
+            keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(rows)
+        }
+        self._map_vectors()
+
+    def _map_vectors(self) -> None:
+        rows = len(self._rows)
+        self._vectors = (
+            np.memmap(
+                self.path / VECTORS_FILE,
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, self.dim),
+            )
+            if rows
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self._vectors[row]
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """
+        Append new (key, vector) pairs. Keys already present are skipped.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim or len(vectors) != len(keys):
+            raise ValueError(
+                f"Expected {len(keys)} vectors of size {self.dim}, got shape {vectors.shape}"
+            )
+
+        new_keys: Dict[bytes, int] = {}
+        for i, key in enumerate(keys):
+            if key not in self._rows and key not in new_keys:
+                new_keys[key] = i
+
+        if not new_keys:
+            return
+
+        with open(self.path / VECTORS_FILE, "ab") as f:
+            f.write(vectors[list(new_keys.values())].tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.path / KEYS_FILE, "ab") as f:
+            f.write(b"".join(new_keys))
+
+        start = len(self._rows)
+        for offset, key in enumerate(new_keys):
+            self._rows[key] = start + offset
+        self._map_vectors()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults the on-disk cache before running
+    the model, and only embeds the texts it has never seen.
+    """
+
+    def __init__(self, embedder: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [self.cache.get(key) for key in keys]
+
+        # Embed each distinct missing text once
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, results):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            computed = np.asarray(
+                self.embedder.embed_documents(list(missing.values())),
+                dtype=np.float32,
+            )
+            self.cache.put_many(list(missing), computed)
+            by_key = dict(zip(missing, computed))
+            results = [
+                vector if vector is not None else by_key[key]
+                for key, vector in zip(keys, results)
+            ]
+
+        return [np.asarray(vector).tolist() for vector in results]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedder.embed_query(text)
+
+
+def get_ingestion_embedder(
+    model_name: str,
+    embedder: Embeddings,
+    cache_path: str = EMBEDDING_CACHE_PATH,
+) -> Embeddings:
+    """
+    Wrap an embedder with the persistent cache (if enabled). Vectors are
+    keyed by the embedder's backend-specific model id, in a directory of
+    that model id and vector size.
+    """
+    if not cache_path:
+        return embedder
+
+    model_id = embedding_model_id(embedder, model_name)
+    return CachedEmbeddings(
+        embedder,
+        get_embedding_cache(model_id, embedding_dim(embedder), cache_path),
+        model_id,
+    )
+
+
+_caches: Dict[Path, EmbeddingCache] = {}
+
+
+def cache_dir(cache_path: str, model_name: str, dim: int) -> Path:
+    """
+    Subdirectory of the cache for one model id and vector size.
+    """
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+    return Path(cache_path) / f"{slug}-{dim}d"
+
+
+def get_embedding_cache(
+    model_name: str,
+    dim: int,
+    cache_path: str = EMBEDDING_CACHE_PATH,
+) -> EmbeddingCache:
+    """
+    Return the process-wide cache for a model id and vector size (opened once).
+    """
+    path = cache_dir(cache_path, model_name, dim)
+    if path not in _caches:
+        _caches[path] = EmbeddingCache(path, model_name, dim)
+    return _caches[path]
+
+
+def log_cache_stats(cache_path: str = EMBEDDING_CACHE_PATH) -> None:
+    for path, cache in _caches.items():
+        if path.parent == Path(cache_path):
+            logger.info(f"action=embedding_cache dir={path.name} {cache.stats()}")
+
+
+# -----------------------------
+# Query-embedding cache (serving)
+# -----------------------------
+# In-process LRU entries (question embeddings are ~1.5 KB each)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+
+# Optional SQLite file shared by all uvicorn workers on the host ("" disables it)
+QUERY_EMBEDDING_CACHE_DB = os.getenv("QUERY_EMBEDDING_CACHE_DB", "")
+
+_query_hits_memory = metrics.counter("query_embedding_cache_hits_memory", "In-process LRU hits")
+_query_hits_shared = metrics.counter("query_embedding_cache_hits_shared", "Shared (SQLite) tier hits")
+_query_misses = metrics.counter("query_embedding_cache_misses", "Questions embedded by the model")
+
+
+class _SharedEmbeddingTier:
+    """
+    Small SQLite table of key -> float32 bytes, so workers on the same host
+    reuse each other's query embeddings. WAL mode allows concurrent readers.
+    Hits refresh used_at in batches, so trimming drops the least recently used.
+    """
+
+    # Hits buffered before their used_at is written
+    TOUCH_BATCH = 64
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._touched: set = set()
+        self._touch_lock = threading.Lock()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings "
+            "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, used_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._conn().execute(
+            "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        with self._touch_lock:
+            self._touched.add(key)
+            full = len(self._touched) >= self.TOUCH_BATCH
+        if full:
+            self._flush_touched()
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _flush_touched(self) -> None:
+        with self._touch_lock:
+            keys, self._touched = self._touched, set()
+        if keys:
+            now = time.time()
+            self._conn().executemany(
+                "UPDATE query_embeddings SET used_at = ? WHERE key = ?",
+                [(now, key) for key in keys],
+            )
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), time.time()),
+        )
+
+        # Trim to the most recently used entries now and then
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._flush_touched()
+            conn.execute(
+                "DELETE FROM query_embeddings WHERE key NOT IN "
+                "(SELECT key FROM query_embeddings ORDER BY used_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded question -> float32 embedding cache keyed by (model name,
+    cleaned question). In-process LRU, optionally backed by a shared
+    SQLite tier. Errors in the shared tier never fail a query.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+        shared_path: str = QUERY_EMBEDDING_CACHE_DB,
+    ):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared = (
+            _SharedEmbeddingTier(shared_path, max_entries * 10) if shared_path else None
+        )
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                _query_hits_memory.inc()
+                return vector
+
+        if self._shared is not None:
+            try:
+                vector = self._shared.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"action=query_embedding_cache shared_get_failed error={e}")
+                vector = None
+            if vector is not None:
+                self._remember(key, vector)
+                _query_hits_shared.inc()
+                return vector
+
+        _query_misses.inc()
+        return None
+
+    def put(self, key: bytes, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+
+        if self._shared is not None:
+            try:
+                self._shared.put(key, vector)
+            except sqlite3.Error as e:
+                logger.warning(f"action=query_embedding_cache shared_put_failed error={e}")
+
+    def embed(self, embedder: Embeddings, model_name: str, questions: List[str]) -> np.ndarray:
+        """
+        Embeddings for questions as a float32 matrix; only cache misses
+        go through the model, in one batch.
+        """
+        keys = [embedding_key(model_name, question) for question in questions]
+        vectors: List[Optional[np.ndarray]] = [self.get(key) for key in keys]
+
+        missing: Dict[bytes, str] = {}
+        for key, question, vector in zip(keys, questions, vectors):
+            if vector is None and key not in missing:
+                missing[key] = question
+
+        if missing:
+            computed = np.asarray(
+                embedder.embed_documents(list(missing.values())), dtype=np.float32
+            )
+            by_key = dict(zip(missing, computed))
+            for key, vector in by_key.items():
+                self.put(key, vector)
+            vectors = [
+                vector if vector is not None else by_key[key]
+                for key, vector in zip(keys, vectors)
+            ]
+
+        return np.vstack(vectors)
@@ -0,0 +1,153 @@
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.core.logger import get_logger
+
+# FAISS index_factory string used at build time, e.g.
+#   "Flat"            exact search (default)
+#   "IVF1024,Flat"    inverted lists, exact vectors
+#   "IVF1024,PQ48"    inverted lists, product-quantized vectors (48 bytes/vector)
+#   "HNSW32"          graph index
+#   "SQ8"             8-bit scalar quantization (4x smaller than Flat)
+FAISS_INDEX_SPEC = os.getenv("FAISS_INDEX_SPEC", "Flat")
+
+# Vectors sampled uniformly from the whole corpus to train IVF / PQ / SQ indexes
+FAISS_TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", "50000"))
+
+# Query-time knobs (ignored by index types they do not apply to)
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# Memory-map the index file at query time (shared page cache across workers)
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+
+logger = get_logger()
+
+
+def create_index(dim: int, spec: str = FAISS_INDEX_SPEC) -> faiss.Index:
+    """
+    Build an empty (possibly untrained) L2 index from a factory string.
+    """
+    return faiss.index_factory(dim, spec, faiss.METRIC_L2)
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, spec: str) -> faiss.Index:
+    """
+    Train index on a sample. Falls back to an exact Flat index when the
+    sample is too small for the requested structure (e.g. fewer vectors
+    than IVF lists), so small corpora still build.
+    """
+    if index.is_trained:
+        return index
+
+    try:
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+        return index
+    except RuntimeError as e:
+        logger.warning(
+            f"action=index_train spec={spec} vectors={len(vectors)} "
+            f"fallback=Flat error={e}"
+        )
+        return faiss.IndexFlatL2(index.d)
+
+
+def read_index(path, mmap: bool = FAISS_MMAP) -> faiss.Index:
+    """
+    Open a serialized index read-only. With mmap the vector codes stay in
+    the file and are paged in on demand instead of copied into each process.
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return faiss.read_index(str(path), flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def is_hnsw(index: faiss.Index) -> bool:
+    return "HNSW" in type(faiss.downcast_index(index)).__name__
+
+
+def supports_remove_ids(index: faiss.Index) -> bool:
+    """
+    True if deleting vectors compacts the remaining rows (flat-code indexes:
+    Flat, SQ, PQ), which the row -> chunk id mapping relies on. HNSW cannot
+    delete and IVF keeps sparse labels, so incremental builds that drop
+    vectors need a full rebuild for those.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes)
+
+
+def apply_search_params(
+    index: faiss.Index,
+    nprobe: int = FAISS_NPROBE,
+    ef_search: int = FAISS_EF_SEARCH,
+) -> None:
+    """
+    Set query-time recall/latency knobs on a loaded index.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", nprobe)
+    if is_hnsw(index):
+        faiss.ParameterSpace().set_index_parameter(index, "efSearch", ef_search)
+
+
+def search_params(
+    index: faiss.Index,
+    selector: faiss.IDSelector,
+    nprobe: int = FAISS_NPROBE,
+    ef_search: int = FAISS_EF_SEARCH,
+) -> faiss.SearchParameters:
+    """
+    Per-call search parameters restricting results to selector's ids.
+    Per-call parameters replace the index-level knobs, so they are repeated.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    if is_hnsw(index):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_size_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def evaluate_index(
+    index: faiss.Index,
+    exact_index: faiss.Index,
+    queries: np.ndarray,
+    k: int = 4,
+) -> dict:
+    """
+    recall@k of index against exact search, with per-query latency of both.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    start = time.perf_counter()
+    _, exact_ids = exact_index.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, approx_ids = index.search(queries, k)
+    approx_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(
+        len(set(exact_row[exact_row >= 0]) & set(approx_row[approx_row >= 0]))
+        for exact_row, approx_row in zip(exact_ids, approx_ids)
+    )
+    total = int((exact_ids >= 0).sum())
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall": round(hits / total, 4) if total else 1.0,
+        "latency_ms": round(approx_ms, 3),
+        "exact_latency_ms": round(exact_ms, 3),
+        "bytes_per_vector": round(index_size_bytes(index) / max(index.ntotal, 1), 1),
+        "exact_bytes_per_vector": round(
+            index_size_bytes(exact_index) / max(exact_index.ntotal, 1), 1
+        ),
+    }
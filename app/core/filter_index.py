@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.chunk_store import ChunkStore
+
+# Per (metadata field, value) bitsets over chunk rows (row i = FAISS vector i):
+# filters.json      {"rows": n, "fields": {field: {value: slot}}}
+# filters.bitmaps   uint8 [slots, ceil(n / 8)], bit i little-endian = row i
+FILTER_HEADER_FILE = "filters.json"
+FILTER_BITMAPS_FILE = "filters.bitmaps"
+
+# Fields with more distinct values than this are not filterable
+METADATA_FILTER_MAX_VALUES = int(os.getenv("METADATA_FILTER_MAX_VALUES", "256"))
+
+# Per-page fields added by the document loaders, never worth a bitset
+METADATA_FILTER_EXCLUDE = [
+    field.strip()
+    for field in os.getenv(
+        "METADATA_FILTER_EXCLUDE", "page,page_label,total_pages,source,start_index"
+    ).split(",")
+    if field.strip()
+]
+
+# Metadata field listing the groups allowed to see a document (from the YAML);
+# documents without it are visible to every authenticated user
+ACL_FIELD = os.getenv("ACL_FIELD", "allowed_groups")
+
+# Combined selectors kept per distinct (filter set, group set)
+FILTER_SELECTOR_CACHE_SIZE = int(os.getenv("FILTER_SELECTOR_CACHE_SIZE", "256"))
+
+# {field: [accepted values]}: rows must match every field, any of its values
+Filters = Dict[str, List]
+
+
+def value_key(value) -> str:
+    """
+    Canonical string form of a metadata value (same at build and query time).
+    """
+    return json.dumps(value) if isinstance(value, bool) else str(value)
+
+
+def _values(value) -> Iterable:
+    if isinstance(value, (list, tuple, set)):
+        return value
+    return [value]
+
+
+def write_filter_index(
+    directory: Path,
+    chunks: ChunkStore,
+    max_values: int = METADATA_FILTER_MAX_VALUES,
+    exclude: Iterable[str] = METADATA_FILTER_EXCLUDE,
+    always: Iterable[str] = (ACL_FIELD,),
+) -> Dict[str, int]:
+    """
+    Compile the chunk store's metadata into one bitset per (field, value).
+    List values set a bit under each element. Fields in `always` (the ACL
+    field: one bitset per group) are indexed regardless of their number
+    of distinct values.
+    Returns {field: number of values} for the indexed fields.
+    """
+    directory = Path(directory)
+    rows = len(chunks)
+    exclude, always = set(exclude), set(always)
+
+    # Distinct metadata dicts -> the rows that use them
+    refs = np.asarray(chunks.metadata_refs, dtype=np.int64)
+    order = np.argsort(refs, kind="stable")
+    bounds = np.searchsorted(refs[order], np.arange(len(chunks.distinct_metadata) + 1))
+
+    # field -> value -> distinct metadata positions
+    fields: Dict[str, Dict[str, List[int]]] = {}
+    for ref, metadata in enumerate(chunks.distinct_metadata):
+        for field, value in metadata.items():
+            if field in exclude and field not in always:
+                continue
+            for item in _values(value):
+                if isinstance(item, (dict, list)) or item is None:
+                    continue
+                fields.setdefault(field, {}).setdefault(value_key(item), []).append(ref)
+
+    header: Dict[str, Dict[str, int]] = {}
+    slot = 0
+    with open(directory / FILTER_BITMAPS_FILE, "wb") as f:
+        for field in sorted(fields):
+            values = fields[field]
+            if len(values) > max_values and field not in always:
+                continue
+
+            header[field] = {}
+            for value in sorted(values):
+                bits = np.zeros(rows, dtype=bool)
+                for ref in values[value]:
+                    bits[order[bounds[ref]:bounds[ref + 1]]] = True
+                np.packbits(bits, bitorder="little").tofile(f)
+                header[field][value] = slot
+                slot += 1
+
+    with open(directory / FILTER_HEADER_FILE, "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "fields": header}, f, ensure_ascii=False)
+
+    return {field: len(values) for field, values in header.items()}
+
+
+def has_filter_index(directory: Path) -> bool:
+    return (Path(directory) / FILTER_HEADER_FILE).exists()
+
+
+class RowFilter:
+    """
+    A combined bitset over chunk rows plus the FAISS selector reading it.
+    The selector points into `bitmap`, which this object keeps alive.
+    """
+
+    def __init__(self, rows: int, bitmap: np.ndarray):
+        self.bitmap = np.ascontiguousarray(bitmap, dtype=np.uint8)
+        self.selector = faiss.IDSelectorBitmap(rows, faiss.swig_ptr(self.bitmap))
+        self.count = int(np.unpackbits(self.bitmap, bitorder="little")[:rows].sum())
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        return ((self.bitmap[rows >> 3] >> (rows & 7)) & 1).astype(bool)
+
+
+class FilterIndex:
+    """
+    Read-only metadata bitsets (mmap'd). Filters and the caller's ACL
+    groups are combined with vectorized AND / OR over packed bits and
+    cached per (filter set, group set).
+    """
+
+    def __init__(self, directory: Path, cache_size: int = FILTER_SELECTOR_CACHE_SIZE):
+        directory = Path(directory)
+
+        with open(directory / FILTER_HEADER_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.rows = header["rows"]
+        self.fields: Dict[str, Dict[str, int]] = header["fields"]
+
+        width = (self.rows + 7) // 8
+        slots = sum(len(values) for values in self.fields.values())
+        if slots and width:
+            self._bitmaps = np.memmap(
+                directory / FILTER_BITMAPS_FILE, dtype=np.uint8, mode="r",
+                shape=(slots, width),
+            )
+        else:
+            self._bitmaps = np.zeros((slots, width), dtype=np.uint8)
+
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, RowFilter]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._public = None
+
+    @property
+    def has_acl(self) -> bool:
+        return bool(self.fields.get(ACL_FIELD))
+
+    def _public_bitmap(self) -> np.ndarray:
+        # Rows without any ACL group: open to everyone
+        if self._public is None:
+            restricted = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            for slot in self.fields[ACL_FIELD].values():
+                restricted |= self._bitmaps[slot]
+            self._public = ~restricted
+        return self._public
+
+    def acl_bitmap(self, groups: Iterable[str]) -> np.ndarray:
+        """
+        Packed bitset of the rows visible to a user in `groups`.
+        """
+        bits = self._public_bitmap().copy()
+        slots = self.fields[ACL_FIELD]
+        for group in groups:
+            slot = slots.get(value_key(group))
+            if slot is not None:
+                bits |= self._bitmaps[slot]
+        return bits
+
+    @staticmethod
+    def cache_key(filters: Filters) -> Tuple:
+        return tuple(sorted(
+            (field, tuple(sorted({value_key(v) for v in _values(values)})))
+            for field, values in filters.items()
+        ))
+
+    def bitmap(self, filters: Filters) -> np.ndarray:
+        """
+        Packed bitset of the rows matching every field (any listed value).
+        Raises ValueError for a field that has no bitsets.
+        """
+        width = (self.rows + 7) // 8
+        combined = None
+
+        for field, values in filters.items():
+            slots = self.fields.get(field)
+            if slots is None:
+                raise ValueError(f"Metadata field '{field}' is not filterable")
+
+            field_bits = np.zeros(width, dtype=np.uint8)
+            for value in _values(values):
+                slot = slots.get(value_key(value))
+                if slot is not None:
+                    field_bits |= self._bitmaps[slot]
+
+            combined = field_bits if combined is None else combined & field_bits
+
+        if combined is None:
+            combined = np.full(width, 0xFF, dtype=np.uint8)
+        return combined
+
+    def row_filter(
+        self,
+        filters: Optional[Filters] = None,
+        groups: Optional[Iterable[str]] = None,
+    ) -> Optional[RowFilter]:
+        """
+        Cached RowFilter for a filter set and the caller's groups (None
+        when nothing is restricted). groups=None skips ACLs (trusted callers).
+        """
+        filters = filters or {}
+        acl_groups = None
+        if groups is not None and self.has_acl:
+            # Only groups that appear in some ACL change the result
+            acl_groups = frozenset(
+                value_key(g) for g in groups if value_key(g) in self.fields[ACL_FIELD]
+            )
+        if not filters and acl_groups is None:
+            return None
+
+        key = (self.cache_key(filters), acl_groups)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        bitmap = self.bitmap(filters)
+        if acl_groups is not None:
+            bitmap = bitmap & self.acl_bitmap(acl_groups)
+        row_filter = RowFilter(self.rows, bitmap)
+
+        with self._lock:
+            self._cache[key] = row_filter
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return row_filter
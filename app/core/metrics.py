@@ -0,0 +1,93 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Sequence, Union
+
+
+class Counter:
+    """
+    Monotonic in-process counter.
+    """
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self._value}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (cumulative "le" buckets, Prometheus style).
+    """
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = ""):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + [float("inf")], self._counts):
+                running += count
+                cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+            return {
+                "type": "histogram",
+                "count": self._count,
+                "sum": round(self._sum, 4),
+                "buckets": cumulative,
+            }
+
+
+_registry: Dict[str, Union[Counter, Histogram]] = {}
+_registry_lock = threading.Lock()
+
+
+def counter(name: str, description: str = "") -> Counter:
+    """
+    Get or create a process-wide counter.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, description)
+        return _registry[name]
+
+
+def histogram(name: str, buckets: Sequence[float], description: str = "") -> Histogram:
+    """
+    Get or create a process-wide histogram.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, buckets, description)
+        return _registry[name]
+
+
+def snapshot() -> dict:
+    """
+    Current value of every registered metric.
+    """
+    with _registry_lock:
+        metrics = dict(_registry)
+    return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
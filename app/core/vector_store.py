@@ -1,49 +1,495 @@
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from typing import List
+from langchain_core.embeddings import Embeddings
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import faiss
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app.core.bm25_index import BM25Writer, write_bm25_index
+from app.core.chunk_store import ChunkStore, ChunkStoreWriter, has_chunk_store
+from app.core.embedding_backend import EMBEDDING_MODEL_NAME, create_embedder
+from app.core.embedding_cache import get_ingestion_embedder
+from app.core.filter_index import write_filter_index
+from app.core.faiss_index import (
+    FAISS_INDEX_SPEC,
+    FAISS_TRAIN_SIZE,
+    apply_search_params,
+    create_index,
+    evaluate_index,
+    supports_remove_ids,
+    train_index,
+)
+
+# Chunks embedded and added to the index per batch during ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+
+# Raw FAISS index file inside a version directory
+INDEX_FILE = "index.faiss"
+
+# Vectors of indexes that need training, kept on disk until trained
+TRAIN_SPILL_FILE = ".train_vectors.f32"
+
+# Indexed vectors reused as queries when reporting recall against exact search
+RECALL_QUERIES = 200
 
 
 def create_faiss_vectorstore(
     docs: List[Document],
-    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    model_name: str = EMBEDDING_MODEL_NAME,
+    ids: Optional[List[str]] = None,
 ) -> FAISS:
     """
     Create a FAISS vector store from chunked Documents.
     (Ingestion phase)
     """
-    embedder = HuggingFaceEmbeddings(model_name=model_name)
+    embedder = get_ingestion_embedder(
+        model_name, create_embedder(model_name)
+    )
 
     vectorstore = FAISS.from_documents(
         documents=docs,
         embedding=embedder,
+        ids=ids,
     )
 
     return vectorstore
 
 
+def _batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _embed_batch(
+    embedder: Embeddings,
+    batch: List[Tuple[str, Document]],
+) -> Tuple[List[str], List[str], List[dict], List[List[float]]]:
+    ids = [chunk_id for chunk_id, _ in batch]
+    texts = [doc.page_content for _, doc in batch]
+    metadatas = [doc.metadata for _, doc in batch]
+    return ids, texts, metadatas, embedder.embed_documents(texts)
+
+
+class IndexWriter:
+    """
+    Writes an index version directory as rows stream in. Each row goes
+    straight into the chunk store and BM25 postings, and its vector into
+    the FAISS index (possibly later, e.g. after training, in the same
+    order), so chunk texts and metadata are never held for the whole
+    corpus. close() adds the metadata filter bitsets and the index file.
+    """
+
+    def __init__(self, directory: Path, index: faiss.Index):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index = index
+        self._chunks = ChunkStoreWriter(self.directory)
+        self._bm25 = BM25Writer(self.directory)
+
+    @property
+    def rows(self) -> int:
+        return len(self._chunks)
+
+    def add_rows(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[dict]) -> None:
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self._chunks.add(chunk_id, text, metadata)
+            self._bm25.add(text)
+
+    def add_vectors(self, embeddings) -> None:
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def metadata(self, row: int) -> dict:
+        return self._chunks.metadata(row)
+
+    def set_metadata(self, row: int, metadata: dict) -> None:
+        self._chunks.set_metadata(row, metadata)
+
+    def close(self) -> int:
+        """
+        Finish every file of the version. Returns the number of rows.
+        """
+        if self.index.ntotal != self.rows:
+            raise RuntimeError(f"{self.index.ntotal} vectors for {self.rows} chunk rows")
+
+        rows = self._chunks.close()
+        self._bm25.close()
+        write_filter_index(self.directory, ChunkStore(self.directory))
+        faiss.write_index(self.index, str(self.directory / INDEX_FILE))
+        return rows
+
+
+def _reservoir_update(
+    sample: np.ndarray,
+    seen: int,
+    vectors: np.ndarray,
+    rng: np.random.Generator,
+) -> int:
+    """
+    Algorithm R over a stream: after the update, sample holds a uniform
+    random subset of all vectors seen so far. Returns the new count seen.
+    """
+    size = len(sample)
+    for vector in vectors:
+        if seen < size:
+            sample[seen] = vector
+        else:
+            slot = rng.integers(0, seen + 1)
+            if slot < size:
+                sample[slot] = vector
+        seen += 1
+    return seen
+
+
+def build_faiss_vectorstore(
+    chunks: Iterable[Tuple[str, Document]],
+    directory: Path,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    batch_size: int = EMBED_BATCH_SIZE,
+    index_spec: str = FAISS_INDEX_SPEC,
+    train_size: int = FAISS_TRAIN_SIZE,
+    report: Optional[dict] = None,
+) -> Optional[IndexWriter]:
+    """
+    Stream (chunk id, Document) pairs into a new index directory, embedding
+    and indexing batch by batch. Returns the open IndexWriter (row metadata
+    can still be updated before close()), or None if the stream is empty.
+    index_spec: FAISS index_factory string. Indexes that need training
+    (IVF, PQ, SQ) are trained on train_size vectors sampled uniformly from
+    the whole corpus (reservoir sampling); vectors wait in a scratch file
+    on disk until training, then are added in batches.
+    report: if given, an exact index is built alongside and recall@k and
+    latency of the chosen index against it are written into this dict.
+    (Streaming ingestion phase)
+    """
+    embedder = get_ingestion_embedder(
+        model_name, create_embedder(model_name)
+    )
+    writer = None
+    exact_index = None
+    spill = None
+    spill_path = Path(directory) / TRAIN_SPILL_FILE
+    sample = None
+    seen = 0
+    rng = np.random.default_rng(0)
+
+    def _add(embeddings):
+        writer.add_vectors(embeddings)
+        if exact_index is not None:
+            exact_index.add(np.asarray(embeddings, dtype=np.float32))
+
+    for batch in _batched(chunks, batch_size):
+        ids, texts, metadatas, embeddings = _embed_batch(embedder, batch)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+        if writer is None:
+            dim = vectors.shape[1]
+            writer = IndexWriter(directory, create_index(dim, index_spec))
+            if report is not None:
+                exact_index = faiss.IndexFlatL2(dim)
+            if not writer.index.is_trained:
+                spill = open(spill_path, "w+b")
+                sample = np.empty((train_size, dim), dtype=np.float32)
+
+        writer.add_rows(ids, texts, metadatas)
+
+        if spill is None:
+            _add(vectors)
+            continue
+
+        vectors.tofile(spill)
+        seen = _reservoir_update(sample, seen, vectors, rng)
+
+    if spill is not None:
+        spill.close()
+        try:
+            writer.index = train_index(writer.index, sample[:seen], index_spec)
+            stored = np.memmap(spill_path, dtype=np.float32, mode="r", shape=(seen, dim))
+            for start in range(0, seen, batch_size):
+                _add(np.array(stored[start:start + batch_size]))
+            del stored
+        finally:
+            spill_path.unlink(missing_ok=True)
+
+    if writer is not None and exact_index is not None:
+        apply_search_params(writer.index)
+        step = max(1, exact_index.ntotal // RECALL_QUERIES)
+        queries = np.vstack(
+            [exact_index.reconstruct(i) for i in range(0, exact_index.ntotal, step)]
+        )
+        report.update(evaluate_index(writer.index, exact_index, queries))
+        report["index_spec"] = index_spec
+
+    return writer
+
+
+def open_vectorstore_update(
+    source_dir: Path,
+    directory: Path,
+    stale_ids: Iterable[str] = (),
+) -> Optional[IndexWriter]:
+    """
+    Start a new index directory from a published version minus the rows
+    of stale_ids, copied row by row. New chunks are then appended with
+    add_chunks_to_index. Returns None if the stale vectors cannot be
+    deleted from this index type (a full build is needed).
+    (Incremental ingestion)
+    """
+    source_dir = Path(source_dir)
+    index = faiss.read_index(str(source_dir / INDEX_FILE))
+    source = ChunkStore(source_dir)
+
+    stale_ids = set(stale_ids)
+    stale_rows = [row for row in range(len(source)) if source.chunk_id(row) in stale_ids]
+    if stale_rows:
+        if not supports_remove_ids(index):
+            return None
+        index.remove_ids(np.asarray(stale_rows, dtype=np.int64))
+
+    writer = IndexWriter(directory, index)
+    stale = set(stale_rows)
+    for start in range(0, len(source), EMBED_BATCH_SIZE):
+        rows = [r for r in range(start, min(start + EMBED_BATCH_SIZE, len(source))) if r not in stale]
+        writer.add_rows(
+            [source.chunk_id(r) for r in rows],
+            [source.text(r) for r in rows],
+            [source.metadata(r) for r in rows],
+        )
+    return writer
+
+
+def add_chunks_to_index(
+    writer: IndexWriter,
+    chunks: Iterable[Tuple[str, Document]],
+    embedder: Embeddings,
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> int:
+    """
+    Embed (chunk id, Document) pairs and append them to a trained index
+    being written, one batch at a time. Returns the number of chunks added.
+    """
+    added = 0
+
+    for batch in _batched(chunks, batch_size):
+        ids, texts, metadatas, embeddings = _embed_batch(embedder, batch)
+        writer.add_rows(ids, texts, metadatas)
+        writer.add_vectors(embeddings)
+        added += len(batch)
+
+    return added
+
+
 def save_vectorstore(
     vectorstore: FAISS,
     path: str = "vector_store",
 ) -> None:
     """
-    Persist FAISS vector store to disk.
+    Persist FAISS vector store to disk: the raw index, the chunk store
+    (no pickled docstore), and the BM25 index and metadata filter bitsets
+    over the same rows.
     """
-    vectorstore.save_local(path)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vectorstore.index, str(path / INDEX_FILE))
+    write_vectorstore_chunks(vectorstore, path)
+    write_bm25_index(path, (text for _, text, _ in _iter_rows(vectorstore)))
+    write_filter_index(path, ChunkStore(path))
+
+
+def _iter_rows(vectorstore: FAISS) -> Iterator[Tuple[str, str, dict]]:
+    for row in range(vectorstore.index.ntotal):
+        chunk_id = vectorstore.index_to_docstore_id[row]
+        doc = vectorstore.docstore.search(chunk_id)
+        yield chunk_id, doc.page_content, doc.metadata
+
+
+def write_vectorstore_chunks(vectorstore: FAISS, directory: Path) -> int:
+    """
+    Write the vector store's chunks, in index row order, as the chunk
+    store the query path reads.
+    """
+    writer = ChunkStoreWriter(directory)
+    for chunk_id, text, metadata in _iter_rows(vectorstore):
+        writer.add(chunk_id, text, metadata)
+    return writer.close()
 
 
 def load_vectorstore(
     path: str = "vector_store",
-    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    model_name: str = EMBEDDING_MODEL_NAME,
+    embedder: Optional[Embeddings] = None,
 ) -> FAISS:
     """
-    Load FAISS vector store from disk.
-    (Query phase)
+    Load FAISS vector store from disk as an editable LangChain store.
+    (Incremental ingestion with a cached embedder; queries use ChunkStore)
     """
-    embedder = HuggingFaceEmbeddings(model_name=model_name)
+    path = Path(path)
+    if not has_chunk_store(path):
+        raise FileNotFoundError(
+            f"No chunk store in {path}: index predates the chunk store format, "
+            "rebuild it with scripts.build_vectorstore"
+        )
+
+    if embedder is None:
+        embedder = create_embedder(model_name)
+
+    chunks = ChunkStore(path)
+    docs = list(chunks)
 
-    return FAISS.load_local(
-        path,
-        embedder,
-        allow_dangerous_deserialization=True,
+    return FAISS(
+        embedding_function=embedder,
+        index=faiss.read_index(str(path / INDEX_FILE)),
+        docstore=InMemoryDocstore({doc.id: doc for doc in docs}),
+        index_to_docstore_id={row: doc.id for row, doc in enumerate(docs)},
     )
+
+
+# -----------------------------
+# Versioned index layout
+# -----------------------------
+# <root>/versions/<version>/   one complete, immutable index per build
+# <root>/manifest.json         points at the version currently being served
+MANIFEST_FILE = "manifest.json"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest(root: Path) -> Optional[dict]:
+    """
+    Read the manifest of a versioned vector store root (None if absent).
+    """
+    manifest_path = Path(root) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_vectorstore_version(root: Path) -> Tuple[str, Path]:
+    """
+    Return (version, directory) of the index currently published under root.
+    Falls back to the legacy flat layout (index files directly in root).
+    """
+    root = Path(root)
+    manifest = read_manifest(root)
+
+    if manifest is None:
+        return LEGACY_VERSION, root
+
+    return manifest["version"], root / manifest["path"]
+
+
+def new_vectorstore_version(root: Path) -> Tuple[str, Path]:
+    """
+    (version, temporary directory) for a new version under root. Write the
+    index there (IndexWriter / save_vectorstore), then publish it.
+    """
+    versions_dir = Path(root) / VERSIONS_DIR
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    return version, versions_dir / f".{version}.tmp"
+
+
+def publish_vectorstore_version(
+    root: Path,
+    version: str,
+    tmp_dir: Path,
+    vectors: int,
+    keep_versions: int = 3,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    extra_json: Optional[Dict[str, dict]] = None,
+) -> str:
+    """
+    Publish a fully written version directory through the manifest. The
+    directory is renamed from its temporary name and the manifest replaced
+    atomically, so readers never observe a half-written index.
+    extra_json: additional {file name: data} written into the version directory.
+    """
+    root = Path(root)
+    final_dir = root / VERSIONS_DIR / version
+
+    for file_name, data in (extra_json or {}).items():
+        _write_json_atomic(Path(tmp_dir) / file_name, data)
+    os.replace(tmp_dir, final_dir)
+
+    _write_json_atomic(
+        root / MANIFEST_FILE,
+        {
+            "version": version,
+            "path": f"{VERSIONS_DIR}/{version}",
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "vectors": vectors,
+            "model_name": model_name,
+        },
+    )
+
+    prune_vectorstore_versions(root, keep_versions=keep_versions)
+    return version
+
+
+def save_vectorstore_version(
+    vectorstore: FAISS,
+    root: Path,
+    keep_versions: int = 3,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    extra_json: Optional[Dict[str, dict]] = None,
+) -> str:
+    """
+    Persist a LangChain FAISS vector store as a new immutable version under
+    root and publish it through the manifest.
+    """
+    version, tmp_dir = new_vectorstore_version(root)
+    save_vectorstore(vectorstore, tmp_dir)
+    return publish_vectorstore_version(
+        root,
+        version,
+        tmp_dir,
+        vectorstore.index.ntotal,
+        keep_versions=keep_versions,
+        model_name=model_name,
+        extra_json=extra_json,
+    )
+
+
+def prune_vectorstore_versions(root: Path, keep_versions: int = 3) -> None:
+    """
+    Delete all but the newest keep_versions versions (never the published one).
+    """
+    root = Path(root)
+    versions_dir = root / VERSIONS_DIR
+    if not versions_dir.exists():
+        return
+
+    current, _ = resolve_vectorstore_version(root)
+    versions = sorted(
+        (p for p in versions_dir.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.name,
+    )
+
+    for old in versions[:-keep_versions] if keep_versions > 0 else versions:
+        if old.name != current:
+            shutil.rmtree(old, ignore_errors=True)
@@ -1,3 +1,4 @@
+from typing import Iterable, Iterator
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
@@ -15,3 +16,15 @@ def chunk_documents(
 
     return chunks
 
+
+def iter_chunks(
+    docs: Iterable[Document],
+    chunk_size: int = 800,
+    chunk_overlap: int = 100,) -> Iterator[Document]:
+    """
+    Lazily split a stream of documents, one document at a time.
+    """
+    splitter=RecursiveCharacterTextSplitter(chunk_size=chunk_size,chunk_overlap=chunk_overlap)
+
+    for doc in docs:
+        yield from splitter.split_documents([doc])
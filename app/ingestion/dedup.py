@@ -0,0 +1,285 @@
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.filter_index import METADATA_FILTER_EXCLUDE
+
+# Merge near-duplicate chunks (versioned copies of a policy, shared
+# templates) into one vector at build time
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+
+# Min estimated Jaccard similarity of word shingles to merge two chunks
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+
+# MinHash permutations, split into LSH bands (permutations / bands rows each)
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+
+# Words per shingle
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+
+# Merged chunks list every file they come from here (source_file stays the first)
+SOURCE_FILES_FIELD = "source_files"
+
+# Signatures saved with each index version, rows in FAISS index row order, so
+# incremental builds do not re-shingle the published chunks:
+# dedup.json        {"rows": n, "num_perm": p, "shingle_size": s}
+# dedup.signatures  uint32 MinHash signatures (n x p)
+# dedup.scopes      uint32 hash of each row's filter/ACL metadata (n)
+DEDUP_HEADER_FILE = "dedup.json"
+DEDUP_SIGNATURES_FILE = "dedup.signatures"
+DEDUP_SCOPES_FILE = "dedup.scopes"
+
+# Metadata that may differ between merged copies; everything else (department,
+# ACL groups, ...) must match, so filters and ACLs see the same chunks
+_SCOPE_EXCLUDE = set(METADATA_FILTER_EXCLUDE) | {"source_file", SOURCE_FILES_FIELD}
+
+_WORD_RE = re.compile(r"\w+")
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+
+def _scope_hash(metadata: dict) -> int:
+    scope = json.dumps(
+        {k: v for k, v in metadata.items() if k not in _SCOPE_EXCLUDE},
+        sort_keys=True,
+        default=str,
+    )
+    return zlib.crc32(scope.encode("utf-8"))
+
+
+class NearDuplicateFilter:
+    """
+    Streaming near-duplicate chunk filter: MinHash signatures over word
+    shingles, bucketed by LSH bands. The first copy of a chunk is kept;
+    later copies (from any file, with the same filterable/ACL metadata)
+    are dropped and their source files recorded against the kept chunk.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_size: int = DEDUP_SHINGLE_SIZE,
+    ):
+        if num_perm % bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(0)
+        self._a = rng.integers(1, 2 ** 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 31, size=(num_perm, 1), dtype=np.uint64)
+
+        self._buckets: Dict[Tuple[int, bytes], int] = {}
+        self._signatures: List[np.ndarray] = []
+        self._scopes: List[int] = []
+        self._ids: List[str] = []
+        self._files: List[str] = []
+
+        # kept chunk id -> source files merged into it; dropped chunk id -> kept id
+        self.merged: Dict[str, List[str]] = {}
+        self.dropped: Dict[str, str] = {}
+        self.seen = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        size = self.shingle_size
+        shingles = {
+            " ".join(words[i:i + size])
+            for i in range(max(1, len(words) - size + 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray, scope_hash: int) -> List[Tuple[int, bytes]]:
+        return [
+            (scope_hash, band.tobytes())
+            for band in np.split(signature, self.bands)
+        ]
+
+    def _match(self, signature: np.ndarray, keys) -> Optional[int]:
+        for key in keys:
+            kept = self._buckets.get(key)
+            if kept is not None and (
+                np.mean(self._signatures[kept] == signature) >= self.threshold
+            ):
+                return kept
+        return None
+
+    def _keep(self, chunk_id: str, source_file, signature, scope_hash: int) -> None:
+        position = len(self._ids)
+        self._ids.append(chunk_id)
+        self._files.append(source_file)
+        self._signatures.append(signature)
+        self._scopes.append(scope_hash)
+        for key in self._band_keys(signature, scope_hash):
+            self._buckets.setdefault(key, position)
+
+    def add_existing(self, chunks: Iterable[Tuple[str, Document]]) -> None:
+        """
+        Register already indexed chunks (incremental builds), so new copies
+        of them are merged instead of added. Shingles every chunk: prefer
+        load_existing when the published version has saved signatures.
+        """
+        for chunk_id, doc in chunks:
+            self._keep(
+                chunk_id,
+                doc.metadata.get("source_file"),
+                self.signature(doc.page_content),
+                _scope_hash(doc.metadata),
+            )
+
+    def load_existing(self, directory: Path, store, skip_ids: Iterable[str] = ()) -> bool:
+        """
+        Register the chunks of a published version from the signatures
+        saved with it, except skip_ids (stale chunks). store: the version's
+        ChunkStore, for chunk ids and source files. False (nothing
+        registered) if the version has no usable signatures.
+        """
+        directory = Path(directory)
+        try:
+            with open(directory / DEDUP_HEADER_FILE, "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        rows = header["rows"]
+        if (
+            header.get("num_perm") != self.num_perm
+            or header.get("shingle_size") != self.shingle_size
+            or rows != len(store)
+        ):
+            return False
+
+        signatures = np.fromfile(directory / DEDUP_SIGNATURES_FILE, dtype=np.uint32)
+        signatures = signatures.reshape(rows, self.num_perm)
+        scopes = np.fromfile(directory / DEDUP_SCOPES_FILE, dtype=np.uint32)
+
+        skip_ids = set(skip_ids)
+        for row in range(rows):
+            chunk_id = store.chunk_id(row)
+            if chunk_id in skip_ids:
+                continue
+            self._keep(
+                chunk_id,
+                store.metadata(row).get("source_file"),
+                signatures[row],
+                int(scopes[row]),
+            )
+        return True
+
+    def save(self, directory: Path) -> None:
+        """
+        Write the signatures of every kept chunk (add_existing or
+        load_existing first, then filter: the index row order).
+        """
+        directory = Path(directory)
+        signatures = (
+            np.stack(self._signatures)
+            if self._signatures
+            else np.zeros((0, self.num_perm), dtype=np.uint32)
+        )
+        signatures.astype(np.uint32).tofile(directory / DEDUP_SIGNATURES_FILE)
+        np.asarray(self._scopes, dtype=np.uint32).tofile(directory / DEDUP_SCOPES_FILE)
+        with open(directory / DEDUP_HEADER_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "rows": len(self._ids),
+                    "num_perm": self.num_perm,
+                    "shingle_size": self.shingle_size,
+                },
+                f,
+            )
+
+    def filter(self, chunks: Iterable[Tuple[str, Document]]) -> Iterator[Tuple[str, Document]]:
+        """
+        Yield the (chunk id, Document) pairs that are not near-duplicates
+        of a chunk seen before.
+        """
+        for chunk_id, doc in chunks:
+            self.seen += 1
+            signature = self.signature(doc.page_content)
+            scope_hash = _scope_hash(doc.metadata)
+
+            kept = self._match(signature, self._band_keys(signature, scope_hash))
+            if kept is None:
+                self._keep(chunk_id, doc.metadata.get("source_file"), signature, scope_hash)
+                yield chunk_id, doc
+                continue
+
+            kept_id = self._ids[kept]
+            self.dropped[chunk_id] = kept_id
+            source_file = doc.metadata.get("source_file")
+            files = self.merged.setdefault(kept_id, [])
+            if source_file and source_file not in files:
+                files.append(source_file)
+
+    def apply(self, writer, files: Dict[str, dict]) -> None:
+        """
+        Record the merges: kept chunks list every source file in their
+        metadata, and the ingest manifest only lists indexed chunk ids,
+        plus `merged_into` (files holding a file's duplicates).
+        writer: the IndexWriter the kept chunks went to. Its rows are the
+        order chunks were kept in (add_existing first, then filter).
+        """
+        host_files = dict(zip(self._ids, self._files))
+        rows = {chunk_id: row for row, chunk_id in enumerate(self._ids) if chunk_id in self.merged}
+
+        for kept_id, merged_files in self.merged.items():
+            row = rows[kept_id]
+            metadata = writer.metadata(row)
+            sources = list(metadata.get(SOURCE_FILES_FIELD) or [metadata.get("source_file")])
+            sources += [name for name in merged_files if name not in sources]
+            writer.set_metadata(row, {
+                **metadata,
+                SOURCE_FILES_FIELD: [name for name in sources if name],
+            })
+
+        for entry in files.values():
+            chunk_ids = entry["chunk_ids"]
+            dropped = [chunk_id for chunk_id in chunk_ids if chunk_id in self.dropped]
+            if not dropped:
+                continue
+
+            dropped_set = set(dropped)
+            entry["chunk_ids"] = [c for c in chunk_ids if c not in dropped_set]
+            hosts = {host_files[self.dropped[chunk_id]] for chunk_id in dropped}
+            merged_into = set(entry.get("merged_into", [])) | hosts
+            entry["merged_into"] = sorted(name for name in merged_into if name)
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.seen,
+            "dropped": len(self.dropped),
+            "kept_with_copies": len(self.merged),
+            "ratio": round(len(self.dropped) / self.seen, 4) if self.seen else 0.0,
+        }
+
+
+def shares_chunks(names: Iterable[str], files: Dict[str, dict]) -> bool:
+    """
+    True if any of the files had chunks merged into another file's chunks,
+    or holds merged chunks of another file.
+    """
+    names = set(names)
+    for name, entry in files.items():
+        merged_into = set(entry.get("merged_into", [])) - {name}
+        if not merged_into:
+            continue
+        if name in names or merged_into & names:
+            return True
+    return False
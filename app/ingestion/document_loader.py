@@ -1,8 +1,16 @@
 from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+import multiprocessing
+import os
+import queue
+import time
 import yaml
 
 from langchain_core.documents import Document
 
+from app.core.logger import get_logger
+
 
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -16,40 +24,231 @@ def load_text_file(file_path: Path) -> list[Document]:
     return [Document(page_content=text, metadata={})]
 
 
-def load_documents(data_dir: Path, metadata_path: Path):
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".html", ".md", ".txt"}
+
+# Parser processes (0 = one per CPU core, 1 = parse inline)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "0"))
+
+# Max seconds a single file may spend parsing before it is skipped and its
+# worker killed (not enforced with LOADER_WORKERS=1, which parses inline)
+LOADER_FILE_TIMEOUT = float(os.getenv("LOADER_FILE_TIMEOUT", "300"))
+
+# How often the parent checks parse deadlines
+_POLL_SECONDS = 0.1
+
+logger = get_logger()
+
+
+def load_metadata_map(metadata_path: Path) -> dict:
     with metadata_path.open("r") as f:
-        metadata_map = yaml.safe_load(f)["documents"]
+        return yaml.safe_load(f)["documents"]
+
+
+def load_file(file_path: Path, meta: dict) -> list[Document]:
+    """
+    Parse a single file and merge its YAML metadata into every page.
+    """
+    ext = file_path.suffix.lower()
+
+    if ext == ".pdf":
+        docs = PyPDFLoader(str(file_path)).load()
+    elif ext == ".docx":
+        docs = UnstructuredWordDocumentLoader(str(file_path)).load()
+    elif ext == ".html":
+        docs = UnstructuredHTMLLoader(str(file_path)).load()
+    elif ext in [".md", ".txt"]:
+        docs = load_text_file(file_path)
+    else:
+        return []
+
+    for doc in docs:
+        doc.metadata |= meta
+        doc.metadata["source_file"] = file_path.name
+
+    return docs
+
+
+def list_source_files(data_dir: Path, metadata_map: dict) -> list[Path]:
+    """
+    Files in data_dir that have metadata and a supported extension.
+    """
+    return [
+        file_path
+        for file_path in sorted(data_dir.iterdir())
+        if file_path.is_file()
+        and metadata_map.get(file_path.name)
+        and file_path.suffix.lower() in SUPPORTED_EXTENSIONS
+    ]
+
+
+_started_queue = None
+
+
+def _init_worker(started_queue) -> None:
+    global _started_queue
+    _started_queue = started_queue
+
+
+def _load_file_reporting(index: int, file_path: Path, meta: dict) -> list[Document]:
+    # Tell the parent when parsing starts: the file's timeout runs from here
+    _started_queue.put(index)
+    return load_file(file_path, meta)
+
+
+class _ParserPool:
+    """
+    Process pool whose workers report when they start a file, so each
+    file's timeout is measured from the start of its own parse.
+    """
+
+    def __init__(self, workers: int):
+        context = multiprocessing.get_context()
+        self.started_queue = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.started_queue,),
+        )
+        self.started: dict = {}
+
+    def submit(self, index: int, file_path: Path, meta: dict) -> Future:
+        return self.executor.submit(_load_file_reporting, index, file_path, meta)
+
+    def poll_started(self) -> None:
+        while True:
+            try:
+                index = self.started_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.started[index] = time.monotonic()
+
+    def close(self, kill: bool = False) -> None:
+        if kill:
+            # A parser stuck in C code never returns; kill it so the pool can exit
+            for process in list((self.executor._processes or {}).values()):
+                process.terminate()
+        self.executor.shutdown(wait=not kill, cancel_futures=True)
+        self.started_queue.close()
+
+
+def iter_loaded_files(
+    file_paths: list[Path],
+    metadata_map: dict,
+    workers: Optional[int] = None,
+    timeout: float = LOADER_FILE_TIMEOUT,
+) -> Iterator[Tuple[Path, Optional[list[Document]]]]:
+    """
+    Parse files in a process pool and yield (path, docs) in input order.
+    A file that fails or parses for longer than the timeout yields
+    docs=None and does not abort the run. At most 2 x workers files are
+    in flight at once.
+
+    A file over its timeout gets the whole pool killed and restarted:
+    the other files in flight are resubmitted, so hung parsers never
+    hold worker slots. workers=1 parses inline, without a timeout.
+    """
+    workers = workers or LOADER_WORKERS or os.cpu_count() or 1
+
+    if workers == 1:
+        for file_path in file_paths:
+            try:
+                yield file_path, load_file(file_path, metadata_map[file_path.name])
+            except Exception as e:
+                logger.error(f"action=load_file failed file={file_path.name} error={e}")
+                yield file_path, None
+        return
+
+    file_paths = list(file_paths)
+    pool = _ParserPool(workers)
+    pending: List[list] = []  # [index, future], in input order
+    next_index = 0
+
+    def _submit(index: int) -> Future:
+        file_path = file_paths[index]
+        return pool.submit(index, file_path, metadata_map[file_path.name])
+
+    def _restart(expired: set) -> None:
+        # Kill every worker (hung ones included) and rerun what was in flight
+        nonlocal pool
+        done = {index for index, future in pending if future.done()}
+        pool.close(kill=True)
+        pool = _ParserPool(workers)
+
+        for entry in pending:
+            if entry[0] in expired:
+                entry[1] = Future()
+                entry[1].set_result(None)
+            elif entry[0] not in done:
+                entry[1] = _submit(entry[0])
+        logger.warning(
+            f"action=loader_pool_restart hung={len(expired)} "
+            f"resubmitted={len(pending) - len(done) - len(expired)}"
+        )
+
+    try:
+        while pending or next_index < len(file_paths):
+            while len(pending) < workers * 2 and next_index < len(file_paths):
+                pending.append([next_index, _submit(next_index)])
+                next_index += 1
 
-    documents = []
+            pool.poll_started()
+            now = time.monotonic()
+            expired = {
+                index for index, future in pending
+                if not future.done() and now - pool.started.get(index, now) > timeout
+            }
+            for index in sorted(expired):
+                logger.error(
+                    f"action=load_file timeout file={file_paths[index].name} timeout_s={timeout}"
+                )
+            if expired:
+                _restart(expired)
 
-    for file_path in data_dir.iterdir():
-        if not file_path.is_file():
-            continue
+            index, future = pending[0]
+            if not future.done():
+                wait([future], timeout=_POLL_SECONDS)
+                continue
 
-        meta = metadata_map.get(file_path.name)
-        if not meta:
-            continue
+            pending.pop(0)
+            try:
+                docs = future.result()
+            except Exception as e:
+                logger.error(f"action=load_file failed file={file_paths[index].name} error={e}")
+                docs = None
+            yield file_paths[index], docs
+    finally:
+        pool.close(kill=any(not future.done() for _, future in pending))
 
-        ext = file_path.suffix.lower()
 
-        if ext == ".pdf":
-            docs = PyPDFLoader(str(file_path)).load()
-        elif ext == ".docx":
-            docs = UnstructuredWordDocumentLoader(str(file_path)).load()
-        elif ext == ".html":
-            docs = UnstructuredHTMLLoader(str(file_path)).load()
-        elif ext in [".md", ".txt"]:
-            docs = load_text_file(file_path)
-        else:
-            continue
+def iter_documents(
+    data_dir: Path,
+    metadata_path: Path,
+    workers: Optional[int] = None,
+    timeout: float = LOADER_FILE_TIMEOUT,
+) -> Iterator[Document]:
+    """
+    Stream parsed pages of every ingestible file, file by file.
+    """
+    metadata_map = load_metadata_map(metadata_path)
 
-        for doc in docs:
-            doc.metadata |= meta
-            doc.metadata["source_file"] = file_path.name
+    for _, docs in iter_loaded_files(
+        list_source_files(data_dir, metadata_map),
+        metadata_map,
+        workers=workers,
+        timeout=timeout,
+    ):
+        if docs:
+            yield from docs
 
-        documents.extend(docs)
 
-    return documents
+def load_documents(
+    data_dir: Path,
+    metadata_path: Path,
+    workers: Optional[int] = None,
+    timeout: float = LOADER_FILE_TIMEOUT,
+):
+    return list(iter_documents(data_dir, metadata_path, workers, timeout))
 
 
 
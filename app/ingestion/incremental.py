@@ -0,0 +1,99 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.ingestion.chunker import iter_chunks
+from app.ingestion.document_loader import iter_loaded_files, list_source_files
+from app.ingestion.text_cleaner import iter_clean_documents
+
+# Stored inside every index version directory, next to the FAISS files
+INGEST_MANIFEST_FILE = "ingest_manifest.json"
+
+
+def file_fingerprint(file_path: Path, meta: dict) -> str:
+    """
+    Content hash of a source file. Includes its name and YAML metadata,
+    so metadata edits also cause the file to be re-ingested.
+    """
+    digest = hashlib.sha256()
+    digest.update(file_path.name.encode("utf-8"))
+    digest.update(json.dumps(meta, sort_keys=True, default=str).encode("utf-8"))
+
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def scan_source_files(data_dir: Path, metadata_map: dict) -> Dict[str, str]:
+    """
+    Return {file name: fingerprint} for every ingestible file.
+    """
+    return {
+        file_path.name: file_fingerprint(file_path, metadata_map[file_path.name])
+        for file_path in list_source_files(data_dir, metadata_map)
+    }
+
+
+def read_ingest_manifest(version_dir: Path) -> Optional[dict]:
+    manifest_path = Path(version_dir) / INGEST_MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def plan_changes(
+    current: Dict[str, str],
+    previous_manifest: dict,
+) -> Tuple[List[str], List[str]]:
+    """
+    Compare current fingerprints with the previous build.
+    Returns (new or changed file names, removed file names).
+    """
+    previous = previous_manifest.get("files", {})
+
+    changed = sorted(
+        name for name, file_hash in current.items()
+        if previous.get(name, {}).get("hash") != file_hash
+    )
+    removed = sorted(name for name in previous if name not in current)
+
+    return changed, removed
+
+
+def iter_file_chunks(
+    data_dir: Path,
+    file_names: List[str],
+    metadata_map: dict,
+    fingerprints: Dict[str, str],
+    files: Dict[str, dict],
+) -> Iterator[Tuple[str, Document]]:
+    """
+    Stream (chunk id, chunk) pairs for the given files: parse (in parallel),
+    clean and chunk one file at a time, with deterministic chunk IDs.
+    Each file's manifest entry is recorded in `files` as it is produced.
+    Files that fail to parse are left out of the manifest, so the next
+    incremental run retries them.
+    """
+    file_paths = [data_dir / name for name in file_names]
+
+    for file_path, docs in iter_loaded_files(file_paths, metadata_map):
+        if docs is None:
+            continue
+
+        name = file_path.name
+        file_hash = fingerprints[name]
+        file_ids = []
+
+        for i, chunk in enumerate(iter_chunks(iter_clean_documents(docs))):
+            chunk_id = f"{file_hash[:16]}:{i}"
+            file_ids.append(chunk_id)
+            yield chunk_id, chunk
+
+        files[name] = {"hash": file_hash, "chunk_ids": file_ids}
@@ -1,4 +1,5 @@
 import re
+from typing import Iterable, Iterator
 from langchain_core.documents import Document
 
 
@@ -25,3 +26,11 @@ def clean_documents(docs: list[Document]) -> list[Document]:
     Clean a list of Documents.
     """
     return [clean_document(doc) for doc in docs]
+
+
+def iter_clean_documents(docs: Iterable[Document]) -> Iterator[Document]:
+    """
+    Clean a stream of Documents lazily.
+    """
+    for doc in docs:
+        yield clean_document(doc)
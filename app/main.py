@@ -1,14 +1,54 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.query import router as query_router
 from app.api.health import router as health_router
+from app.api.admin import router as admin_router
+from app.core.logger import get_logger
+from app.query.answer_cache import answer_cache
+from app.query.reranker import get_reranker, init_reranker
+from app.query.retriever import get_retriever, init_retriever
+from app.security.jwt_auth import token_verifier
+
+logger = get_logger()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load embedder + FAISS index once per process and warm them up.
+    # A missing/broken index leaves the service "not ready" instead of crashing.
+    try:
+        init_retriever()
+    except Exception as e:
+        logger.error(f"action=retriever_init failed error={e}")
+
+    # Optional cross-encoder rerank stage (RERANK_ENABLED)
+    init_reranker()
+
+    # Answers are only valid for the index they were generated from
+    get_retriever().add_swap_listener(lambda version: answer_cache.clear())
+
+    # Pick up newly published index versions without a restart
+    get_retriever().start_watcher()
+
+    # JWKS keys / shared deny-list, refreshed off the request path
+    token_verifier.start()
+    yield
+    token_verifier.stop()
+    get_retriever().shutdown()
+    if get_reranker() is not None:
+        get_reranker().shutdown()
+
 
 app = FastAPI(
     title="IntraMind  Internal Knowledge Intelligence Platform",
     description="Enterprise-grade RAG backend for internal organizational knowledge",
+    lifespan=lifespan,
 )
 
 
 app.include_router(query_router)
 app.include_router(health_router)
+app.include_router(admin_router)
 
 ##redeply
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.query.prompt_builder import PROMPT_MAX_HISTORY
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+# Max cached answers (LRU eviction beyond this)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+# Min cosine similarity for a paraphrase to reuse a cached answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+_hits_exact = metrics.counter("answer_cache_hits_exact", "Exact question matches")
+_hits_semantic = metrics.counter("answer_cache_hits_semantic", "Paraphrase matches")
+_misses = metrics.counter("answer_cache_misses", "Questions answered by the LLM")
+_evictions = metrics.counter("answer_cache_evictions", "Entries evicted (LRU/TTL)")
+
+# (index version, retrieved chunk ids, history digest)
+GroupKey = Tuple[str, Tuple[str, ...], str]
+
+
+def history_key(
+    chat_history: Sequence,
+    max_history: int = PROMPT_MAX_HISTORY,
+    summary: str = "",
+) -> str:
+    """
+    Digest of the conversation turns that reach the prompt: the same
+    question after a different conversation may deserve a different answer.
+    """
+    recent = [(msg.role, msg.content) for msg in chat_history[-max_history:]]
+    if summary:
+        recent.append(("summary", summary))
+    return hashlib.sha256(json.dumps(recent).encode("utf-8")).hexdigest()[:16]
+
+
+class CachedAnswer:
+    def __init__(
+        self,
+        answer: str,
+        confidence: float,
+        sources: List[str],
+        embedding: Optional[np.ndarray],
+    ):
+        self.answer = answer
+        self.confidence = confidence
+        self.sources = sources
+        self.embedding = embedding
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    Two-level answer cache.
+
+    Exact layer: (index version, retrieved chunk ids, history, cleaned question).
+    Semantic layer: within the same (version, chunk ids, history) group, a
+    new question reuses an answer when its embedding is within the cosine
+    threshold of a cached question. Size-bounded LRU with TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+
+        self._entries: "OrderedDict[Tuple[GroupKey, str], CachedAnswer]" = OrderedDict()
+        self._groups: Dict[GroupKey, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group_key(version: str, chunk_ids: Sequence[str], history: str) -> GroupKey:
+        return (version, tuple(sorted(chunk_ids)), history)
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key: Tuple[GroupKey, str]) -> None:
+        self._entries.pop(key, None)
+        group, question = key
+        questions = self._groups.get(group)
+        if questions is not None:
+            questions.discard(question)
+            if not questions:
+                del self._groups[group]
+
+    def get_exact(self, group: GroupKey, question: str) -> Optional[CachedAnswer]:
+        with self._lock:
+            key = (group, question)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove(key)
+                _evictions.inc()
+                return None
+
+            self._entries.move_to_end(key)
+            _hits_exact.inc()
+            return entry
+
+    def has_candidates(self, group: GroupKey) -> bool:
+        """
+        True if a semantic lookup could hit (so the embedding is worth computing).
+        """
+        with self._lock:
+            return bool(self._groups.get(group))
+
+    def get_semantic(self, group: GroupKey, embedding: np.ndarray) -> Optional[CachedAnswer]:
+        query = _normalize(embedding)
+
+        with self._lock:
+            best_key, best_score = None, self.similarity
+            for question in list(self._groups.get(group, ())):
+                key = (group, question)
+                entry = self._entries[key]
+                if self._expired(entry):
+                    self._remove(key)
+                    _evictions.inc()
+                    continue
+                if entry.embedding is None:
+                    continue
+
+                score = float(np.dot(query, entry.embedding))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                return None
+
+            self._entries.move_to_end(best_key)
+            _hits_semantic.inc()
+            return self._entries[best_key]
+
+    def record_miss(self) -> None:
+        _misses.inc()
+
+    def put(
+        self,
+        group: GroupKey,
+        question: str,
+        answer: str,
+        confidence: float,
+        sources: List[str],
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        entry = CachedAnswer(
+            answer,
+            confidence,
+            sources,
+            _normalize(embedding) if embedding is not None else None,
+        )
+
+        with self._lock:
+            key = (group, question)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._groups.setdefault(group, set()).add(question)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                _evictions.inc()
+
+    def clear(self) -> None:
+        """
+        Drop everything (e.g. when a new index version is swapped in).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core import metrics
+from app.core.logger import get_logger
+
+# Max time the first query of a batch waits for others to join (0 = no waiting)
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "2"))
+
+# Max queries embedded + searched together in one batch
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+
+logger = get_logger()
+
+_batch_size = metrics.histogram(
+    "retriever_batch_size",
+    [1, 2, 4, 8, 16, 32, 64, 128],
+    "Queries per coalesced embedding + FAISS search batch",
+)
+_queue_depth = metrics.histogram(
+    "retriever_queue_depth",
+    [0, 1, 2, 4, 8, 16, 32, 64, 128, 256],
+    "Queries still waiting when a batch is dispatched",
+)
+_batch_latency_ms = metrics.histogram(
+    "retriever_batch_latency_ms",
+    [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+    "Embedding + search time per batch",
+)
+
+# search_batch(questions, top_k, **options)
+SearchBatchFn = Callable[..., List[List[Tuple[Document, float]]]]
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent retrieval requests: queries arriving within a
+    short window (or up to a max batch size) are embedded in one forward
+    pass and searched with one FAISS call on a matrix of query vectors,
+    then the per-query results are fanned back out to the waiting callers.
+    Queries with different search options (metadata filters, ACL groups)
+    share a batch slot but are searched in separate calls (one selector
+    per FAISS search).
+    """
+
+    def __init__(
+        self,
+        search_batch: SearchBatchFn,
+        get_executor: Callable[[], Executor],
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_WAIT_MS,
+        max_in_flight: int = 1,
+    ):
+        self.search_batch = search_batch
+        self.get_executor = get_executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+
+        # (Re)bind to the running loop, e.g. after a test client restarts it
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = loop.create_task(self._run())
+
+    async def search(
+        self,
+        question: str,
+        top_k: int = 4,
+        **options,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Queue one query and wait for its share of the next batch.
+        options are passed through to search_batch.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((question, top_k, options, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+
+            _batch_size.observe(len(batch))
+            _queue_depth.observe(self._queue.qsize())
+
+            # Bound concurrent batches to the executor's capacity
+            await self._slots.acquire()
+            self._loop.create_task(self._dispatch(batch))
+
+    def _search_groups(self, batch: list) -> list:
+        """
+        Search each group of queries with the same options; results in
+        batch order.
+        (Runs on the executor.)
+        """
+        groups: Dict[str, List[int]] = {}
+        for position, (_, _, options, _) in enumerate(batch):
+            key = json.dumps(options, sort_keys=True, default=str)
+            groups.setdefault(key, []).append(position)
+
+        results: list = [None] * len(batch)
+        for positions in groups.values():
+            # Callers may ask for different k: search the max, slice per caller
+            questions = [batch[p][0] for p in positions]
+            top_k = max(batch[p][1] for p in positions)
+            options = batch[positions[0]][2]
+
+            try:
+                group_results = self.search_batch(questions, top_k, **options)
+            except Exception as e:
+                group_results = [e] * len(positions)
+
+            for p, result in zip(positions, group_results):
+                results[p] = result
+        return results
+
+    async def _dispatch(self, batch: list) -> None:
+        try:
+            start = self._loop.time()
+            try:
+                results = await self._loop.run_in_executor(
+                    self.get_executor(), self._search_groups, batch
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+            _batch_latency_ms.observe((self._loop.time() - start) * 1000)
+
+            for (_, k, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result[:k])
+        finally:
+            self._slots.release()
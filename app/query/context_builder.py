@@ -1,27 +1,87 @@
+import os
 from langchain_core.documents import Document
 from typing import List, Tuple
 
+from app.query.token_budget import count_tokens, truncate_to_tokens
+
+# Token budget for the retrieved chunks in the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Upper bound on chunks, whatever the budget
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "4"))
+
+# A chunk that does not fit is cut down, unless less than this would remain
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", "60"))
+
+# Chunker overlap (chunk_documents): neighbouring chunks of a file share up
+# to this many characters; the shared text is only sent once
+CONTEXT_CHUNK_OVERLAP = int(os.getenv("CONTEXT_CHUNK_OVERLAP", "100"))
+
+_MIN_OVERLAP = 20
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    # Length of the longest suffix of `left` that starts `right`
+    for size in range(min(len(left), len(right), max_overlap), _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _dedupe(text: str, kept: List[str], max_overlap: int) -> str:
+    """
+    `text` minus the overlap it shares with chunks of the same file already
+    in the context ("" if it is entirely contained in one of them).
+    """
+    for other in kept:
+        if text in other:
+            return ""
+
+        size = _overlap(other, text, max_overlap)
+        if size:
+            text = text[size:].lstrip()
+            continue
+
+        size = _overlap(text, other, max_overlap)
+        if size:
+            text = text[:-size].rstrip()
+    return text
+
 
 def build_context(
     docs_with_scores: List[Tuple[Document, float]],
-    max_chunks: int = 3,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    max_tokens: int = CONTEXT_TOKEN_BUDGET,
 ) -> str:
     """
-    Build a clean textual context from retrieved Documents.
+    Build a clean textual context from retrieved Documents, best first,
+    within a token budget. Text repeated by the chunker's overlap is
+    dropped; the last chunk that does not fit is cut down.
     Similarity scores are ignored here on purpose.
     """
 
-    # Take only top-N documents
-    selected = docs_with_scores[:max_chunks]
-
     context_blocks = []
+    kept_by_source = {}
+    remaining = max_tokens
+
+    for doc, _ in docs_with_scores:
+        if len(context_blocks) >= max_chunks or remaining < CONTEXT_MIN_CHUNK_TOKENS:
+            break
+
+        source = doc.metadata.get("source_file")
+        kept = kept_by_source.setdefault(source, [])
+        text = _dedupe(doc.page_content.strip(), kept, CONTEXT_CHUNK_OVERLAP)
+        if not text:
+            continue
+
+        header = f"[Source {len(context_blocks) + 1} | {source}]\n"
+        text = truncate_to_tokens(text, remaining - count_tokens(header) - 1)
+        if text is None:
+            break
 
-    for i, (doc, _) in enumerate(selected, start=1):
-        block = (
-            f"[Source {i} | {doc.metadata.get('source_file')}]\n"
-            f"{doc.page_content.strip()}"
-        )
-        context_blocks.append(block)
+        context_blocks.append(header + text)
+        kept.append(doc.page_content.strip())
+        remaining -= count_tokens(header) + count_tokens(text) + 1
 
     context = "\n\n".join(context_blocks)
     return context
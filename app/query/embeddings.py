@@ -1,13 +1,16 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
-def Embed_documents(docs:list[Document],model_name:str="sentence-transformers/all-MiniLM-L6-v2",):
+from app.core.embedding_backend import EMBEDDING_MODEL_NAME, create_embedder
+from app.core.embedding_cache import get_ingestion_embedder
+
+def Embed_documents(docs:list[Document],model_name:str=EMBEDDING_MODEL_NAME,):
     
     """
     Generate embeddings for a list of Documents.
     Returns list of (embedding_vector, Document).
+    Unchanged chunks are served from the persistent embedding cache.
     """
-    embedder=HuggingFaceEmbeddings(model_name=model_name)
+    embedder=get_ingestion_embedder(model_name,create_embedder(model_name))
     texts=[doc.page_content for doc in docs]
     embeddings=embedder.embed_documents(texts)
 
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core import metrics
+from app.core.logger import get_logger
+from app.query.sessions import Session
+
+# Rewrite follow-ups ("what about for contractors?") into standalone
+# questions before retrieval
+FOLLOWUP_REWRITE_ENABLED = os.getenv("FOLLOWUP_REWRITE_ENABLED", "true").lower() == "true"
+
+# Optional small LLM rewrite (heuristic otherwise, and on timeout / error)
+FOLLOWUP_REWRITE_LLM = os.getenv("FOLLOWUP_REWRITE_LLM", "false").lower() == "true"
+FOLLOWUP_REWRITE_MODEL = os.getenv("FOLLOWUP_REWRITE_MODEL", "llama-3.1-8b-instant")
+FOLLOWUP_REWRITE_TIMEOUT_MS = float(os.getenv("FOLLOWUP_REWRITE_TIMEOUT_MS", "800"))
+
+# Rewrites memoized per session
+FOLLOWUP_MEMO_SIZE = int(os.getenv("FOLLOWUP_MEMO_SIZE", "32"))
+
+# Longest question (in words) a bare pronoun makes a follow-up: in longer
+# ones "it" / "they" usually refer within the question
+FOLLOWUP_MAX_WORDS = int(os.getenv("FOLLOWUP_MAX_WORDS", "8"))
+
+# Reuse the previous turn's chunks when a follow-up adds nothing they lack
+FOLLOWUP_REUSE_CHUNKS = os.getenv("FOLLOWUP_REUSE_CHUNKS", "true").lower() == "true"
+
+logger = get_logger()
+
+_rewrites = metrics.counter("followup_rewrites", "Follow-ups rewritten into standalone questions")
+_llm_rewrites = metrics.counter("followup_llm_rewrites", "Follow-ups rewritten by the LLM")
+_memo_hits = metrics.counter("followup_memo_hits", "Rewrites reused from the session")
+_chunk_reuse = metrics.counter("followup_chunk_reuse", "Follow-ups answered from the previous turn's chunks")
+
+# "and for meals?", "what about international travel?", "how about it?"
+_LEADING_RE = re.compile(
+    r"^(?:and|but|also|or|so|then|what about|how about|what if|same for|and what about)\b[\s,]*",
+    re.IGNORECASE,
+)
+# Also open standalone questions ("what if I lose my laptop?", "so how many
+# days do interns get?"): only follow-ups if they also refer back
+_WEAK_LEADING_RE = re.compile(r"^(?:what if|so|or)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# "is it mandatory?", "what is their notice period?", "the same for interns?"
+_PRONOUNS = {"it", "its", "they", "them", "their", "same", "former", "latter"}
+
+# Refer back only without a noun of their own: "does that apply?", "explain
+# this", but not "does this form apply?" or "this year's appraisal"
+_DEMONSTRATIVES = {"this", "that", "these", "those"}
+_DEMONSTRATIVE_VERBS = set("""
+apply applies cover covers include includes require requires work works
+change changes count counts matter matters cost costs take takes
+""".split())
+
+# Words that say how to answer rather than what about
+_FILLER_WORDS = set("""
+a an the and or but so then also about what whats how why when where which who whom
+is are was were be been do does did can could would should will shall may might must
+i me my we our you your it its that this these those they them their there here same
+above former latter of for to in on at by with from as more less detail details
+detailed elaborate explain clarify expand summarize summarise tell give show example
+examples mean means please again further else other case cases regarding re
+""".split())
+
+_REWRITE_PROMPT = """Rewrite the follow-up question as one standalone question
+that can be understood without the conversation. Reply with the question only.
+
+Conversation:
+{conversation}
+
+Follow-up question: {question}
+Standalone question:"""
+
+_rewrite_llm = None
+
+
+def _refers_back(words: List[str]) -> bool:
+    for position, word in enumerate(words):
+        if word in _PRONOUNS:
+            return True
+        if word in _DEMONSTRATIVES:
+            following = words[position + 1] if position + 1 < len(words) else None
+            if following is None or following in _FILLER_WORDS or following in _DEMONSTRATIVE_VERBS:
+                return True
+    return False
+
+
+def is_follow_up(question: str) -> bool:
+    """
+    Heuristic: the question opens with a continuation ("and", "what
+    about"), or is short and refers back with a pronoun that has no noun
+    of its own ("is it mandatory?", "does that apply to interns?").
+    "What if", "so" and "or" need the pronoun too.
+    """
+    if _LEADING_RE.match(question) and not _WEAK_LEADING_RE.match(question):
+        return True
+
+    words = _WORD_RE.findall(question.lower())
+    return len(words) <= FOLLOWUP_MAX_WORDS and _refers_back(words)
+
+
+def _topic_question(session: Session) -> Optional[str]:
+    # Last question that was not a follow-up: successive follow-ups
+    # ("what about X?", "and Y?") each refine it instead of piling up
+    topic = session.state.get("topic")
+    if topic:
+        return topic
+    for msg in reversed(session.messages):
+        if msg.role == "user":
+            return msg.content
+    return None
+
+
+def heuristic_rewrite(question: str, topic: str) -> str:
+    """
+    Topic question + the follow-up without its continuation words:
+    enough context for embedding and BM25.
+    """
+    remainder = _LEADING_RE.sub("", question).strip() or question
+    return f"{topic.rstrip()} {remainder}"
+
+
+async def _llm_rewrite(question: str, session: Session) -> Optional[str]:
+    global _rewrite_llm
+
+    from app.query.llm_runner import get_rewrite_llm
+
+    if _rewrite_llm is None:
+        _rewrite_llm = get_rewrite_llm(FOLLOWUP_REWRITE_MODEL)
+
+    conversation = "\n".join(
+        f"{'User' if msg.role == 'user' else 'Assistant'}: {msg.content}"
+        for msg in session.messages[-4:]
+    )
+    try:
+        response = await asyncio.wait_for(
+            _rewrite_llm.ainvoke(
+                _REWRITE_PROMPT.format(conversation=conversation, question=question)
+            ),
+            timeout=FOLLOWUP_REWRITE_TIMEOUT_MS / 1000,
+        )
+    except Exception as e:
+        logger.warning(f"action=followup_rewrite llm_failed error={type(e).__name__}")
+        return None
+
+    text = response.content if hasattr(response, "content") else str(response)
+    text = text.strip().strip('"').strip()
+    return text.split("\n")[0] or None
+
+
+async def standalone_question(question: str, session: Session) -> Tuple[str, bool]:
+    """
+    (question to retrieve with, whether it is a follow-up). Rewrites are
+    memoized per session, keyed by the topic question and the follow-up.
+    A question that is not a follow-up becomes the session's topic.
+    """
+    topic = _topic_question(session) if FOLLOWUP_REWRITE_ENABLED else None
+    if topic is None or not is_follow_up(question):
+        session.state["topic"] = question
+        return question, False
+
+    memo = session.state.setdefault("rewrites", {})
+    key = hashlib.sha256(f"{topic}\0{question}".encode("utf-8")).hexdigest()[:16]
+    standalone = memo.get(key)
+
+    if standalone is not None:
+        _memo_hits.inc()
+    else:
+        if FOLLOWUP_REWRITE_LLM:
+            standalone = await _llm_rewrite(question, session)
+            if standalone:
+                _llm_rewrites.inc()
+        if not standalone:
+            standalone = heuristic_rewrite(question, topic)
+        _rewrites.inc()
+
+        memo[key] = standalone
+        while len(memo) > FOLLOWUP_MEMO_SIZE:
+            memo.pop(next(iter(memo)))
+
+    return standalone, True
+
+
+def retrieval_scope(version: Optional[str], filters: Optional[dict], groups: List[str]) -> str:
+    """
+    What a retrieval's results depend on besides the question.
+    """
+    return json.dumps([version, filters or {}, sorted(groups)], sort_keys=True, default=str)
+
+
+def _content_words(text: str) -> set:
+    return {word for word in _WORD_RE.findall(text.lower()) if word not in _FILLER_WORDS}
+
+
+def reusable_chunks(question: str, session: Session, scope: str) -> Optional[list]:
+    """
+    The previous turn's retrieved chunks, if this follow-up clearly stays
+    on them: same index version / filters / groups, and every content word
+    of the follow-up already appears in those chunks.
+    """
+    previous = session.state.get("retrieval")
+    if not FOLLOWUP_REUSE_CHUNKS or not previous or previous["scope"] != scope:
+        return None
+
+    retrieved = [
+        (Document(id=chunk_id, page_content=text, metadata=metadata), distance)
+        for chunk_id, text, metadata, distance in previous["chunks"]
+    ]
+    covered = _content_words(" ".join(doc.page_content for doc, _ in retrieved))
+    if not retrieved or not _content_words(question) <= covered:
+        return None
+
+    _chunk_reuse.inc()
+    return retrieved
+
+
+def remember_retrieval(session: Session, retrieved: list, scope: str) -> None:
+    session.state["retrieval"] = {
+        "scope": scope,
+        "chunks": [
+            [doc.id, doc.page_content, doc.metadata, float(distance)]
+            for doc, distance in retrieved
+        ],
+    }
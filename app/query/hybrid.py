@@ -0,0 +1,31 @@
+import os
+from typing import Dict, List, Sequence, Tuple
+
+# Fuse BM25 (lexical) results with dense results when the index has them
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+
+# Reciprocal rank fusion weights of each ranking
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# RRF rank constant (higher = flatter contribution across ranks)
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Tuple[Sequence[int], float]],
+    rrf_k: int = HYBRID_RRF_K,
+) -> List[int]:
+    """
+    Fuse (ranked ids, weight) lists: score(id) = sum(weight / (rrf_k + rank)).
+    Returns ids best first; ties keep the order of the first ranking.
+    """
+    scores: Dict[int, float] = {}
+    for ranked, weight in rankings:
+        for rank, item in enumerate(ranked, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank)
+
+    return sorted(scores, key=lambda item: -scores[item])
@@ -15,3 +15,14 @@ def get_rag_chain():
         model="llama-3.1-8b-instant",
         temperature=0.0,
     )
+
+
+def get_rewrite_llm(model: str = "llama-3.1-8b-instant", max_tokens: int = 64):
+    """
+    Small, short-output client for follow-up question rewriting.
+    """
+    return ChatGroq(
+        model=model,
+        temperature=0.0,
+        max_tokens=max_tokens,
+    )
@@ -1,25 +1,19 @@
+import os
 from typing import List
 from app.schemas.query import ChatMessage
+from app.query.token_budget import count_tokens, truncate_to_tokens
 
+# Whole prompt budget (instructions + context + history + question)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
 
-def build_chat_prompt(
-    question: str,
-    chat_history: List[ChatMessage],
-    context: str,
-    max_history: int = 4,
-) -> str:
-    """
-    Build ChatGPT-style prompt with limited conversation memory.
-    """
+# History share of the budget, and the most recent turns considered
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+PROMPT_MAX_HISTORY = int(os.getenv("PROMPT_MAX_HISTORY", "4"))
 
-    recent_history = chat_history[-max_history:]
+# A single long (pasted) turn is cut to this many tokens
+HISTORY_MAX_MESSAGE_TOKENS = int(os.getenv("HISTORY_MAX_MESSAGE_TOKENS", "250"))
 
-    conversation = ""
-    for msg in recent_history:
-        role = "User" if msg.role == "user" else "Assistant"
-        conversation += f"{role}: {msg.content}\n"
-
-    prompt = f"""
+PROMPT_TEMPLATE = """
 You are IntraMind, an internal enterprise knowledge intelligence system.
 
 Answer ONLY using the provided context.
@@ -36,4 +30,64 @@ User question:
 
 Answer:
 """
+
+
+def build_history(
+    chat_history: List[ChatMessage],
+    max_history: int = PROMPT_MAX_HISTORY,
+    max_tokens: int = HISTORY_TOKEN_BUDGET,
+    summary: str = "",
+) -> str:
+    """
+    Most recent turns that fit in max_tokens, oldest first. Long turns are
+    cut down; older turns are dropped first. The summary of earlier turns
+    (server-side sessions) gets whatever budget is left.
+    """
+    lines = []
+    remaining = max_tokens
+
+    for msg in reversed(chat_history[-max_history:]):
+        role = "User" if msg.role == "user" else "Assistant"
+        prefix = f"{role}: "
+        budget = min(remaining, HISTORY_MAX_MESSAGE_TOKENS) - count_tokens(prefix)
+        content = truncate_to_tokens(msg.content.strip(), budget) if budget > 0 else None
+        if content is None:
+            break
+
+        lines.append(prefix + content)
+        remaining -= count_tokens(prefix) + count_tokens(content) + 1
+
+    if summary:
+        prefix = "Earlier in the conversation:\n"
+        summary = truncate_to_tokens(summary, remaining - count_tokens(prefix))
+        if summary:
+            lines.append(prefix + summary)
+
+    return "".join(f"{line}\n" for line in reversed(lines))
+
+
+def build_chat_prompt(
+    question: str,
+    chat_history: List[ChatMessage],
+    context: str,
+    max_history: int = PROMPT_MAX_HISTORY,
+    max_tokens: int = PROMPT_TOKEN_BUDGET,
+    summary: str = "",
+) -> str:
+    """
+    Build ChatGPT-style prompt with limited conversation memory.
+    History gets what the budget leaves after the context and question,
+    capped at HISTORY_TOKEN_BUDGET.
+    """
+
+    base = PROMPT_TEMPLATE.format(context=context, conversation="", question=question)
+    history_budget = min(HISTORY_TOKEN_BUDGET, max_tokens - count_tokens(base, memoize=False))
+
+    conversation = build_history(chat_history, max_history, history_budget, summary)
+
+    prompt = PROMPT_TEMPLATE.format(
+        context=context,
+        conversation=conversation,
+        question=question,
+    )
     return prompt.strip()
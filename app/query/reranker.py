@@ -0,0 +1,259 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core import metrics
+from app.core.logger import get_logger
+
+# Optional cross-encoder stage between retrieval and context building
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+
+# Exported ONNX cross-encoder directory (model_quantized.onnx or model.onnx
+# + tokenizer.json). Empty: load RERANK_MODEL with sentence-transformers.
+RERANK_ONNX_PATH = os.getenv("RERANK_ONNX_PATH", "")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Dense candidates scored per question, and chunks kept after reranking
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "4"))
+
+# Hard per-request budget; over budget the dense order is used instead
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "2"))
+
+# (question, chunk) scores kept in memory
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+logger = get_logger()
+
+_latency_ms = metrics.histogram(
+    "rerank_latency_ms",
+    [5, 10, 20, 50, 100, 150, 200, 500],
+    "Cross-encoder scoring time per request",
+)
+_fallbacks = metrics.counter("rerank_fallbacks", "Requests served in dense order (over budget)")
+_cache_hits = metrics.counter("rerank_cache_hits", "(question, chunk) scores reused")
+_cache_misses = metrics.counter("rerank_cache_misses", "(question, chunk) scores computed")
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder on ONNX Runtime (CPU), int8-quantized if the directory
+    has model_quantized.onnx. Pairs are padded to the longest in the batch.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        max_length: int = RERANK_MAX_LENGTH,
+        threads: int = RERANK_THREADS,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / "model_quantized.onnx"
+        if not model_path.exists():
+            model_path = model_dir / "model.onnx"
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(pairs))
+        inputs = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feed = {name: value for name, value in inputs.items() if name in self._input_names}
+        logits = self.session.run(None, feed)[0]
+        return logits.reshape(len(pairs), -1)[:, 0]
+
+
+class TorchCrossEncoder:
+    """
+    sentence-transformers CrossEncoder (full precision, needs torch).
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = RERANK_MAX_LENGTH):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        return np.asarray(self.model.predict(list(pairs)), dtype=np.float32).reshape(-1)
+
+
+class Reranker:
+    """
+    Scores (question, chunk) pairs with a cross-encoder, in batches on a
+    dedicated executor, under a hard time budget. Scores are cached per
+    (question, chunk id), so repeated and concurrent questions are cheap.
+    """
+
+    def __init__(
+        self,
+        scorer,
+        budget_ms: float = RERANK_BUDGET_MS,
+        batch_size: int = RERANK_BATCH_SIZE,
+        cache_size: int = RERANK_CACHE_SIZE,
+    ):
+        self.scorer = scorer
+        self.budget = budget_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+
+    def warm_up(self) -> None:
+        self.scorer.predict([("warm up", "warm up")])
+
+    @staticmethod
+    def _key(question: str, doc: Document) -> Tuple[str, str]:
+        return question, doc.id or doc.page_content
+
+    def score(
+        self,
+        question: str,
+        docs: List[Document],
+        deadline: float,
+    ) -> Optional[List[float]]:
+        """
+        Scores for every doc, or None if the deadline passed first.
+        """
+        keys = [self._key(question, doc) for doc in docs]
+        scores: List[Optional[float]] = [None] * len(docs)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        _cache_hits.inc(len(docs) - len(missing))
+        _cache_misses.inc(len(missing))
+
+        for start in range(0, len(missing), self.batch_size):
+            if time.monotonic() > deadline:
+                return None
+
+            batch = missing[start:start + self.batch_size]
+            batch_scores = self.scorer.predict(
+                [(question, docs[i].page_content) for i in batch]
+            )
+
+            with self._lock:
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return scores
+
+    async def arerank(
+        self,
+        question: str,
+        retrieved: List[Tuple[Document, float]],
+        top_k: int = RERANK_TOP_K,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Best top_k of the retrieved (doc, distance) pairs by cross-encoder
+        score; the dense order if scoring does not fit in the budget.
+        Distances are kept, so confidence is still computed on them.
+        """
+        if len(retrieved) <= 1:
+            return retrieved[:top_k]
+
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        docs = [doc for doc, _ in retrieved]
+
+        try:
+            scores = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self._executor, self.score, question, docs, start + self.budget
+                ),
+                timeout=self.budget,
+            )
+        except asyncio.TimeoutError:
+            scores = None
+        except Exception as e:
+            logger.error(f"action=rerank failed error={e}")
+            scores = None
+
+        _latency_ms.observe((time.monotonic() - start) * 1000)
+
+        if scores is None:
+            _fallbacks.inc()
+            return retrieved[:top_k]
+
+        order = sorted(range(len(retrieved)), key=lambda i: -scores[i])
+        return [retrieved[i] for i in order[:top_k]]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_reranker: Optional[Reranker] = None
+
+
+def init_reranker() -> Optional[Reranker]:
+    """
+    Load and warm up the cross-encoder if reranking is enabled.
+    Called once from the app startup hook; failures disable reranking.
+    """
+    global _reranker
+
+    if not RERANK_ENABLED or _reranker is not None:
+        return _reranker
+
+    start_time = time.time()
+    try:
+        if RERANK_ONNX_PATH:
+            scorer = OnnxCrossEncoder(Path(RERANK_ONNX_PATH))
+        else:
+            scorer = TorchCrossEncoder(RERANK_MODEL)
+        reranker = Reranker(scorer)
+        reranker.warm_up()
+    except Exception as e:
+        logger.error(f"action=reranker_init failed error={e}")
+        return None
+
+    _reranker = reranker
+    duration_ms = int((time.time() - start_time) * 1000)
+    logger.info(
+        f"action=reranker_init backend={type(scorer).__name__} "
+        f"duration_ms={duration_ms}"
+    )
+    return _reranker
+
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    The process-wide reranker, or None when reranking is off.
+    """
+    return _reranker
@@ -1,40 +1,550 @@
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from typing import List, Tuple
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
 
+import asyncio
+import faiss
 import os
+import threading
+import time
 from pathlib import Path
 
+import numpy as np
+
+from app.core.bm25_index import BM25Index, has_bm25_index
+from app.core.chunk_store import ChunkStore, has_chunk_store
+from app.core.embedding_backend import (
+    EMBEDDING_MODEL_NAME,
+    create_embedder,
+    embedding_model_id,
+)
+from app.core.embedding_cache import QueryEmbeddingCache
+from app.core.faiss_index import apply_search_params, read_index, search_params
+from app.core.filter_index import (
+    ACL_FIELD,
+    Filters,
+    FilterIndex,
+    RowFilter,
+    has_filter_index,
+)
+from app.core.logger import get_logger
+from app.query.batcher import QueryBatcher
+from app.query.hybrid import (
+    HYBRID_CANDIDATES,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_LEXICAL_WEIGHT,
+    HYBRID_SEARCH_ENABLED,
+    reciprocal_rank_fusion,
+)
+from app.core.vector_store import INDEX_FILE, resolve_vectorstore_version
+
 VECTOR_STORE_PATH = Path(
     os.getenv("VECTOR_STORE_PATH", "./_vector_store")
 )
 
+# Seconds between manifest checks for a newly published index (0 disables)
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "30"))
+
+# Max seconds to wait for in-flight queries before freeing a swapped-out index
+INDEX_DRAIN_TIMEOUT = float(os.getenv("INDEX_DRAIN_TIMEOUT", "60"))
+
+# Over-fetch factor when an index type cannot apply a filter during search
+FILTER_OVERFETCH = int(os.getenv("FILTER_OVERFETCH", "10"))
+
+# Threads dedicated to CPU-bound embedding + FAISS search (0 = one per CPU core)
+RETRIEVER_WORKERS = int(os.getenv("RETRIEVER_WORKERS", "0"))
+
+logger = get_logger()
+
+
+class IndexSnapshot:
+    """
+    One loaded index version. Queries hold a reference while they search,
+    so a swapped-out snapshot is only freed once it has drained.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        path: Path,
+        index: faiss.Index,
+        chunks: ChunkStore,
+        bm25: Optional[BM25Index] = None,
+        filters: Optional[FilterIndex] = None,
+    ):
+        self.version = version
+        self.path = path
+        self.index = index
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.filters = filters
+        self._refs = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            self._refs += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._refs -= 1
+            if self._refs == 0:
+                self._cond.notify_all()
+
+    def drain(self, timeout: float = INDEX_DRAIN_TIMEOUT) -> bool:
+        """
+        Wait until no query holds this snapshot. Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._refs == 0, timeout=timeout)
+
+    def close(self) -> None:
+        # Dropping the references unmaps the files once the last reader is gone
+        self.index = None
+        self.chunks = None
+        self.bm25 = None
+        self.filters = None
+
+    def row_filter(
+        self,
+        filters: Optional[Filters] = None,
+        groups: Optional[List[str]] = None,
+    ) -> Optional[RowFilter]:
+        """
+        Cached selector for the filter set and the caller's ACL groups
+        (None when nothing is restricted).
+        Raises ValueError if the filters cannot be applied to this version.
+        """
+        if self.filters is None:
+            if filters:
+                raise ValueError("Metadata filters are not available for this index")
+            return None
+        return self.filters.row_filter(filters, groups)
+
+
+class RetrieverService:
+    """
+    Long-lived retriever holding the embedding model and FAISS index
+    in memory. Created once at app startup and shared by all requests.
+    New index versions are loaded next to the current one and swapped in
+    atomically, without interrupting in-flight queries.
+    """
+
+    def __init__(
+        self,
+        vectorstore_path: Path = VECTOR_STORE_PATH,
+        model_name: str = EMBEDDING_MODEL_NAME,
+    ):
+        self.vectorstore_path = Path(vectorstore_path)
+        self.model_name = model_name
+        self.embedder: Optional[Embeddings] = None
+        self._current: Optional[IndexSnapshot] = None
+        self._ready = threading.Event()
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watcher = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers = RETRIEVER_WORKERS or os.cpu_count() or 1
+        self._swap_listeners: List[Callable[[str], None]] = []
+        self._query_cache = QueryEmbeddingCache()
+        self._batcher = QueryBatcher(
+            self.search_batch,
+            self._get_executor,
+            max_in_flight=self._workers,
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current.version if current else None
+
+    def _load_snapshot(self, version: str, path: Path) -> IndexSnapshot:
+        start_time = time.time()
+
+        if self.embedder is None:
+            self.embedder = create_embedder(self.model_name)
+
+        if not has_chunk_store(path):
+            raise FileNotFoundError(
+                f"No chunk store in {path}: index predates the chunk store "
+                "format, rebuild it with scripts.build_vectorstore"
+            )
+
+        index = read_index(path / INDEX_FILE)
+        chunks = ChunkStore(path)
+        bm25 = (
+            BM25Index(path)
+            if HYBRID_SEARCH_ENABLED and has_bm25_index(path)
+            else None
+        )
+        filters = FilterIndex(path) if has_filter_index(path) else None
+        if filters is None and any(
+            ACL_FIELD in metadata for metadata in chunks.distinct_metadata
+        ):
+            # Fail closed: ACLs present but not enforceable
+            raise RuntimeError(
+                f"Index {version} has document ACLs but no filter bitsets, "
+                "rebuild it with scripts.build_vectorstore"
+            )
+        apply_search_params(index)
+
+        # Warm up the new index before it takes traffic
+        index.search(self.embed_queries(["warm up"]), 1)
+
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"action=index_load version={version} path={path} "
+            f"vectors={index.ntotal} "
+            f"index_type={type(faiss.downcast_index(index)).__name__} "
+            f"hybrid={bm25 is not None} duration_ms={duration_ms}"
+        )
+        return IndexSnapshot(version, path, index, chunks, bm25, filters)
+
+    def reload(self) -> bool:
+        """
+        Load the currently published index version if it differs from the
+        one being served, then swap it in. Returns True if a swap happened.
+        """
+        with self._reload_lock:
+            version, path = resolve_vectorstore_version(self.vectorstore_path)
+            if self._current is not None and self._current.version == version:
+                return False
+
+            snapshot = self._load_snapshot(version, path)
+
+            with self._swap_lock:
+                old, self._current = self._current, snapshot
+
+            self._ready.set()
+            logger.info(
+                f"action=index_swap version={version} "
+                f"previous={old.version if old else None}"
+            )
+
+            for listener in self._swap_listeners:
+                try:
+                    listener(version)
+                except Exception as e:
+                    logger.error(f"action=index_swap listener_failed error={e}")
+
+        if old is not None:
+            threading.Thread(
+                target=self._retire,
+                args=(old,),
+                name=f"index-drain-{old.version}",
+                daemon=True,
+            ).start()
+
+        return True
+
+    def add_swap_listener(self, listener: Callable[[str], None]) -> None:
+        """
+        Register a callback run with the new version after every index swap
+        (e.g. to invalidate caches derived from the previous index).
+        """
+        self._swap_listeners.append(listener)
+
+    def _retire(self, snapshot: IndexSnapshot) -> None:
+        if not snapshot.drain():
+            logger.warning(
+                f"action=index_drain timeout version={snapshot.version}"
+            )
+        snapshot.close()
+        logger.info(f"action=index_retired version={snapshot.version}")
+
+    def load(self) -> None:
+        """
+        Load the embedding model and published FAISS index (once).
+        """
+        if self._current is None:
+            self.reload()
+
+    def warm_up(self) -> None:
+        """
+        Load the index (which runs a throwaway search so the first real
+        query does not pay for lazy model / BLAS initialization).
+        Marks the service ready.
+        """
+        start_time = time.time()
+        self.load()
+        duration_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"action=retriever_warm_up duration_ms={duration_ms}")
+
+    @contextmanager
+    def snapshot(self) -> Iterator[IndexSnapshot]:
+        """
+        Pin the current index version for the duration of a query.
+        """
+        if not self.ready:
+            raise RuntimeError("Retriever is not ready")
+
+        with self._swap_lock:
+            current = self._current
+            current.acquire()
+
+        try:
+            yield current
+        finally:
+            current.release()
+
+    def search_batch(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        filters: Optional[Filters] = None,
+        groups: Optional[List[str]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Embed several questions in one forward pass and run one FAISS
+        search over the query matrix. With a BM25 index, each question's
+        dense and lexical candidates are fused by reciprocal rank.
+        filters ({metadata field: accepted values}) and the caller's groups
+        (document ACLs; None = unrestricted) restrict both searches through
+        precomputed bitsets, applied inside the FAISS search.
+        Returns per-question [(Document, score)], score being the L2 distance.
+        """
+        with self.snapshot() as snap:
+            row_filter = snap.row_filter(filters, groups)
+            if row_filter is not None and row_filter.count == 0:
+                return [[] for _ in questions]
+
+            vectors = self.embed_queries(questions)
+            fetch_k = max(top_k, HYBRID_CANDIDATES) if snap.bm25 is not None else top_k
+            scores, indices = _dense_search(snap.index, vectors, fetch_k, row_filter)
+
+            results = []
+            for question, vector, row_scores, row_indices in zip(
+                questions, vectors, scores, indices
+            ):
+                # -1 happens when not enough docs are returned
+                distances = {
+                    int(i): float(score)
+                    for score, i in zip(row_scores, row_indices)
+                    if i != -1
+                }
+                rows = list(distances)
+
+                if snap.bm25 is not None:
+                    lexical_rows, _ = snap.bm25.search(question, fetch_k, row_filter)
+                    rows = reciprocal_rank_fusion([
+                        (rows, HYBRID_DENSE_WEIGHT),
+                        (lexical_rows.tolist(), HYBRID_LEXICAL_WEIGHT),
+                    ])
+                rows = rows[:top_k]
+
+                missing = [row for row in rows if row not in distances]
+                if missing:
+                    distances.update(
+                        _distances(snap.index, vector, missing, distances)
+                    )
+
+                results.append(
+                    [(snap.chunks.document(row), distances[row]) for row in rows]
+                )
+
+            return results
+
+    def search(
+        self,
+        question: str,
+        top_k: int = 4,
+        filters: Optional[Filters] = None,
+        groups: Optional[List[str]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Retrieve top-k relevant document chunks with similarity scores.
+        """
+        # returned format: [(Document, score), ...]
+        return self.search_batch([question], top_k, filters, groups)[0]
+
+    def embed_queries(self, questions: List[str]) -> np.ndarray:
+        """
+        Embed questions through the shared query-embedding cache.
+        Every query-embedding path (search, answer cache) goes through here.
+        """
+        if self.embedder is None:
+            raise RuntimeError("Retriever is not ready")
+        return self._query_cache.embed(
+            self.embedder, embedding_model_id(self.embedder, self.model_name), questions
+        )
+
+    def embed_query(self, question: str) -> np.ndarray:
+        return self.embed_queries([question])[0]
+
+    async def aembed_query(self, question: str) -> np.ndarray:
+        """
+        Embed one question on the retriever executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self.embed_query, question
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers,
+                thread_name_prefix="retriever",
+            )
+        return self._executor
+
+    async def asearch(
+        self,
+        question: str,
+        top_k: int = 4,
+        filters: Optional[Filters] = None,
+        groups: Optional[List[str]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Async search: the query joins the micro-batcher, whose batches run
+        on the dedicated retriever executor so the event loop (and the
+        shared threadpool) stay free.
+        """
+        return await self._batcher.search(
+            question,
+            top_k,
+            filters=filters or None,
+            groups=sorted(groups) if groups is not None else None,
+        )
+
+    def shutdown(self) -> None:
+        """
+        Stop the watcher and the retriever executor (app shutdown).
+        """
+        self.stop_watcher()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def start_watcher(self, interval: float = INDEX_WATCH_INTERVAL) -> None:
+        """
+        Poll the manifest in the background and hot-swap new index versions.
+        """
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def _watch():
+            while not self._stop_watcher.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"action=index_watch failed error={e}")
+
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(
+            target=_watch, name="index-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        if self._watcher is None:
+            return
+
+        self._stop_watcher.set()
+        self._watcher.join(timeout=5)
+        self._watcher = None
+
+
+def _dense_search(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    k: int,
+    row_filter: Optional[RowFilter],
+) -> Tuple[np.ndarray, np.ndarray]:
+    if row_filter is None:
+        return index.search(vectors, k)
+
+    try:
+        return index.search(vectors, k, params=search_params(index, row_filter.selector))
+    except RuntimeError:
+        pass
+
+    # Index type without selector support (e.g. plain PQ): over-fetch and mask
+    fetch_k = min(index.ntotal, k * FILTER_OVERFETCH)
+    scores, indices = index.search(vectors, fetch_k)
+    keep = (indices != -1) & row_filter.contains(np.maximum(indices, 0))
+
+    out_scores = np.full((len(vectors), k), np.inf, dtype=np.float32)
+    out_indices = np.full((len(vectors), k), -1, dtype=np.int64)
+    for i in range(len(vectors)):
+        row_scores, row_indices = scores[i][keep[i]][:k], indices[i][keep[i]][:k]
+        out_scores[i, :len(row_scores)] = row_scores
+        out_indices[i, :len(row_indices)] = row_indices
+    return out_scores, out_indices
+
+
+def _distances(
+    index: faiss.Index,
+    vector: np.ndarray,
+    rows: List[int],
+    known: dict,
+) -> dict:
+    """
+    L2 distances of lexical-only hits (not in the dense top-k) to the query,
+    so confidence stays comparable. Indexes that cannot reconstruct vectors
+    (IVF) score them like the weakest dense hit.
+    """
+    try:
+        stored = index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+    except RuntimeError:
+        fallback = max(known.values(), default=0.0)
+        return {row: fallback for row in rows}
+
+    return {
+        row: float(np.sum((stored_vector - vector) ** 2))
+        for row, stored_vector in zip(rows, stored)
+    }
+
+
+_retriever: Optional[RetrieverService] = None
+
+
+def init_retriever(
+    vectorstore_path: Path = VECTOR_STORE_PATH,
+    model_name: str = EMBEDDING_MODEL_NAME,
+) -> RetrieverService:
+    """
+    Create, load and warm up the process-wide retriever.
+    Called once from the app startup hook.
+    """
+    global _retriever
+
+    if _retriever is None:
+        _retriever = RetrieverService(vectorstore_path, model_name)
+
+    _retriever.warm_up()
+    return _retriever
+
+
+def get_retriever() -> RetrieverService:
+    """
+    Return the process-wide retriever (created lazily if startup was skipped).
+    """
+    global _retriever
+
+    if _retriever is None:
+        _retriever = RetrieverService()
+
+    return _retriever
+
+
 def retrieve_chunks(
     question: str,
-    vectorstore_path:Path = VECTOR_STORE_PATH,
     top_k: int = 4,
-    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    filters: Optional[Filters] = None,
+    groups: Optional[List[str]] = None,
 ) -> List[Tuple[Document, float]]:
     """
-    Retrieve top-k relevant document chunks with similarity scores.
+    Retrieve top-k relevant document chunks with similarity scores
+    using the resident retriever.
     """
-
-    # 1. Load embedding model
-    embedder = HuggingFaceEmbeddings(model_name=model_name)
-
-    # 2. Load FAISS vector store
-    vectorstore = FAISS.load_local(
-        vectorstore_path,
-        embedder,
-        allow_dangerous_deserialization=True,
+    return get_retriever().search(
+        question, top_k=top_k, filters=filters, groups=groups
     )
-
-    # 3. Retrieve documents WITH scores
-    retrieved_with_scores = vectorstore.similarity_search_with_score(
-        query=question,
-        k=top_k,
-    )
-
-    # returned format: [(Document, score), ...]
-    return retrieved_with_scores
@@ -0,0 +1,268 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.logger import get_logger
+from app.query.prompt_builder import PROMPT_MAX_HISTORY
+from app.query.token_budget import count_tokens, truncate_to_tokens
+from app.schemas.query import ChatMessage
+
+# Server-side conversation history, referenced by QueryRequest.session_id
+SESSIONS_ENABLED = os.getenv("SESSIONS_ENABLED", "true").lower() == "true"
+
+# "memory" (per process) or "sql" (SQLAlchemy URL, shared by workers)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "sqlite:///./_sessions.sqlite")
+
+# Idle seconds before a session is evicted
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+
+# Max sessions held by the memory backend (least recently used evicted)
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+
+# Messages kept verbatim; older ones are folded into the running summary
+SESSION_RECENT_MESSAGES = int(os.getenv("SESSION_RECENT_MESSAGES", str(PROMPT_MAX_HISTORY)))
+
+# Size of the running summary, and of each folded message within it
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "300"))
+SESSION_SUMMARY_LINE_TOKENS = int(os.getenv("SESSION_SUMMARY_LINE_TOKENS", "60"))
+
+logger = get_logger()
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+
+class Session:
+    """
+    One conversation: recent messages verbatim plus a bounded summary of
+    the older ones, and small per-conversation state (follow-up rewrites,
+    last retrieval). id None: a stateless request (history sent by the client).
+    """
+
+    def __init__(
+        self,
+        session_id: Optional[str],
+        user: str,
+        messages: Optional[List[ChatMessage]] = None,
+        summary: str = "",
+        updated_at: Optional[float] = None,
+        state: Optional[dict] = None,
+    ):
+        self.id = session_id
+        self.user = user
+        self.messages: List[ChatMessage] = messages or []
+        self.summary = summary
+        self.updated_at = updated_at or time.time()
+        self.state: dict = state or {}
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "user": self.user,
+            "messages": [msg.model_dump() for msg in self.messages],
+            "summary": self.summary,
+            "state": self.state,
+        }, default=str)
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str, updated_at: float) -> "Session":
+        data = json.loads(data)
+        return cls(
+            session_id,
+            data["user"],
+            [ChatMessage(**msg) for msg in data["messages"]],
+            data["summary"],
+            updated_at,
+            data.get("state"),
+        )
+
+
+def summarize(summary: str, msg: ChatMessage) -> str:
+    """
+    Fold one message into the running summary: its first sentence, cut to
+    SESSION_SUMMARY_LINE_TOKENS. The oldest lines go first when the summary
+    exceeds SESSION_SUMMARY_TOKENS.
+    """
+    role = "User" if msg.role == "user" else "Assistant"
+    first = _SENTENCE_RE.split(msg.content.strip(), maxsplit=1)[0]
+    line = truncate_to_tokens(f"{role}: {first}", SESSION_SUMMARY_LINE_TOKENS)
+
+    lines = summary.split("\n") if summary else []
+    if line:
+        lines.append(line)
+    # Per-line counts (memoized) plus one per newline, not the joined text
+    tokens = [count_tokens(text) for text in lines]
+    while lines and sum(tokens) + len(tokens) - 1 > SESSION_SUMMARY_TOKENS:
+        lines.pop(0)
+        tokens.pop(0)
+    return "\n".join(lines)
+
+
+def append_turn(
+    session: Session,
+    question: str,
+    answer: str,
+    recent_messages: int = SESSION_RECENT_MESSAGES,
+) -> None:
+    """
+    Add a question/answer pair; messages beyond the recent window are
+    summarized, so a session's size stays bounded.
+    """
+    session.messages.append(ChatMessage(role="user", content=question))
+    session.messages.append(ChatMessage(role="assistant", content=answer))
+
+    while len(session.messages) > recent_messages:
+        session.summary = summarize(session.summary, session.messages.pop(0))
+    session.updated_at = time.time()
+
+
+class SessionStore(ABC):
+    """
+    Session backend interface: get (None if unknown or expired) and save.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    def create(self, user: str) -> Session:
+        return Session(secrets.token_urlsafe(16), user)
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Session]:
+        ...
+
+    @abstractmethod
+    def save(self, session: Session) -> None:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU of sessions with idle TTL (one store per worker).
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+    ):
+        super().__init__(ttl_seconds)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, str]" = OrderedDict()
+        self._updated: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is None:
+                return None
+            updated_at = self._updated[session_id]
+            if time.time() - updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                del self._updated[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+
+        # Stored serialized: callers get their own copy
+        return Session.from_json(session_id, data, updated_at)
+
+    def save(self, session: Session) -> None:
+        with self._lock:
+            self._sessions[session.id] = session.to_json()
+            self._updated[session.id] = session.updated_at
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                old_id, _ = self._sessions.popitem(last=False)
+                del self._updated[old_id]
+
+
+class SqlSessionStore(SessionStore):
+    """
+    Sessions in a SQL table through SQLAlchemy (SQLite by default), shared
+    by every worker. Expired rows are purged every few hundred writes.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, url: str = SESSION_DB_URL, ttl_seconds: float = SESSION_TTL_SECONDS):
+        from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine
+
+        super().__init__(ttl_seconds)
+        connect_args = {"timeout": 5} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args)
+
+        metadata = MetaData()
+        self.table = Table(
+            "chat_sessions",
+            metadata,
+            Column("id", String(64), primary_key=True),
+            Column("data", Text, nullable=False),
+            Column("updated_at", Float, nullable=False, index=True),
+        )
+        metadata.create_all(self.engine)
+        self._writes = 0
+
+    def get(self, session_id: str) -> Optional[Session]:
+        table = self.table
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                table.select().where(
+                    table.c.id == session_id,
+                    table.c.updated_at > time.time() - self.ttl_seconds,
+                )
+            ).first()
+        if row is None:
+            return None
+        return Session.from_json(row.id, row.data, row.updated_at)
+
+    def save(self, session: Session) -> None:
+        table = self.table
+        values = {"data": session.to_json(), "updated_at": session.updated_at}
+
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                table.update().where(table.c.id == session.id).values(**values)
+            )
+            if updated.rowcount == 0:
+                conn.execute(table.insert().values(id=session.id, **values))
+
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute(
+                    table.delete().where(
+                        table.c.updated_at < time.time() - self.ttl_seconds
+                    )
+                )
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    The process-wide session store, or None when sessions are off.
+    Falls back to the memory backend if the SQL one cannot be opened.
+    """
+    global _store
+
+    if not SESSIONS_ENABLED:
+        return None
+
+    with _store_lock:
+        if _store is None:
+            if SESSION_BACKEND == "sql":
+                try:
+                    _store = SqlSessionStore()
+                except Exception as e:
+                    logger.error(f"action=session_store_init failed error={e}")
+            if _store is None:
+                _store = MemorySessionStore()
+            logger.info(f"action=session_store_init backend={type(_store).__name__}")
+    return _store
@@ -0,0 +1,95 @@
+import math
+import os
+from functools import lru_cache
+from typing import Optional
+
+from app.core.logger import get_logger
+
+# tokenizer.json of the answering model (e.g. Llama 3.1) for exact counts;
+# empty: estimate from the text length
+PROMPT_TOKENIZER_PATH = os.getenv("PROMPT_TOKENIZER_PATH", "")
+
+# Average characters per token used by the estimate
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "4"))
+
+# Texts whose token count is remembered (chunks and history turns come back
+# across requests); longer texts (whole prompts) are counted every time
+PROMPT_TOKEN_CACHE_SIZE = int(os.getenv("PROMPT_TOKEN_CACHE_SIZE", "20000"))
+PROMPT_TOKEN_CACHE_MAX_CHARS = int(os.getenv("PROMPT_TOKEN_CACHE_MAX_CHARS", "4000"))
+
+logger = get_logger()
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if PROMPT_TOKENIZER_PATH:
+            try:
+                from tokenizers import Tokenizer
+
+                tokenizer = Tokenizer.from_file(PROMPT_TOKENIZER_PATH)
+                tokenizer.no_truncation()
+                tokenizer.no_padding()
+                _tokenizer = tokenizer
+            except Exception as e:
+                logger.error(
+                    f"action=prompt_tokenizer_load failed "
+                    f"path={PROMPT_TOKENIZER_PATH} error={e}"
+                )
+    return _tokenizer
+
+
+def _count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)
+
+
+_count_tokens_cached = lru_cache(maxsize=PROMPT_TOKEN_CACHE_SIZE)(_count_tokens)
+
+
+def count_tokens(text: str, memoize: bool = True) -> int:
+    """
+    Token count of a prompt piece (local tokenizer, or estimated).
+    Only short texts are memoized; pass memoize=False for text that is
+    unique to one request (the assembled prompt).
+    """
+    if not text:
+        return 0
+
+    if memoize and len(text) <= PROMPT_TOKEN_CACHE_MAX_CHARS:
+        return _count_tokens_cached(text)
+    return _count_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …") -> Optional[str]:
+    """
+    Longest prefix of `text` within max_tokens (marker included), cut on a
+    word boundary when possible. None if nothing useful fits.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens - count_tokens(marker)
+    if budget <= 0:
+        return None
+
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+        end = offsets[budget - 1][1]
+    else:
+        end = int(budget * PROMPT_CHARS_PER_TOKEN)
+
+    prefix = text[:end]
+    space = prefix.rfind(" ")
+    if space > len(prefix) // 2:
+        prefix = prefix[:space]
+    prefix = prefix.rstrip()
+    return prefix + marker if prefix else None
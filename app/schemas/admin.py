@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class RevokeTokenRequest(BaseModel):
+    token: Optional[str] = None
+    jti: Optional[str] = None
+    # Token expiry (epoch seconds): how long the deny-list entry is kept
+    # (default: the token's exp claim, or JWT_MAX_TOKEN_LIFETIME_SECONDS)
+    exp: Optional[float] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Literal
+from typing import Dict, List, Literal, Optional, Union
 
 
 class ChatMessage(BaseModel):
@@ -7,12 +7,21 @@ class ChatMessage(BaseModel):
     content: str
 
 
+FilterValue = Union[str, int, float, bool]
+
+
 class QueryRequest(BaseModel):
     question: str
+    # Server-side conversation (returned by the previous answer); when set,
+    # chat_history is not needed and is ignored
+    session_id: Optional[str] = None
     chat_history: List[ChatMessage] = []
+    # {metadata field: value or list of accepted values}, e.g. {"department": "HR"}
+    filters: Dict[str, Union[FilterValue, List[FilterValue]]] = {}
 
 
 class QueryResponse(BaseModel):
     answer: str
     confidence: float
     sources: List[str]
+    session_id: Optional[str] = None
@@ -1,29 +1,281 @@
+import hashlib
+import json
 import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from dotenv import load_dotenv
 
+from app.core import metrics
+from app.core.logger import get_logger
+
 load_dotenv()
 
 security = HTTPBearer()
 
 JWT_SECRET = os.getenv("JWT_SECRET")
+# One algorithm or a comma-separated list (e.g. "RS256,ES256" with JWKS)
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 REQUIRED_GROUP = os.getenv("REQUIRED_GROUP", "RAG-App-Users")
 
+# Verified tokens kept (by SHA-256 digest) until their exp
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Max seconds a verified token is trusted without re-verification
+# (tokens without exp, and revocations through the deny-list file)
+JWT_CACHE_MAX_TTL_SECONDS = float(os.getenv("JWT_CACHE_MAX_TTL_SECONDS", "3600"))
+
+# Longest lifetime of an issued token: a revoked jti (or a token without exp)
+# is denied this long; 0 keeps it until cleared
+JWT_MAX_TOKEN_LIFETIME_SECONDS = float(os.getenv("JWT_MAX_TOKEN_LIFETIME_SECONDS", "0"))
+
+# Asymmetric signatures: keys from a JWKS endpoint, cached locally and
+# refreshed in the background (never fetched on the request path)
+JWT_JWKS_URL = os.getenv("JWT_JWKS_URL", "")
+JWT_JWKS_REFRESH_SECONDS = float(os.getenv("JWT_JWKS_REFRESH_SECONDS", "300"))
+
+# Optional revoked tokens shared by all workers: one jti or token SHA-256 per line,
+# reloaded by the same background thread
+JWT_DENYLIST_FILE = os.getenv("JWT_DENYLIST_FILE", "")
+
+logger = get_logger()
+
+_cache_hits = metrics.counter("jwt_cache_hits", "Requests authenticated from the verification cache")
+_cache_misses = metrics.counter("jwt_cache_misses", "Tokens fully verified (signature + claims)")
+_denied = metrics.counter("jwt_denied", "Requests with a revoked token")
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class JwksKeys:
+    """
+    Signing keys by kid, swapped in whole by the refresher thread.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._keys: Dict[Optional[str], dict] = {}
+
+    def refresh(self) -> None:
+        with urllib.request.urlopen(self.url, timeout=5) as response:
+            jwks = json.load(response)
+        self._keys = {key.get("kid"): key for key in jwks.get("keys", [])}
+        logger.info(f"action=jwks_refresh keys={len(self._keys)}")
+
+    def get(self, kid: Optional[str]) -> Optional[dict]:
+        keys = self._keys
+        if kid is None and len(keys) == 1:
+            return next(iter(keys.values()))
+        return keys.get(kid)
+
+
+def _token_exp(token: str) -> Optional[float]:
+    # Only bounds how long a revocation is kept: the signature does not matter
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+        return float(exp) if exp is not None else None
+    except (JWTError, TypeError, ValueError):
+        return None
+
+
+class DenyList:
+    """
+    Revoked token digests / jti values, each kept until the token's exp
+    (no exp: max_lifetime seconds, or until cleared if 0).
+    """
+
+    def __init__(self, max_lifetime: float = JWT_MAX_TOKEN_LIFETIME_SECONDS):
+        self.max_lifetime = max_lifetime
+        self._entries: Dict[str, Optional[float]] = {}
+        self._file_entries: frozenset = frozenset()
+        self._file_mtime = None
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires_at: Optional[float] = None) -> None:
+        now = time.time()
+        if expires_at is None and self.max_lifetime > 0:
+            expires_at = now + self.max_lifetime
+        with self._lock:
+            self._entries[key] = expires_at
+            for stale in [k for k, exp in self._entries.items() if exp is not None and exp < now]:
+                del self._entries[stale]
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key: Optional[str]) -> bool:
+        return key is not None and (key in self._entries or key in self._file_entries)
+
+    def reload_file(self, path: str) -> None:
+        mtime = os.path.getmtime(path)
+        if mtime == self._file_mtime:
+            return
+        lines = Path(path).read_text(encoding="utf-8").split()
+        self._file_entries = frozenset(line.strip() for line in lines if line.strip())
+        self._file_mtime = mtime
+        logger.info(f"action=jwt_denylist_reload entries={len(self._file_entries)}")
+
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens once and caches the claims by token digest
+    until exp, so repeated requests with the same token skip signature
+    and claim checks. Revocations (deny-list) are checked on every hit.
+    """
 
-def verify_jwt(
+    def __init__(
+        self,
+        secret: Optional[str] = JWT_SECRET,
+        algorithms: str = JWT_ALGORITHM,
+        jwks_url: str = JWT_JWKS_URL,
+        cache_size: int = JWT_CACHE_SIZE,
+        max_ttl: float = JWT_CACHE_MAX_TTL_SECONDS,
+    ):
+        self.secret = secret
+        self.algorithms = [a.strip() for a in algorithms.split(",") if a.strip()]
+        self.jwks = JwksKeys(jwks_url) if jwks_url else None
+        self.cache_size = cache_size
+        self.max_ttl = max_ttl
+        self.deny_list = DenyList()
+
+        self._cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresh_now = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _key(self, token: str):
+        if self.jwks is None:
+            return self.secret
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.jwks.get(kid)
+        if key is None:
+            # Unknown kid (rotated keys): refresh in the background, reject now
+            self._refresh_now.set()
+            raise JWTError(f"Unknown signing key {kid}")
+        return key
+
+    def _revoked(self, digest: str, payload: dict) -> bool:
+        return digest in self.deny_list or payload.get("jti") in self.deny_list
+
+    def verify(self, token: str) -> dict:
+        """
+        Claims of a valid, unrevoked token. Raises JWTError otherwise.
+        """
+        digest = token_digest(token)
+        now = time.time()
+
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                payload, valid_until = cached
+                if now < valid_until:
+                    self._cache.move_to_end(digest)
+                else:
+                    del self._cache[digest]
+                    cached = None
+
+        if cached is not None:
+            _cache_hits.inc()
+        else:
+            _cache_misses.inc()
+            payload = jwt.decode(token, self._key(token), algorithms=self.algorithms)
+
+            exp = payload.get("exp")
+            valid_until = min(float(exp), now + self.max_ttl) if exp else now + self.max_ttl
+            with self._lock:
+                self._cache[digest] = (payload, valid_until)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if self._revoked(digest, payload):
+            _denied.inc()
+            raise JWTError("Token has been revoked")
+        return payload
+
+    def revoke(self, token: Optional[str] = None, jti: Optional[str] = None,
+               expires_at: Optional[float] = None) -> None:
+        """
+        Deny a token (or every token with this jti) in this process, until
+        expires_at, else the token's own exp, else the longest token
+        lifetime (a jti may be on tokens issued later).
+        """
+        if token:
+            self.deny_list.add(token_digest(token), expires_at or _token_exp(token))
+            with self._lock:
+                self._cache.pop(token_digest(token), None)
+        if jti:
+            self.deny_list.add(jti, expires_at)
+
+    def clear_revocation(self, token: Optional[str] = None, jti: Optional[str] = None) -> None:
+        """
+        Accept a revoked token (or jti) again in this process.
+        """
+        if token:
+            self.deny_list.discard(token_digest(token))
+        if jti:
+            self.deny_list.discard(jti)
+
+    def _refresh(self) -> None:
+        if self.jwks is not None:
+            try:
+                self.jwks.refresh()
+            except Exception as e:
+                logger.error(f"action=jwks_refresh failed error={e}")
+        if JWT_DENYLIST_FILE:
+            try:
+                self.deny_list.reload_file(JWT_DENYLIST_FILE)
+            except OSError as e:
+                logger.error(f"action=jwt_denylist_reload failed error={e}")
+
+    def start(self, interval: float = JWT_JWKS_REFRESH_SECONDS) -> None:
+        """
+        Load keys / deny-list now, then keep refreshing them in the background.
+        """
+        if self.jwks is None and not JWT_DENYLIST_FILE:
+            return
+        self._refresh()
+        if self._thread is not None:
+            return
+
+        def _loop():
+            while not self._stop.is_set():
+                self._refresh_now.wait(interval)
+                if self._stop.is_set():
+                    break
+                self._refresh_now.clear()
+                self._refresh()
+                # Bound refreshes triggered by unknown kids
+                self._stop.wait(1.0)
+
+        self._thread = threading.Thread(target=_loop, name="jwks-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._refresh_now.set()
+
+
+token_verifier = TokenVerifier()
+
+
+async def verify_jwt(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ):
     token = credentials.credentials
 
     try:
-        payload = jwt.decode(
-            token,
-            JWT_SECRET,
-            algorithms=[JWT_ALGORITHM],
-        )
+        payload = token_verifier.verify(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,3 +292,19 @@ def verify_jwt(
 
     # You can return user context if needed
     return payload
+
+
+def require_group(group: str, detail: Optional[str] = None):
+    """
+    Dependency: the authenticated user (verify_jwt), who must also be in `group`.
+    """
+
+    async def _require_group(user=Depends(verify_jwt)):
+        if group not in user.get("groups", []):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail or f"Membership of {group} required",
+            )
+        return user
+
+    return _require_group
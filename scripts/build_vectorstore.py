@@ -1,17 +1,37 @@
+import argparse
 import os
+import shutil
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv() 
-from azure.storage.blob import BlobServiceClient
+
+# ---- blob sync ----
+from app.core.blob_storage import download_container, upload_directory
 
 # ---- ingestion pipeline ----
-from app.ingestion.document_loader import load_documents
-from app.ingestion.chunker import chunk_documents
+from app.ingestion.dedup import DEDUP_ENABLED, NearDuplicateFilter, shares_chunks
+from app.ingestion.document_loader import load_metadata_map
+from app.ingestion.incremental import (
+    INGEST_MANIFEST_FILE,
+    iter_file_chunks,
+    plan_changes,
+    read_ingest_manifest,
+    scan_source_files,
+)
 
 # ---- vectorstore utilities ----
+from app.core.chunk_store import ChunkStore, has_chunk_store
+from app.core.embedding_backend import EMBEDDING_MODEL_NAME, create_embedder
+from app.core.embedding_cache import get_ingestion_embedder, log_cache_stats
+from app.core.faiss_index import FAISS_INDEX_SPEC
 from app.core.vector_store import (
-    create_faiss_vectorstore,
-    save_vectorstore,
+    add_chunks_to_index,
+    build_faiss_vectorstore,
+    new_vectorstore_version,
+    open_vectorstore_update,
+    publish_vectorstore_version,
+    resolve_vectorstore_version,
+    VERSIONS_DIR,
 )
 
 # -----------------------------
@@ -22,84 +42,243 @@ VECTOR_CONTAINER = os.getenv("VECTOR_CONTAINER", "vector-store")
 
 RAW_DATA_PATH = Path(os.getenv("RAW_DATA_PATH", "./_raw_data"))
 VECTOR_STORE_PATH = Path(os.getenv("VECTOR_STORE_PATH", "./_vector_store"))
+VECTOR_STORE_KEEP_VERSIONS = int(os.getenv("VECTOR_STORE_KEEP_VERSIONS", "3"))
+INCREMENTAL_BUILD = os.getenv("INCREMENTAL_BUILD", "false").lower() == "true"
 
 RAW_DATA_PATH.mkdir(parents=True, exist_ok=True)
 VECTOR_STORE_PATH.mkdir(parents=True, exist_ok=True)
 
 
 # -----------------------------
-# Blob helpers
+# Main pipeline
 # -----------------------------
-def get_blob_service():
-    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    if not conn_str:
-        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING not set")
-    return BlobServiceClient.from_connection_string(conn_str)
+def print_dedup_stats(deduplicator: NearDuplicateFilter):
+    stats = deduplicator.stats()
+    print(
+        f"🧹 Merged {stats['dropped']} near-duplicate chunks into "
+        f"{stats['kept_with_copies']} kept chunks: index shrank by "
+        f"{stats['ratio'] * 100:.1f}% ({stats['chunks']} → "
+        f"{stats['chunks'] - stats['dropped']} new chunks)"
+    )
 
 
-def download_container(container_name: str, target_dir: Path):
-    print(f"⬇️ Downloading data from Blob container: {container_name}")
-    service = get_blob_service()
-    container = service.get_container_client(container_name)
+def build_full(
+    metadata_map: dict,
+    fingerprints: dict,
+    output_dir: Path,
+    index_spec: str = FAISS_INDEX_SPEC,
+    report_recall: bool = False,
+    dedup: bool = DEDUP_ENABLED,
+):
+    # 2️⃣ Load → clean → chunk → 3️⃣ dedup → 4️⃣ embed/index, streamed in fixed-size batches
+    print(f"📄 Loading, chunking and embedding documents (index: {index_spec})")
+    files = {}
+    report = {} if report_recall else None
+    chunks = iter_file_chunks(
+        RAW_DATA_PATH, sorted(fingerprints), metadata_map, fingerprints, files
+    )
+    deduplicator = NearDuplicateFilter() if dedup else None
+    if deduplicator is not None:
+        chunks = deduplicator.filter(chunks)
 
-    for blob in container.list_blobs():
-        local_file = target_dir / blob.name
-        local_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(local_file, "wb") as f:
-            f.write(container.download_blob(blob.name).readall())
+    writer = build_faiss_vectorstore(
+        chunks,
+        output_dir,
+        index_spec=index_spec,
+        report=report,
+    )
 
+    if not files:
+        raise RuntimeError("No documents found in raw data")
 
-def upload_directory(container_name: str, source_dir: Path):
-    print(f"⬆️ Uploading vectors to Blob container: {container_name}")
-    service = get_blob_service()
-    container = service.get_container_client(container_name)
+    if writer is None:
+        raise RuntimeError("No chunks created")
 
-    for file in source_dir.rglob("*"):
-        if file.is_file():
-            blob_path = file.relative_to(source_dir).as_posix()
-            with open(file, "rb") as f:
-                container.upload_blob(blob_path, f, overwrite=True)
+    print(f"🧠 Indexed {writer.rows} chunks")
+    if deduplicator is not None:
+        deduplicator.apply(writer, files)
+        deduplicator.save(output_dir)
+        print_dedup_stats(deduplicator)
+    if report:
+        print(
+            f"📏 recall@{report['k']}={report['recall']} "
+            f"latency={report['latency_ms']}ms (exact {report['exact_latency_ms']}ms) "
+            f"size={report['bytes_per_vector']}B/vector "
+            f"(exact {report['exact_bytes_per_vector']}B/vector) "
+            f"over {report['queries']} queries"
+        )
+    return writer, files
 
 
-# -----------------------------
-# Main pipeline
-# -----------------------------
-def main():
-    print("🚀 Starting vector build pipeline")
+def build_incremental(
+    metadata_map: dict,
+    fingerprints: dict,
+    previous: dict,
+    version_dir: Path,
+    output_dir: Path,
+    index_spec: str = FAISS_INDEX_SPEC,
+    dedup: bool = DEDUP_ENABLED,
+):
+    changed, removed = plan_changes(fingerprints, previous)
+    print(
+        f"🔍 {len(changed)} new/changed, {len(removed)} removed, "
+        f"{len(fingerprints) - len(changed)} unchanged files"
+    )
 
-    # 1️⃣ Download raw data from Blob
-    download_container(RAW_DATA_CONTAINER, RAW_DATA_PATH)
+    if not changed and not removed:
+        return None, previous["files"]
 
-    # 2️⃣ Load documents
-    print("📄 Loading documents")
-    documents = load_documents(
-        data_dir=RAW_DATA_PATH,
-        metadata_path=RAW_DATA_PATH / "document_metadata.yaml",
-    )
+    # Merged chunks list several files: only a full build can re-split them
+    if shares_chunks(changed + removed, previous["files"]):
+        print("ℹ️ Changed files share deduplicated chunks, running a full build")
+        return build_full(metadata_map, fingerprints, output_dir, index_spec, dedup=dedup)
 
-    if not documents:
-        raise RuntimeError("No documents found in raw data")
+    files = dict(previous["files"])
 
-    # 3️⃣ Chunk documents
-    print("✂️ Chunking documents")
-    chunks = chunk_documents(documents)
+    # Copy the published index without the vectors of removed and changed files
+    stale_ids = {
+        chunk_id
+        for name in changed + removed
+        if name in files
+        for chunk_id in files.pop(name)["chunk_ids"]
+    }
+    if stale_ids:
+        print(f"🗑️ Deleting {len(stale_ids)} stale vectors")
+    writer = open_vectorstore_update(version_dir, output_dir, stale_ids)
+    if writer is None:
+        print("ℹ️ Published index cannot delete vectors, running a full build")
+        return build_full(metadata_map, fingerprints, output_dir, index_spec, dedup=dedup)
 
-    if not chunks:
+    # Re-embed only new/changed files, streamed in batches; copies of
+    # already indexed chunks are merged into them
+    print("📄 Loading, chunking and embedding changed documents")
+    chunks = iter_file_chunks(RAW_DATA_PATH, changed, metadata_map, fingerprints, files)
+    deduplicator = None
+    if dedup:
+        deduplicator = NearDuplicateFilter()
+        published = ChunkStore(version_dir)
+        if not deduplicator.load_existing(version_dir, published, stale_ids):
+            print("ℹ️ No saved dedup signatures for the published index, shingling its chunks")
+            deduplicator.add_existing(
+                (doc.id, doc) for doc in published if doc.id not in stale_ids
+            )
+        chunks = deduplicator.filter(chunks)
+
+    embedder = get_ingestion_embedder(
+        EMBEDDING_MODEL_NAME, create_embedder(EMBEDDING_MODEL_NAME)
+    )
+    added = add_chunks_to_index(writer, chunks, embedder)
+    print(f"🧠 Embedded {added} new chunks")
+    if deduplicator is not None:
+        deduplicator.apply(writer, files)
+        deduplicator.save(output_dir)
+        print_dedup_stats(deduplicator)
+
+    if writer.rows == 0:
         raise RuntimeError("No chunks created")
 
-    # 4️⃣ Create vector store
-    print("🧠 Creating FAISS vector store")
-    vectorstore = create_faiss_vectorstore(chunks)
+    return writer, files
+
 
-    # 5️⃣ Save vectors locally
-    print("💾 Saving vector store locally")
-    save_vectorstore(vectorstore, VECTOR_STORE_PATH)
+def main(
+    incremental: bool = INCREMENTAL_BUILD,
+    index_spec: str = FAISS_INDEX_SPEC,
+    report_recall: bool = False,
+    dedup: bool = DEDUP_ENABLED,
+):
+    print("🚀 Starting vector build pipeline")
+
+    # 1️⃣ Sync raw data from Blob (only new/changed blobs are transferred)
+    print(f"⬇️ Downloading data from Blob container: {RAW_DATA_CONTAINER}")
+    download_container(RAW_DATA_CONTAINER, RAW_DATA_PATH)
 
-    # 6️⃣ Upload vectors back to Blob
-    upload_directory(VECTOR_CONTAINER, VECTOR_STORE_PATH)
+    metadata_map = load_metadata_map(RAW_DATA_PATH / "document_metadata.yaml")
+    fingerprints = scan_source_files(RAW_DATA_PATH, metadata_map)
+
+    previous = None
+    if incremental:
+        _, version_dir = resolve_vectorstore_version(VECTOR_STORE_PATH)
+        previous = read_ingest_manifest(version_dir)
+        if previous is None:
+            print("ℹ️ No ingest manifest for the published index, running a full build")
+        elif not has_chunk_store(version_dir):
+            print("ℹ️ Published index predates the chunk store, running a full build")
+            previous = None
+        elif previous.get("index_spec", "Flat") != index_spec:
+            print(f"ℹ️ Index type changed to {index_spec}, running a full build")
+            previous = None
+
+    # The new version is written straight into a temporary directory
+    version, output_dir = new_vectorstore_version(VECTOR_STORE_PATH)
+    try:
+        if previous is None:
+            writer, files = build_full(
+                metadata_map, fingerprints, output_dir, index_spec, report_recall, dedup
+            )
+        else:
+            writer, files = build_incremental(
+                metadata_map, fingerprints, previous, version_dir, output_dir, index_spec, dedup
+            )
+            if writer is None:
+                print("✅ Index is already up to date")
+                return
+
+        # 5️⃣ Finish the version locally (published atomically via manifest)
+        print("💾 Saving vector store locally")
+        rows = writer.close()
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    version = publish_vectorstore_version(
+        VECTOR_STORE_PATH,
+        version,
+        output_dir,
+        rows,
+        keep_versions=VECTOR_STORE_KEEP_VERSIONS,
+        extra_json={INGEST_MANIFEST_FILE: {"files": files, "index_spec": index_spec}},
+    )
+    print(f"📌 Published index version {version}")
+    log_cache_stats()
+
+    # 6️⃣ Upload vectors back to Blob (manifest last, unchanged files skipped,
+    #    then versions pruned locally are deleted remotely too)
+    print(f"⬆️ Uploading vectors to Blob container: {VECTOR_CONTAINER}")
+    upload_directory(VECTOR_CONTAINER, VECTOR_STORE_PATH, prune_prefix=f"{VERSIONS_DIR}/")
 
     print("🎉 Vector creation completed successfully")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=INCREMENTAL_BUILD,
+        help="Only re-embed new/changed files and drop vectors of removed files",
+    )
+    parser.add_argument(
+        "--index-spec",
+        default=FAISS_INDEX_SPEC,
+        help='FAISS index_factory string, e.g. "Flat", "IVF1024,Flat", '
+        '"IVF1024,PQ48", "HNSW32", "SQ8"',
+    )
+    parser.add_argument(
+        "--report-recall",
+        action="store_true",
+        help="Build an exact index alongside and report recall@k / latency / size",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        default=not DEDUP_ENABLED,
+        help="Index every chunk, without merging near-duplicates",
+    )
+    args = parser.parse_args()
+
+    main(
+        incremental=args.incremental,
+        index_spec=args.index_spec,
+        report_recall=args.report_recall,
+        dedup=not args.no_dedup,
+    )
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.core.chunk_store import ChunkStore, has_chunk_store
+from app.core.embedding_backend import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_ONNX_PATH,
+    EMBEDDING_TOLERANCE,
+    OnnxEmbeddings,
+    compare_embedders,
+    create_embedder,
+)
+from app.core.vector_store import resolve_vectorstore_version
+
+VECTOR_STORE_PATH = Path(os.getenv("VECTOR_STORE_PATH", "./_vector_store"))
+
+SAMPLE_TEXTS = [
+    "What is the travel reimbursement policy?",
+    "Employees must submit form HR-027 within 30 days of the expense.",
+    "How many days of paid leave do new joiners get?",
+    "VPN access requires multi-factor authentication on every device.",
+    "Quarterly security training is mandatory for all staff.",
+]
+
+
+def sample_texts(limit: int) -> list:
+    """
+    Chunks of the published index (queries and documents alike), or
+    built-in sentences when no index is available.
+    """
+    _, version_dir = resolve_vectorstore_version(VECTOR_STORE_PATH)
+    if not has_chunk_store(version_dir):
+        return SAMPLE_TEXTS
+
+    chunks = ChunkStore(version_dir)
+    step = max(1, len(chunks) // limit)
+    return SAMPLE_TEXTS + [chunks.text(row) for row in range(0, len(chunks), step)][:limit]
+
+
+def main(onnx_path: Path, limit: int, tolerance: float) -> int:
+    texts = sample_texts(limit)
+    print(f"🔬 Comparing ONNX ({onnx_path}) vs torch on {len(texts)} texts")
+
+    report = compare_embedders(
+        create_embedder(EMBEDDING_MODEL_NAME, backend="torch"),
+        OnnxEmbeddings(onnx_path, EMBEDDING_MODEL_NAME),
+        texts,
+    )
+    print(
+        f"📏 min cosine={report['min_cosine']} mean cosine={report['mean_cosine']} "
+        f"max abs diff={report['max_abs_diff']}"
+    )
+
+    if report["min_cosine"] < tolerance:
+        print(f"❌ Below tolerance {tolerance}")
+        return 1
+
+    print(f"✅ Within tolerance {tolerance}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the ONNX embedding backend against the torch model"
+    )
+    parser.add_argument("--onnx-path", type=Path, default=Path(EMBEDDING_ONNX_PATH))
+    parser.add_argument("--limit", type=int, default=500, help="Chunks sampled from the index")
+    parser.add_argument("--tolerance", type=float, default=EMBEDDING_TOLERANCE)
+    args = parser.parse_args()
+
+    sys.exit(main(args.onnx_path, args.limit, args.tolerance))
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import datetime
+import json
 import streamlit.components.v1 as components
 
 # -----------------------------------
@@ -12,6 +13,7 @@ st.set_page_config(
 )
 
 BACKEND_URL = "http://localhost:8000/query"
+STREAM_URL = f"{BACKEND_URL}/stream"
 
 # -----------------------------------
 # Session State Init
@@ -25,6 +27,10 @@ if "jwt_token" not in st.session_state:
 if "last_meta" not in st.session_state:
     st.session_state.last_meta = None
 
+# Server-side conversation: history stays on the backend, only its id is sent
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+
 def render_meta(meta):
     """Render metadata compactly: progress bar for confidence and an expander for sources."""
     # meta: {'confidence': float (0-1), 'confidence_str': '41.0%', 'sources': [...]}
@@ -55,6 +61,21 @@ def render_meta(meta):
         else:
             st.markdown("(no sources)")
 
+def iter_sse(response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
 # -----------------------------------
 # Header (rendered via components for reliable styling)
 # -----------------------------------
@@ -84,6 +105,7 @@ with st.sidebar:
     if st.button("Reset Chat"):
         st.session_state.chat_history = []
         st.session_state.last_meta = None
+        st.session_state.session_id = None
         st.session_state.jwt_token = ""
         st.success("Chat reset.")
         rerun = getattr(st, "experimental_rerun", None)
@@ -126,7 +148,7 @@ if question:
 
         payload = {
             "question": question,
-            "chat_history": st.session_state.chat_history[:-1],
+            "session_id": st.session_state.session_id,
         }
 
         headers = {
@@ -135,47 +157,70 @@ if question:
         }
 
         with st.chat_message("assistant"):
-            with st.spinner("IntraMind is thinking..."):
-                try:
-                    response = requests.post(
-                        BACKEND_URL,
-                        json=payload,
-                        headers=headers,
-                        timeout=30,
-                    )
+            answer_box = st.empty()
+            try:
+                # Stream tokens as they are generated (no read timeout: long answers keep flowing)
+                with requests.post(
+                    STREAM_URL,
+                    json=payload,
+                    headers=headers,
+                    stream=True,
+                    timeout=(10, None),
+                ) as response:
 
                     if response.status_code == 200:
-                        data = response.json()
-
-                        answer = data.get("answer", "")
-                        confidence = data.get("confidence", 0.0)
-                        sources = data.get("sources", [])
-
-                        # Format confidence as a percent with one decimal
-                        formatted_conf = f"{confidence * 100:.1f}%"
-
-                        # store both numeric and string forms
-                        meta = {"confidence": float(confidence), "confidence_str": formatted_conf, "sources": sources}
-
-                        # 2️⃣ Save assistant message with metadata and timestamp
-                        assistant_msg = {"role": "assistant", "content": answer, "meta": meta, "ts": datetime.datetime.now().isoformat(timespec='seconds')}
-                        st.session_state.chat_history.append(assistant_msg)
-
-                        st.markdown(answer)
-
-                        # show metadata inline immediately using helper
-                        render_meta(meta)
-
-                        # 3️⃣ Save metadata separately for backward compatibility
-                        st.session_state.last_meta = meta
+                        answer = ""
+                        confidence = 0.0
+                        sources = []
+                        failed = False
+
+                        with st.spinner("IntraMind is thinking..."):
+                            events = iter_sse(response)
+                            # first event carries retrieval results
+                            for event, data in events:
+                                if event == "meta":
+                                    confidence = data.get("confidence", 0.0)
+                                    sources = data.get("sources", [])
+                                    st.session_state.session_id = data.get("session_id")
+                                    break
+
+                        for event, data in events:
+                            if event == "token":
+                                answer += data.get("text", "")
+                                answer_box.markdown(answer + "▌")
+                            elif event == "error":
+                                failed = True
+                                st.error(f"Backend error: {data.get('detail', '')}")
+                                break
+                            elif event == "done":
+                                break
+
+                        answer_box.markdown(answer)
+
+                        if not failed:
+                            # Format confidence as a percent with one decimal
+                            formatted_conf = f"{confidence * 100:.1f}%"
+
+                            # store both numeric and string forms
+                            meta = {"confidence": float(confidence), "confidence_str": formatted_conf, "sources": sources}
+
+                            # 2️⃣ Save assistant message with metadata and timestamp
+                            assistant_msg = {"role": "assistant", "content": answer, "meta": meta, "ts": datetime.datetime.now().isoformat(timespec='seconds')}
+                            st.session_state.chat_history.append(assistant_msg)
+
+                            # show metadata inline immediately using helper
+                            render_meta(meta)
+
+                            # 3️⃣ Save metadata separately for backward compatibility
+                            st.session_state.last_meta = meta
 
                     elif response.status_code == 401:
                         st.error("Invalid or expired JWT token.")
                     else:
                         st.error(f"Backend error: {response.text}")
 
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Backend not reachable: {e}")
+            except requests.exceptions.RequestException as e:
+                st.error(f"Backend not reachable: {e}")
 
 # -----------------------------------
 # Footer
@@ -0,0 +1,4 @@
+import os
+
+# app.api.query builds its LLM client at import time; tests stub its calls
+os.environ.setdefault("GROQ_API_KEY", "test-key")
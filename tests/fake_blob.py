@@ -0,0 +1,97 @@
+import hashlib
+import itertools
+import threading
+from types import SimpleNamespace
+
+
+class FakeContainer:
+    """
+    In-process stand-in for an azure ContainerClient: the subset of calls
+    blob_storage uses, with request counters and injectable failures.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.uncommitted = {}
+        self.lock = threading.Lock()
+        self.calls = {"download": [], "upload": 0, "stage_block": 0, "delete": 0}
+        self.fail_download_after = {}
+        self.fail_commit = set()
+        self._etags = itertools.count(1)
+
+    def put(self, name, data):
+        with self.lock:
+            self.blobs[name] = {
+                "data": data,
+                "etag": f'"{next(self._etags)}"',
+                "md5": hashlib.md5(data).digest(),
+            }
+
+    def list_blobs(self, name_starts_with=None):
+        with self.lock:
+            return [
+                SimpleNamespace(
+                    name=name,
+                    size=len(blob["data"]),
+                    etag=blob["etag"],
+                    content_settings=SimpleNamespace(content_md5=bytearray(blob["md5"])),
+                )
+                for name, blob in sorted(self.blobs.items())
+                if not name_starts_with or name.startswith(name_starts_with)
+            ]
+
+    def delete_blob(self, name):
+        with self.lock:
+            del self.blobs[name]
+            self.calls["delete"] += 1
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    def download_blob(self, offset=0, etag=None, match_condition=None, max_concurrency=1):
+        container = self.container
+        with container.lock:
+            blob = container.blobs[self.name]
+            if etag is not None and blob["etag"] != etag:
+                raise RuntimeError("ConditionNotMet")
+            container.calls["download"].append((self.name, offset))
+            data = blob["data"][offset:]
+            fail_after = container.fail_download_after.pop(self.name, None)
+
+        def chunks():
+            for start in range(0, len(data), 4):
+                if fail_after is not None and start >= fail_after:
+                    raise ConnectionError("connection reset")
+                yield data[start:start + 4]
+
+        return SimpleNamespace(chunks=chunks)
+
+    def upload_blob(self, f, overwrite=False, content_settings=None):
+        data = f.read()
+        self.container.put(self.name, data)
+        with self.container.lock:
+            self.container.calls["upload"] += 1
+
+    def get_block_list(self, block_list_type="committed"):
+        with self.container.lock:
+            staged = self.container.uncommitted.get(self.name, {})
+            return [], [SimpleNamespace(id=block_id, size=len(data)) for block_id, data in staged.items()]
+
+    def stage_block(self, block_id, data):
+        with self.container.lock:
+            self.container.uncommitted.setdefault(self.name, {})[block_id] = bytes(data)
+            self.container.calls["stage_block"] += 1
+
+    def commit_block_list(self, block_list, content_settings=None):
+        with self.container.lock:
+            if self.name in self.container.fail_commit:
+                self.container.fail_commit.discard(self.name)
+                raise ConnectionError("connection reset")
+            staged = self.container.uncommitted.pop(self.name)
+        self.container.put(self.name, b"".join(staged[block.id] for block in block_list))
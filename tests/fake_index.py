@@ -0,0 +1,30 @@
+from langchain_core.documents import Document
+
+import app.core.vector_store as vector_store
+import app.query.retriever as retriever_module
+from tests.fake_embeddings import HashEmbeddings
+
+
+def use_hash_embeddings(monkeypatch):
+    """
+    Build and serve indexes with HashEmbeddings instead of a real model.
+    """
+    monkeypatch.setattr(vector_store, "create_embedder", lambda *a, **k: HashEmbeddings())
+    monkeypatch.setattr(vector_store, "get_ingestion_embedder", lambda name, embedder: embedder)
+    monkeypatch.setattr(retriever_module, "create_embedder", lambda *a, **k: HashEmbeddings())
+
+
+def publish_version(root, docs, keep_versions=3):
+    """
+    Build [(chunk id, text, metadata)] into a new published version of
+    the vector store at root. Returns the version.
+    """
+    version, tmp_dir = vector_store.new_vectorstore_version(root)
+    chunks = [
+        (chunk_id, Document(page_content=text, metadata=metadata))
+        for chunk_id, text, metadata in docs
+    ]
+    rows = vector_store.build_faiss_vectorstore(iter(chunks), tmp_dir).close()
+    return vector_store.publish_vectorstore_version(
+        root, version, tmp_dir, rows, keep_versions=keep_versions
+    )
@@ -0,0 +1,69 @@
+import pytest
+
+import app.core.vector_store as vector_store
+from app.core.filter_index import ACL_FIELD, FILTER_HEADER_FILE, FilterIndex
+from app.query.retriever import RetrieverService
+from tests.fake_index import publish_version, use_hash_embeddings
+
+DOCS = [
+    ("public", "holiday calendar for all staff", {"department": "hr"}),
+    ("hr-only", "salary bands for all staff", {"department": "hr", ACL_FIELD: ["HR"]}),
+    ("finance", "budget holiday for all staff", {"department": "fin", ACL_FIELD: ["Finance", "Execs"]}),
+    ("execs", "board holiday for all staff", {"department": "fin", ACL_FIELD: ["Execs"]}),
+]
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    use_hash_embeddings(monkeypatch)
+    publish_version(tmp_path, DOCS)
+    return tmp_path
+
+
+def _visible(service, groups, filters=None):
+    results = service.search("holiday staff", top_k=10, filters=filters, groups=groups)
+    return sorted(doc.id for doc, _ in results)
+
+
+def test_users_only_see_public_and_their_groups_documents(index_root):
+    service = RetrieverService(index_root)
+    service.load()
+
+    assert _visible(service, []) == ["public"]
+    assert _visible(service, ["HR"]) == ["hr-only", "public"]
+    assert _visible(service, ["Execs"]) == ["execs", "finance", "public"]
+    assert _visible(service, ["Unknown-Group"]) == ["public"]
+
+
+def test_acls_combine_with_metadata_filters(index_root):
+    service = RetrieverService(index_root)
+    service.load()
+
+    assert _visible(service, ["Finance"], {"department": ["fin"]}) == ["finance"]
+    assert _visible(service, [], {"department": ["fin"]}) == []
+
+
+def test_trusted_callers_without_groups_are_unrestricted(index_root):
+    service = RetrieverService(index_root)
+    service.load()
+
+    assert _visible(service, None) == ["execs", "finance", "hr-only", "public"]
+
+
+def test_filter_index_bitmaps(index_root):
+    _, path = vector_store.resolve_vectorstore_version(index_root)
+    filters = FilterIndex(path)
+
+    assert filters.has_acl
+    assert filters.row_filter(groups=["HR"]).count == 2
+    assert filters.row_filter(groups=[]).count == 1
+    with pytest.raises(ValueError):
+        filters.row_filter({"not_a_field": ["x"]})
+
+
+def test_index_with_acls_but_no_bitsets_fails_closed(index_root):
+    _, path = vector_store.resolve_vectorstore_version(index_root)
+    (path / FILTER_HEADER_FILE).unlink()
+
+    with pytest.raises(RuntimeError):
+        RetrieverService(index_root).load()
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.documents import Document
+
+import app.api.query as query_api
+import app.main as main
+from app.query import answer_cache as answer_cache_module
+from app.query.answer_cache import AnswerCache
+from app.query.retriever import RetrieverService
+from app.query.sessions import Session
+from app.schemas.query import ChatMessage
+from tests.fake_index import publish_version, use_hash_embeddings
+
+GROUP = AnswerCache.group_key("v1", ["c2", "c1"], "history")
+
+
+def _put(cache, question, embedding, group=GROUP):
+    cache.put(group, question, f"answer to {question}", 0.9, ["a.pdf"], np.asarray(embedding))
+
+
+def test_exact_hit():
+    cache = AnswerCache()
+    _put(cache, "what is the leave policy", [1.0, 0.0])
+
+    entry = cache.get_exact(GROUP, "what is the leave policy")
+    assert entry.answer == "answer to what is the leave policy"
+    assert cache.get_exact(GROUP, "what is the travel policy") is None
+    # Chunk order does not matter
+    assert cache.get_exact(AnswerCache.group_key("v1", ["c1", "c2"], "history"), "what is the leave policy")
+
+
+def test_semantic_hit_above_threshold_and_miss_below():
+    cache = AnswerCache(similarity=0.95)
+    _put(cache, "what is the leave policy", [1.0, 0.0])
+
+    assert cache.has_candidates(GROUP)
+    close = cache.get_semantic(GROUP, np.array([1.0, 0.1]))  # cosine ~0.995
+    assert close.answer == "answer to what is the leave policy"
+    assert cache.get_semantic(GROUP, np.array([1.0, 1.0])) is None  # cosine ~0.71
+
+    other_group = AnswerCache.group_key("v1", ["c3"], "history")
+    assert not cache.has_candidates(other_group)
+    assert cache.get_semantic(other_group, np.array([1.0, 0.0])) is None
+
+
+def test_group_key_changes_with_chunks_history_and_version(monkeypatch):
+    retriever = SimpleNamespace(version="v1")
+    monkeypatch.setattr(query_api, "get_retriever", lambda: retriever)
+
+    def group(chunk_ids, messages):
+        retrieved = [(Document(id=chunk_id, page_content=""), 0.0) for chunk_id in chunk_ids]
+        return query_api._answer_group(retrieved, Session(None, "u", messages))
+
+    history = [ChatMessage(role="user", content="hi"), ChatMessage(role="assistant", content="hello")]
+    base = group(["c1", "c2"], history)
+
+    assert group(["c2", "c1"], list(history)) == base
+    assert group(["c1", "c3"], history) != base
+    assert group(["c1", "c2"], history + [ChatMessage(role="user", content="and?")]) != base
+    retriever.version = "v2"
+    assert group(["c1", "c2"], history) != base
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+    _put(cache, "q", [1.0, 0.0])
+
+    now[0] += 30
+    assert cache.get_exact(GROUP, "q") is not None
+    now[0] += 31
+    assert cache.get_exact(GROUP, "q") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    _put(cache, "q1", [1.0, 0.0])
+    _put(cache, "q2", [0.0, 1.0])
+    assert cache.get_exact(GROUP, "q1") is not None  # q2 is now the oldest
+
+    _put(cache, "q3", [1.0, 1.0])
+
+    assert len(cache) == 2
+    assert cache.get_exact(GROUP, "q2") is None
+    assert cache.get_exact(GROUP, "q1") is not None
+    assert cache.get_exact(GROUP, "q3") is not None
+
+
+def test_cache_is_cleared_when_the_index_is_swapped(tmp_path, monkeypatch):
+    use_hash_embeddings(monkeypatch)
+    publish_version(tmp_path, [("c1", "leave policy", {})])
+    service = RetrieverService(tmp_path)
+    service.load()
+
+    monkeypatch.setattr(main, "init_retriever", lambda: service)
+    monkeypatch.setattr(main, "get_retriever", lambda: service)
+    monkeypatch.setattr(main, "init_reranker", lambda: None)
+    monkeypatch.setattr(main, "get_reranker", lambda: None)
+    monkeypatch.setattr(service, "start_watcher", lambda *a, **k: None)
+
+    async def run():
+        async with main.lifespan(main.app):
+            _put(main.answer_cache, "q", [1.0, 0.0])
+            assert len(main.answer_cache) == 1
+
+            assert not service.reload()  # same version: nothing to drop
+            assert len(main.answer_cache) == 1
+
+            publish_version(tmp_path, [("c1", "new leave policy", {})])
+            assert service.reload()
+            assert len(main.answer_cache) == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        main.answer_cache.clear()
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.documents import Document
+
+from app.query.batcher import QueryBatcher
+
+
+class StubSearch:
+    """
+    search_batch stand-in: k results per question, tagged with the options
+    they were searched with. Records every call and the peak concurrency.
+    """
+
+    def __init__(self, delay=0.0, fail_groups=(), release=None):
+        self.delay = delay
+        self.fail_groups = set(fail_groups)
+        self.release = release
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, questions, top_k, **options):
+        with self._lock:
+            self.calls.append((list(questions), top_k, options))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            if self.release is not None:
+                self.release.wait(5)
+            time.sleep(self.delay)
+            if set(options.get("groups") or ()) & self.fail_groups:
+                raise RuntimeError("search failed")
+            return [
+                [
+                    (Document(page_content=f"{question}-{i}", metadata=dict(options)), float(i))
+                    for i in range(top_k)
+                ]
+                for question in questions
+            ]
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        yield executor
+
+
+def _batcher(stub, executor, **kwargs):
+    return QueryBatcher(stub, lambda: executor, **kwargs)
+
+
+def test_queries_within_the_window_share_one_search(executor):
+    stub = StubSearch()
+    batcher = _batcher(stub, executor, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(*(batcher.search(f"q{i}", top_k=2) for i in range(5)))
+
+    results = asyncio.run(run())
+
+    assert len(stub.calls) == 1
+    assert stub.calls[0][0] == [f"q{i}" for i in range(5)]
+    assert [[doc.page_content for doc, _ in result] for result in results] == [
+        [f"q{i}-0", f"q{i}-1"] for i in range(5)
+    ]
+
+
+def test_different_options_are_searched_separately(executor):
+    stub = StubSearch()
+    batcher = _batcher(stub, executor, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.search("q0", groups=["hr"]),
+            batcher.search("q1", groups=["it"]),
+            batcher.search("q2", groups=["hr"]),
+            batcher.search("q3", groups=["hr"], filters={"department": ["hr"]}),
+        )
+
+    results = asyncio.run(run())
+
+    assert sorted((questions, options.get("filters") is not None) for questions, _, options in stub.calls) == [
+        (["q0", "q2"], False),
+        (["q1"], False),
+        (["q3"], True),
+    ]
+    for question, groups, result in zip(["q0", "q1", "q2", "q3"], ["hr", "it", "hr", "hr"], results):
+        doc = result[0][0]
+        assert doc.page_content.startswith(question)
+        assert doc.metadata["groups"] == [groups]
+
+
+def test_top_k_is_sliced_per_caller(executor):
+    stub = StubSearch()
+    batcher = _batcher(stub, executor, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.search("q0", top_k=2),
+            batcher.search("q1", top_k=5),
+        )
+
+    short, long = asyncio.run(run())
+
+    assert len(stub.calls) == 1
+    assert stub.calls[0][1] == 5
+    assert (len(short), len(long)) == (2, 5)
+
+
+def test_failed_group_only_fails_its_callers(executor):
+    stub = StubSearch(fail_groups={"broken"})
+    batcher = _batcher(stub, executor, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.search("q0", groups=["broken"]),
+            batcher.search("q1", groups=["hr"]),
+            batcher.search("q2", groups=["broken"]),
+            return_exceptions=True,
+        )
+
+    failed, ok, failed_too = asyncio.run(run())
+
+    assert isinstance(failed, RuntimeError)
+    assert isinstance(failed_too, RuntimeError)
+    assert ok[0][0].page_content == "q1-0"
+
+
+def test_cancelled_caller_does_not_break_the_batch(executor):
+    release = threading.Event()
+    stub = StubSearch(release=release)
+    batcher = _batcher(stub, executor, max_wait_ms=20)
+
+    async def run():
+        cancelled = asyncio.ensure_future(batcher.search("q0"))
+        waiting = asyncio.ensure_future(batcher.search("q1"))
+        await asyncio.sleep(0.1)  # batch dispatched, search blocked
+        cancelled.cancel()
+        release.set()
+
+        result = await waiting
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        # The worker keeps serving later queries
+        later = await batcher.search("q2")
+        return result, later
+
+    result, later = asyncio.run(run())
+
+    assert stub.calls[0][0] == ["q0", "q1"]
+    assert result[0][0].page_content == "q1-0"
+    assert later[0][0].page_content == "q2-0"
+
+
+def test_max_in_flight_bounds_concurrent_batches(executor):
+    stub = StubSearch(delay=0.05)
+    batcher = _batcher(stub, executor, max_batch_size=1, max_wait_ms=0, max_in_flight=2)
+
+    async def run():
+        return await asyncio.gather(*(batcher.search(f"q{i}") for i in range(6)))
+
+    results = asyncio.run(run())
+
+    assert len(stub.calls) == 6
+    assert stub.peak == 2
+    assert [result[0][0].page_content for result in results] == [f"q{i}-0" for i in range(6)]
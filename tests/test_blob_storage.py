@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from app.core.blob_storage import SYNC_STATE_FILE, download_container, upload_directory
+from tests.fake_blob import FakeContainer
+
+
+@pytest.fixture
+def container():
+    container = FakeContainer()
+    container.put("document_metadata.yaml", b"documents: {}")
+    container.put("policies/travel.txt", b"travel policy " * 10)
+    container.put("policies/leave.txt", b"leave policy " * 10)
+    return container
+
+
+def _sync(container, target, **kwargs):
+    return download_container("raw-data", target, container=container, max_workers=4, **kwargs)
+
+
+def test_downloads_then_skips_on_etag(container, tmp_path):
+    assert _sync(container, tmp_path)["downloaded"] == 3
+    assert (tmp_path / "policies" / "travel.txt").read_bytes() == b"travel policy " * 10
+
+    downloads = len(container.calls["download"])
+    stats = _sync(container, tmp_path)
+    assert stats["skipped"] == 3
+    assert len(container.calls["download"]) == downloads
+
+    container.put("policies/leave.txt", b"new leave policy")
+    stats = _sync(container, tmp_path)
+    assert (stats["downloaded"], stats["skipped"]) == (1, 2)
+    assert (tmp_path / "policies" / "leave.txt").read_bytes() == b"new leave policy"
+
+
+def test_interrupted_download_resumes_from_part_file(container, tmp_path):
+    container.fail_download_after["policies/travel.txt"] = 40
+    with pytest.raises(ConnectionError):
+        _sync(container, tmp_path)
+    part = tmp_path / "policies" / "travel.txt.part"
+    assert part.stat().st_size == 40
+
+    stats = _sync(container, tmp_path)
+    assert stats["resumed"] == 1
+    assert ("policies/travel.txt", 40) in container.calls["download"]
+    assert (tmp_path / "policies" / "travel.txt").read_bytes() == b"travel policy " * 10
+    assert not part.exists()
+
+
+def test_deleted_blobs_are_pruned(container, tmp_path):
+    _sync(container, tmp_path)
+    (tmp_path / "orphan.txt.part").write_bytes(b"x")
+    del container.blobs["policies/leave.txt"]
+
+    stats = _sync(container, tmp_path)
+    assert stats["deleted"] == 2
+    assert not (tmp_path / "policies" / "leave.txt").exists()
+    assert (tmp_path / "policies" / "travel.txt").exists()
+    assert "policies/leave.txt" not in json.loads((tmp_path / SYNC_STATE_FILE).read_text())
+
+
+def test_prune_only_touches_the_prefix(container, tmp_path):
+    _sync(container, tmp_path)
+    del container.blobs["policies/leave.txt"]
+
+    stats = _sync(container, tmp_path, prefix="policies/travel")
+    assert stats["deleted"] == 0
+    assert (tmp_path / "policies" / "leave.txt").exists()
+
+
+def test_concurrent_upload_skips_unchanged_files(tmp_path):
+    container = FakeContainer()
+    for i in range(30):
+        (tmp_path / "versions" / f"v{i % 3}").mkdir(parents=True, exist_ok=True)
+        (tmp_path / "versions" / f"v{i % 3}" / f"f{i}.bin").write_bytes(bytes([i]) * (i + 1))
+    (tmp_path / "manifest.json").write_text("{}")
+
+    stats = upload_directory("vectors", tmp_path, container=container, max_workers=8, chunk_size=16)
+    assert stats["uploaded"] + stats["resumed"] == 31
+    assert container.blobs["versions/v2/f29.bin"]["data"] == bytes([29]) * 30
+
+    stats = upload_directory("vectors", tmp_path, container=container, max_workers=8, chunk_size=16)
+    assert stats["skipped"] == 31
+
+
+def test_interrupted_block_upload_reuses_staged_blocks(tmp_path):
+    container = FakeContainer()
+    (tmp_path / "index.faiss").write_bytes(bytes(range(100)))
+    container.fail_commit.add("index.faiss")
+
+    with pytest.raises(ConnectionError):
+        upload_directory("vectors", tmp_path, container=container, chunk_size=16)
+    staged = container.calls["stage_block"]
+    assert staged == 7
+
+    # The failed commit left its blocks staged: the retry only commits
+    assert upload_directory("vectors", tmp_path, container=container, chunk_size=16)["resumed"] == 1
+    assert container.calls["stage_block"] == staged
+    assert container.blobs["index.faiss"]["data"] == bytes(range(100))
+
+
+def test_upload_prunes_only_under_prefix(tmp_path):
+    container = FakeContainer()
+    container.put("versions/old/index.faiss", b"old")
+    container.put("notes.txt", b"kept")
+    (tmp_path / "versions" / "new").mkdir(parents=True)
+    (tmp_path / "versions" / "new" / "index.faiss").write_bytes(b"new")
+
+    stats = upload_directory("vectors", tmp_path, container=container, prune_prefix="versions/")
+
+    assert stats["deleted"] == 1
+    assert sorted(container.blobs) == ["notes.txt", "versions/new/index.faiss"]
@@ -0,0 +1,59 @@
+import functools
+import importlib
+
+import pytest
+
+import app.core.vector_store as vector_store
+from app.core.blob_storage import upload_directory
+from tests.fake_blob import FakeContainer
+from tests.fake_embeddings import HashEmbeddings
+
+
+@pytest.fixture
+def build(monkeypatch, tmp_path):
+    raw = tmp_path / "raw"
+    monkeypatch.setenv("RAW_DATA_PATH", str(raw))
+    monkeypatch.setenv("VECTOR_STORE_PATH", str(tmp_path / "vectors"))
+    script = importlib.import_module("scripts.build_vectorstore")
+
+    container = FakeContainer()
+    monkeypatch.setattr(script, "RAW_DATA_PATH", raw)
+    monkeypatch.setattr(script, "VECTOR_STORE_PATH", tmp_path / "vectors")
+    monkeypatch.setattr(script, "VECTOR_STORE_KEEP_VERSIONS", 1)
+    monkeypatch.setattr(script, "download_container", lambda *a, **k: None)
+    monkeypatch.setattr(
+        script, "upload_directory", functools.partial(upload_directory, container=container)
+    )
+    monkeypatch.setattr(script, "log_cache_stats", lambda: None)
+    for module in (script, vector_store):
+        monkeypatch.setattr(module, "create_embedder", lambda *a, **k: HashEmbeddings())
+        monkeypatch.setattr(module, "get_ingestion_embedder", lambda name, embedder: embedder)
+
+    raw.mkdir(parents=True, exist_ok=True)
+    (raw / "document_metadata.yaml").write_text("documents:\n  travel.txt: {department: hr}\n")
+    (raw / "travel.txt").write_text("Travel must be approved by a manager. " * 20)
+    return script, container
+
+
+def _remote_versions(container):
+    return {name.split("/")[1] for name in container.blobs if name.startswith("versions/")}
+
+
+def test_remote_keeps_only_the_local_versions(build):
+    script, container = build
+
+    script.main(dedup=False)
+    first = _remote_versions(container)
+    assert len(first) == 1
+
+    (script.RAW_DATA_PATH / "travel.txt").write_text("Travel is booked through the portal. " * 20)
+    script.main(dedup=False)
+
+    remaining = _remote_versions(container)
+    assert len(remaining) == 1
+    assert remaining != first
+    assert container.calls["delete"] > 0
+
+    _, version_dir = vector_store.resolve_vectorstore_version(script.VECTOR_STORE_PATH)
+    assert remaining == {version_dir.name}
+    assert "manifest.json" in container.blobs
@@ -0,0 +1,75 @@
+import json
+
+from langchain_core.documents import Document
+
+from app.core.chunk_store import ChunkStore, write_chunk_store
+from app.ingestion.dedup import DEDUP_HEADER_FILE, NearDuplicateFilter
+
+POLICY = " ".join(f"word{i}" for i in range(200))
+
+
+def _chunk(chunk_id, text, source_file, department="hr"):
+    return chunk_id, Document(
+        page_content=text,
+        metadata={"source_file": source_file, "department": department},
+    )
+
+
+def _publish(directory, chunks):
+    deduplicator = NearDuplicateFilter()
+    kept = list(deduplicator.filter(chunks))
+    write_chunk_store(
+        directory,
+        ((chunk_id, doc.page_content, doc.metadata) for chunk_id, doc in kept),
+    )
+    deduplicator.save(directory)
+    return ChunkStore(directory)
+
+
+def test_saved_signatures_merge_new_copies(tmp_path):
+    store = _publish(tmp_path, [
+        _chunk("a", POLICY, "a.pdf"),
+        _chunk("b", "something else entirely " * 10, "b.pdf"),
+    ])
+
+    deduplicator = NearDuplicateFilter()
+    assert deduplicator.load_existing(tmp_path, store)
+
+    kept = list(deduplicator.filter([
+        _chunk("c", POLICY, "c.pdf"),
+        _chunk("d", POLICY, "d.pdf", department="it"),
+    ]))
+
+    assert [chunk_id for chunk_id, _ in kept] == ["d"]
+    assert deduplicator.dropped == {"c": "a"}
+    assert deduplicator.merged == {"a": ["c.pdf"]}
+
+
+def test_skipped_ids_are_not_registered(tmp_path):
+    store = _publish(tmp_path, [_chunk("a", POLICY, "a.pdf")])
+
+    deduplicator = NearDuplicateFilter()
+    assert deduplicator.load_existing(tmp_path, store, skip_ids={"a"})
+
+    kept = list(deduplicator.filter([_chunk("c", POLICY, "c.pdf")]))
+    assert [chunk_id for chunk_id, _ in kept] == ["c"]
+
+
+def test_missing_or_mismatched_signatures_are_not_loaded(tmp_path):
+    store = _publish(tmp_path, [_chunk("a", POLICY, "a.pdf")])
+
+    assert not NearDuplicateFilter(shingle_size=3).load_existing(tmp_path, store)
+
+    (tmp_path / DEDUP_HEADER_FILE).unlink()
+    assert not NearDuplicateFilter().load_existing(tmp_path, store)
+
+
+def test_saved_rows_follow_index_order(tmp_path):
+    _publish(tmp_path, [
+        _chunk("a", POLICY, "a.pdf"),
+        _chunk("b", POLICY, "b.pdf"),
+        _chunk("c", "other text " * 20, "c.pdf"),
+    ])
+
+    header = json.loads((tmp_path / DEDUP_HEADER_FILE).read_text())
+    assert header["rows"] == len(ChunkStore(tmp_path)) == 2
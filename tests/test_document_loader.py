@@ -0,0 +1,53 @@
+import os
+import time
+
+import pytest
+
+from app.ingestion.document_loader import iter_loaded_files
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+
+
+def _files(tmp_path, hung, healthy):
+    # Reading a FIFO nobody writes to blocks forever: a parser hung in C code
+    paths = []
+    for name in hung:
+        os.mkfifo(tmp_path / name)
+        paths.append(tmp_path / name)
+    for name in healthy:
+        (tmp_path / name).write_text(f"contents of {name}")
+        paths.append(tmp_path / name)
+    return paths, {path.name: {"department": "HR"} for path in paths}
+
+
+def test_hung_files_do_not_starve_healthy_ones(tmp_path):
+    paths, metadata_map = _files(tmp_path, ["h1.txt", "h2.txt"], ["z.txt", "y.txt", "x.txt"])
+
+    start = time.monotonic()
+    results = list(iter_loaded_files(paths, metadata_map, workers=2, timeout=1))
+
+    assert [path.name for path, _ in results] == ["h1.txt", "h2.txt", "z.txt", "y.txt", "x.txt"]
+    assert [docs is None for _, docs in results] == [True, True, False, False, False]
+    assert results[2][1][0].page_content == "contents of z.txt"
+    assert results[2][1][0].metadata == {"department": "HR", "source_file": "z.txt"}
+    assert time.monotonic() - start < 10
+
+
+def test_timeout_counts_from_the_start_of_each_parse(tmp_path):
+    # y.txt waits in the queue behind h1.txt for over a timeout, but parses quickly
+    paths, metadata_map = _files(tmp_path, ["h1.txt"], ["y.txt"] + [f"f{i}.txt" for i in range(6)])
+
+    results = dict(iter_loaded_files(paths, metadata_map, workers=2, timeout=1))
+
+    assert results[paths[0]] is None
+    assert all(results[path] for path in paths[1:])
+
+
+def test_parse_errors_yield_none(tmp_path):
+    paths, metadata_map = _files(tmp_path, [], ["a.txt", "b.txt"])
+    paths[0].unlink()
+
+    results = list(iter_loaded_files(paths, metadata_map, workers=2, timeout=5))
+
+    assert results[0][1] is None
+    assert results[1][1][0].page_content == "contents of b.txt"
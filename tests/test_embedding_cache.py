@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.core.embedding_cache import (
+    EmbeddingCache,
+    cache_dir,
+    embedding_key,
+    get_ingestion_embedder,
+)
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, dim, model_id="fake-model"):
+        self.dim = dim
+        self.model_id = model_id
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text))] * self.dim for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_round_trip_and_reopen(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m", 4)
+    keys = [embedding_key("m", "a"), embedding_key("m", "b")]
+    cache.put_many(keys, np.ones((2, 4), dtype=np.float32))
+
+    reopened = EmbeddingCache(tmp_path, "m", 4)
+    assert len(reopened) == 2
+    assert reopened.get(keys[0]).shape == (4,)
+
+
+def test_rejects_writes_of_another_dim(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m", 4)
+    with pytest.raises(ValueError):
+        cache.put_many([embedding_key("m", "a")], np.ones((1, 16), dtype=np.float32))
+
+
+def test_rejects_directory_of_another_model_or_dim(tmp_path):
+    EmbeddingCache(tmp_path, "m", 16).put_many(
+        [embedding_key("m", "a")], np.ones((1, 16), dtype=np.float32)
+    )
+    with pytest.raises(ValueError):
+        EmbeddingCache(tmp_path, "m", 384)
+    with pytest.raises(ValueError):
+        EmbeddingCache(tmp_path, "other", 16)
+
+
+def test_fails_on_fewer_vectors_than_keys(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m", 4)
+    keys = [embedding_key("m", "a"), embedding_key("m", "b")]
+    cache.put_many(keys, np.ones((2, 4), dtype=np.float32))
+
+    with open(tmp_path / "vectors.f32", "r+b") as f:
+        f.truncate(4 * 4)
+    with pytest.raises(ValueError):
+        EmbeddingCache(tmp_path, "m", 4)
+
+
+def test_truncates_vectors_left_by_a_crashed_writer(tmp_path):
+    cache = EmbeddingCache(tmp_path, "m", 4)
+    cache.put_many([embedding_key("m", "a")], np.ones((1, 4), dtype=np.float32))
+
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 10)
+    assert len(EmbeddingCache(tmp_path, "m", 4)) == 1
+    assert (tmp_path / "vectors.f32").stat().st_size == 16
+
+
+def test_models_of_different_dims_use_separate_directories(tmp_path):
+    small = get_ingestion_embedder("fake-model", FakeEmbeddings(16), str(tmp_path))
+    small.embed_documents(["policy text"])
+
+    large_model = FakeEmbeddings(384)
+    large = get_ingestion_embedder("fake-model", large_model, str(tmp_path))
+    vectors = large.embed_documents(["policy text"])
+
+    # Embedded by the model, not served from the 16-d vectors
+    assert len(vectors[0]) == 384
+    assert large_model.calls == 1
+    assert json.loads((cache_dir(str(tmp_path), "fake-model", 384) / "meta.json").read_text()) == {
+        "model": "fake-model",
+        "dim": 384,
+    }
+
+
+def test_cached_texts_skip_the_model(tmp_path):
+    model = FakeEmbeddings(8)
+    embedder = get_ingestion_embedder("fake-model", model, str(tmp_path))
+    embedder.embed_documents(["a", "b"])
+    embedder.embed_documents(["a", "b"])
+
+    assert model.calls == 1
+
+
+def test_shared_tier_trims_least_recently_used(tmp_path, monkeypatch):
+    from app.core.embedding_cache import _SharedEmbeddingTier
+
+    monkeypatch.setattr(_SharedEmbeddingTier, "TOUCH_BATCH", 1)
+    tier = _SharedEmbeddingTier(str(tmp_path / "shared.sqlite"), max_entries=2)
+    vector = np.ones(4, dtype=np.float32)
+
+    tier.put(b"old", vector)
+    tier.put(b"new", vector)
+    assert tier.get(b"old") is not None  # now the most recently used
+    tier._writes = 999  # the next write trims
+    tier.put(b"newest", vector)
+
+    assert tier.get(b"old") is not None
+    assert tier.get(b"new") is None
@@ -0,0 +1,33 @@
+import pytest
+
+from app.query.followup import is_follow_up
+
+
+@pytest.mark.parametrize("question", [
+    "Is there a remote work policy?",
+    "What is the deadline for this year's appraisal?",
+    "What does this form require?",
+    "Which documents does that onboarding checklist list?",
+    "What happens to unused leave if it is not taken by December?",
+    "What if I lose my laptop?",
+    "What if my manager rejects my leave request?",
+    "So how many vacation days do interns get?",
+    "Or can contractors apply?",
+])
+def test_standalone_questions_are_not_follow_ups(question):
+    assert not is_follow_up(question)
+
+
+@pytest.mark.parametrize("question", [
+    "and for contractors?",
+    "What about international travel?",
+    "Is it mandatory?",
+    "What is their notice period?",
+    "Does that apply to interns?",
+    "Can you explain that?",
+    "Is the same true for part-time staff?",
+    "What if it is submitted late?",
+    "So does that apply to interns?",
+])
+def test_follow_ups_are_detected(question):
+    assert is_follow_up(question)
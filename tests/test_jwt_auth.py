@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app.security import jwt_auth
+from app.security.jwt_auth import DenyList, TokenVerifier, token_digest
+
+SECRET = "test-secret"
+
+
+def _token(**claims):
+    return jwt.encode({"sub": "u", "groups": ["RAG-App-Users"], **claims}, SECRET, algorithm="HS256")
+
+
+def _verifier(max_lifetime=0.0):
+    verifier = TokenVerifier(secret=SECRET, algorithms="HS256", jwks_url="")
+    verifier.deny_list = DenyList(max_lifetime=max_lifetime)
+    return verifier
+
+
+def _later(monkeypatch, seconds):
+    now = time.time() + seconds
+    monkeypatch.setattr(jwt_auth.time, "time", lambda: now)
+
+
+def test_revoked_token_is_kept_until_its_exp(monkeypatch):
+    verifier = _verifier()
+    exp = time.time() + 4 * 3600
+    token = _token(exp=exp)
+
+    verifier.revoke(token=token)
+    assert verifier.deny_list._entries[token_digest(token)] == pytest.approx(exp)
+
+    # Past the verification cache TTL, the token is still denied
+    _later(monkeypatch, 2 * 3600)
+    verifier.deny_list.add("other")
+    with pytest.raises(JWTError, match="revoked"):
+        verifier.verify(token)
+
+
+def test_jti_is_kept_for_the_longest_token_lifetime(monkeypatch):
+    verifier = _verifier(max_lifetime=24 * 3600)
+    verifier.revoke(jti="abc")
+
+    _later(monkeypatch, 23 * 3600)
+    verifier.deny_list.add("other")
+    with pytest.raises(JWTError, match="revoked"):
+        verifier.verify(_token(jti="abc", exp=time.time() + 3600))
+
+    _later(monkeypatch, 25 * 3600)
+    verifier.deny_list.add("other")
+    assert "abc" not in verifier.deny_list
+
+
+def test_jti_without_lifetime_is_kept_until_cleared(monkeypatch):
+    verifier = _verifier()
+    verifier.revoke(jti="abc")
+
+    _later(monkeypatch, 365 * 24 * 3600)
+    verifier.deny_list.add("other")
+    assert "abc" in verifier.deny_list
+
+    verifier.clear_revocation(jti="abc")
+    assert "abc" not in verifier.deny_list
+
+
+def test_explicit_expiry_wins():
+    verifier = _verifier(max_lifetime=24 * 3600)
+    token = _token(exp=time.time() + 3600)
+    expires_at = time.time() + 60
+
+    verifier.revoke(token=token, expires_at=expires_at)
+    assert verifier.deny_list._entries[token_digest(token)] == expires_at
+
+
+def test_unrevoked_token_is_accepted():
+    verifier = _verifier()
+    token = _token(exp=time.time() + 3600, jti="abc")
+    assert verifier.verify(token)["sub"] == "u"
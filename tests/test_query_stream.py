@@ -0,0 +1,107 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+import app.api.query as query_api
+from app.main import app
+from app.query.answer_cache import AnswerCache
+from app.query.sessions import MemorySessionStore
+from app.security.jwt_auth import verify_jwt
+
+RETRIEVED = [
+    (Document(id="c1", page_content="Staff get 25 days of leave.", metadata={"source_file": "leave.pdf"}), 0.2),
+]
+
+
+class StubChain:
+    def __init__(self, parts, fail_after=None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def astream(self, prompt):
+        self.calls += 1
+        for position, part in enumerate(self.parts):
+            if position == self.fail_after:
+                raise RuntimeError("LLM connection lost")
+            yield SimpleNamespace(content=part)
+
+
+class StubRetriever:
+    version = "v1"
+
+    async def aembed_query(self, question):
+        return np.ones(4, dtype=np.float32)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def retrieve(question, user, session, filters):
+        return RETRIEVED
+
+    monkeypatch.setattr(query_api, "_retrieve", retrieve)
+    monkeypatch.setattr(query_api, "get_retriever", lambda: StubRetriever())
+    monkeypatch.setattr(query_api, "answer_cache", AnswerCache())
+    monkeypatch.setattr(query_api, "get_session_store", lambda: MemorySessionStore())
+    app.dependency_overrides[verify_jwt] = lambda: {"sub": "alice", "groups": []}
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _events(client, question="How many leave days do staff get?"):
+    response = client.post("/query/stream", json={"question": question})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_meta_then_tokens_then_done(client, monkeypatch):
+    monkeypatch.setattr(query_api, "rag_chain", StubChain(["Staff get ", "25 days", ""]))
+
+    events = _events(client)
+
+    assert [name for name, _ in events] == ["meta", "token", "token", "done"]
+    meta = events[0][1]
+    assert meta["sources"] == ["leave.pdf"]
+    assert meta["session_id"]
+    assert "".join(data["text"] for name, data in events if name == "token") == "Staff get 25 days"
+
+
+def test_llm_failure_emits_error_without_done(client, monkeypatch):
+    monkeypatch.setattr(query_api, "rag_chain", StubChain(["Staff get ", "25 days"], fail_after=1))
+
+    events = _events(client)
+
+    assert [name for name, _ in events] == ["meta", "token", "error"]
+    assert events[-1][1] == {"detail": "LLM generation failed"}
+
+
+def test_failed_answer_is_not_cached(client, monkeypatch):
+    monkeypatch.setattr(query_api, "rag_chain", StubChain(["Staff get "], fail_after=0))
+    _events(client)
+
+    chain = StubChain(["Staff get 25 days"])
+    monkeypatch.setattr(query_api, "rag_chain", chain)
+    _events(client)
+    assert chain.calls == 1
+
+
+def test_cache_hit_emits_a_single_token(client, monkeypatch):
+    chain = StubChain(["Staff get ", "25 days"])
+    monkeypatch.setattr(query_api, "rag_chain", chain)
+    _events(client)
+
+    events = _events(client)
+
+    assert chain.calls == 1
+    assert [name for name, _ in events] == ["meta", "token", "done"]
+    assert events[1][1] == {"text": "Staff get 25 days"}
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.query.reranker import Reranker
+
+
+class StubCrossEncoder:
+    """
+    Scores a pair by the number in the chunk text ("relevance 7" -> 7),
+    optionally slowly. Records every pair it is asked to score.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = []
+        self._lock = threading.Lock()
+
+    def predict(self, pairs):
+        with self._lock:
+            self.pairs.extend(pairs)
+        time.sleep(self.delay)
+        return np.asarray([float(text.split()[-1]) for _, text in pairs], dtype=np.float32)
+
+
+def _retrieved(*relevance):
+    return [
+        (Document(id=f"c{i}", page_content=f"relevance {score}"), 0.1 * i)
+        for i, score in enumerate(relevance)
+    ]
+
+
+@pytest.fixture
+def make_reranker():
+    rerankers = []
+
+    def make(scorer, **kwargs):
+        reranker = Reranker(scorer, **kwargs)
+        rerankers.append(reranker)
+        return reranker
+
+    yield make
+    for reranker in rerankers:
+        reranker.shutdown()
+
+
+def _ids(results):
+    return [doc.id for doc, _ in results]
+
+
+def test_reorders_by_cross_encoder_score(make_reranker):
+    reranker = make_reranker(StubCrossEncoder(), budget_ms=1000)
+    retrieved = _retrieved(1, 9, 5, 7)
+
+    results = asyncio.run(reranker.arerank("leave policy", retrieved, top_k=3))
+
+    assert _ids(results) == ["c1", "c3", "c2"]
+    # Dense distances are kept for the confidence score
+    assert [distance for _, distance in results] == [0.1, pytest.approx(0.3), 0.2]
+
+
+def test_over_budget_returns_dense_order_truncated(make_reranker):
+    reranker = make_reranker(StubCrossEncoder(delay=0.3), budget_ms=50)
+    retrieved = _retrieved(1, 9, 5, 7)
+
+    start = time.monotonic()
+    results = asyncio.run(reranker.arerank("leave policy", retrieved, top_k=2))
+
+    assert time.monotonic() - start < 0.25
+    assert results == retrieved[:2]
+
+
+def test_budget_is_checked_between_batches(make_reranker):
+    scorer = StubCrossEncoder(delay=0.03)
+    reranker = make_reranker(scorer, budget_ms=40, batch_size=1)
+
+    results = reranker.score("q", [doc for doc, _ in _retrieved(1, 2, 3, 4, 5)], time.monotonic() + 0.04)
+
+    assert results is None
+    assert len(scorer.pairs) < 5
+
+
+def test_repeated_pairs_are_served_from_the_cache(make_reranker):
+    scorer = StubCrossEncoder()
+    reranker = make_reranker(scorer, budget_ms=1000)
+    retrieved = _retrieved(1, 9, 5)
+
+    first = asyncio.run(reranker.arerank("leave policy", retrieved, top_k=3))
+    assert len(scorer.pairs) == 3
+
+    second = asyncio.run(reranker.arerank("leave policy", retrieved, top_k=3))
+    assert len(scorer.pairs) == 3
+    assert _ids(second) == _ids(first)
+
+    # Only the new chunk, and the same chunks for a new question, are scored
+    extra = (Document(id="c9", page_content="relevance 4"), 0.5)
+    asyncio.run(reranker.arerank("leave policy", retrieved + [extra], top_k=3))
+    assert len(scorer.pairs) == 4
+    asyncio.run(reranker.arerank("travel policy", retrieved, top_k=3))
+    assert len(scorer.pairs) == 7
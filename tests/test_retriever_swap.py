@@ -0,0 +1,88 @@
+import json
+import time
+
+import pytest
+
+from app.core.vector_store import INDEX_FILE, MANIFEST_FILE, resolve_vectorstore_version
+from app.query.retriever import RetrieverService
+from tests.fake_index import publish_version, use_hash_embeddings
+
+OLD_DOCS = [("old-1", "leave policy for staff", {}), ("old-2", "travel policy for staff", {})]
+NEW_DOCS = [("new-1", "leave policy for staff, revised", {})]
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    use_hash_embeddings(monkeypatch)
+    publish_version(tmp_path, OLD_DOCS)
+    service = RetrieverService(tmp_path)
+    service.load()
+    yield service
+    service.shutdown()
+
+
+def _ids(service):
+    return sorted(doc.id for doc, _ in service.search("leave policy", top_k=5))
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_search_on_the_old_snapshot_completes_after_the_swap(service):
+    with service.snapshot() as old:
+        publish_version(service.vectorstore_path, NEW_DOCS)
+        assert service.reload()
+        assert service.version != old.version
+
+        # The pinned snapshot still answers from the old version
+        _, rows = old.index.search(service.embed_queries(["leave policy"]), 2)
+        assert sorted(old.chunks.chunk_id(int(row)) for row in rows[0]) == ["old-1", "old-2"]
+
+    assert _ids(service) == ["new-1"]
+
+
+def test_old_snapshot_is_released_when_its_last_reader_finishes(service):
+    with service.snapshot() as old:
+        old.acquire()  # a second in-flight query
+        publish_version(service.vectorstore_path, NEW_DOCS)
+        service.reload()
+
+    # One reader left: the drain thread keeps waiting
+    assert not _wait_for(lambda: old.index is None, timeout=0.2)
+    assert old.chunks is not None
+
+    old.release()
+    assert _wait_for(lambda: old.index is None)
+    assert old.chunks is None
+
+
+def test_corrupt_version_leaves_the_current_one_serving(service):
+    version = service.version
+    publish_version(service.vectorstore_path, NEW_DOCS)
+    _, path = resolve_vectorstore_version(service.vectorstore_path)
+    (path / INDEX_FILE).write_bytes(b"not a faiss index")
+
+    with pytest.raises(RuntimeError):
+        service.reload()
+
+    assert service.version == version
+    assert _ids(service) == ["old-1", "old-2"]
+
+
+def test_missing_version_leaves_the_current_one_serving(service):
+    version = service.version
+    manifest_path = service.vectorstore_path / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest.update(version="gone", path="versions/gone")
+    manifest_path.write_text(json.dumps(manifest))
+
+    with pytest.raises(FileNotFoundError):
+        service.reload()
+
+    assert service.version == version
+    assert service.ready
+    assert _ids(service) == ["old-1", "old-2"]
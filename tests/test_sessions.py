@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import app.api.query as query_api
+from app.query import sessions as sessions_module
+from app.query.sessions import (
+    MemorySessionStore,
+    Session,
+    SqlSessionStore,
+    append_turn,
+)
+from app.schemas.query import ChatMessage, QueryRequest
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore(ttl_seconds=60)
+    return SqlSessionStore(f"sqlite:///{tmp_path / 'sessions.sqlite'}", ttl_seconds=60)
+
+
+def _later(monkeypatch, seconds):
+    now = sessions_module.time.time() + seconds
+    monkeypatch.setattr(sessions_module.time, "time", lambda: now)
+
+
+def test_round_trip(store):
+    session = store.create("alice")
+    append_turn(session, "What is the leave policy?", "25 days a year.")
+    session.state["topic"] = "What is the leave policy?"
+    store.save(session)
+
+    loaded = store.get(session.id)
+    assert loaded.user == "alice"
+    assert [(msg.role, msg.content) for msg in loaded.messages] == [
+        ("user", "What is the leave policy?"),
+        ("assistant", "25 days a year."),
+    ]
+    assert loaded.state == {"topic": "What is the leave policy?"}
+
+    # Callers get their own copy
+    loaded.messages.clear()
+    assert len(store.get(session.id).messages) == 2
+
+
+def test_unknown_and_expired_sessions(store, monkeypatch):
+    assert store.get("missing") is None
+
+    session = store.create("alice")
+    store.save(session)
+    _later(monkeypatch, 61)
+    assert store.get(session.id) is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    first, second, third = (store.create("alice") for _ in range(3))
+    store.save(first)
+    store.save(second)
+    store.get(first.id)
+    store.save(third)
+
+    assert store.get(second.id) is None
+    assert store.get(first.id) is not None
+    assert store.get(third.id) is not None
+
+
+def test_old_turns_are_summarized_past_the_history_limit():
+    session = Session("s", "alice")
+    for turn in range(4):
+        append_turn(
+            session,
+            f"Question {turn}? With more words.",
+            f"Answer {turn}. More detail.",
+            recent_messages=4,
+        )
+
+    assert len(session.messages) == 4
+    assert session.messages[0].content == "Question 2? With more words."
+    assert session.summary.split("\n") == [
+        "User: Question 0?",
+        "Assistant: Answer 0.",
+        "User: Question 1?",
+        "Assistant: Answer 1.",
+    ]
+
+
+def _open(monkeypatch, store, user, **request):
+    monkeypatch.setattr(query_api, "get_session_store", lambda: store)
+    return asyncio.run(query_api._open_session(QueryRequest(question="q", **request), user))
+
+
+def test_other_users_session_is_never_returned(monkeypatch):
+    store = MemorySessionStore()
+    session = store.create("alice")
+    append_turn(session, "What is my salary band?", "Band 4.")
+    store.save(session)
+
+    assert _open(monkeypatch, store, "alice", session_id=session.id).messages
+
+    opened = _open(monkeypatch, store, "mallory", session_id=session.id)
+    assert opened.id != session.id
+    assert opened.user == "mallory"
+    assert opened.messages == []
+
+
+def test_chat_history_without_session_id_stays_stateless(monkeypatch):
+    store = MemorySessionStore()
+    history = [ChatMessage(role="user", content="hi"), ChatMessage(role="assistant", content="hello")]
+
+    session = _open(monkeypatch, store, "alice", chat_history=history)
+    assert session.id is None
+    assert session.messages == history
+
+    asyncio.run(query_api._record_turn(session, "q", "a"))
+    assert store._sessions == {}
@@ -0,0 +1,16 @@
+from app.query import token_budget
+from app.query.token_budget import count_tokens
+
+
+def test_only_short_texts_are_memoized():
+    token_budget._count_tokens_cached.cache_clear()
+    chunk = "leave policy " * 20
+    prompt = "x" * (token_budget.PROMPT_TOKEN_CACHE_MAX_CHARS + 1)
+
+    assert count_tokens(chunk) == count_tokens(chunk)
+    assert count_tokens(prompt) > 0
+    assert count_tokens(chunk + "!", memoize=False) > 0
+
+    info = token_budget._count_tokens_cached.cache_info()
+    assert info.currsize == 1
+    assert info.hits == 1
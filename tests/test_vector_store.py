@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import app.core.vector_store as vector_store
+from app.core.bm25_index import BM25Index
+from app.core.chunk_store import ChunkStore
+from app.core.filter_index import FilterIndex
+from tests.fake_embeddings import HashEmbeddings
+
+
+@pytest.fixture(autouse=True)
+def fake_embedder(monkeypatch):
+    monkeypatch.setattr(vector_store, "create_embedder", lambda *a, **k: HashEmbeddings())
+    monkeypatch.setattr(vector_store, "get_ingestion_embedder", lambda name, embedder: embedder)
+
+
+def _chunks(n):
+    return [
+        (f"c{i}", Document(
+            page_content=f"chunk {i} about {'travel' if i % 2 else 'leave'}",
+            metadata={"department": "hr" if i % 2 else "it", "source_file": f"f{i % 3}.txt"},
+        ))
+        for i in range(n)
+    ]
+
+
+def test_streams_rows_into_every_index_file(tmp_path):
+    writer = vector_store.build_faiss_vectorstore(iter(_chunks(10)), tmp_path, batch_size=3)
+    writer.set_metadata(0, {**writer.metadata(0), "source_files": ["f0.txt", "f9.txt"]})
+    assert writer.close() == 10
+
+    chunks = ChunkStore(tmp_path)
+    assert [chunks.chunk_id(row) for row in range(10)] == [f"c{i}" for i in range(10)]
+    assert chunks.metadata(0)["source_files"] == ["f0.txt", "f9.txt"]
+
+    rows, _ = BM25Index(tmp_path).search("travel", top_k=10)
+    assert sorted(rows.tolist()) == [1, 3, 5, 7, 9]
+    assert FilterIndex(tmp_path).row_filter({"department": ["hr"]}).count == 5
+    assert vector_store.faiss.read_index(str(tmp_path / vector_store.INDEX_FILE)).ntotal == 10
+
+
+def test_trained_index_keeps_rows_and_vectors_aligned(tmp_path):
+    writer = vector_store.build_faiss_vectorstore(
+        iter(_chunks(40)), tmp_path, batch_size=7, index_spec="IVF2,Flat", train_size=10
+    )
+    writer.close()
+
+    index = vector_store.faiss.read_index(str(tmp_path / vector_store.INDEX_FILE))
+    chunks = ChunkStore(tmp_path)
+    index.nprobe = 2
+    for row in (0, 17, 39):
+        query = HashEmbeddings().embed_query(chunks.text(row))
+        _, found = index.search(np.asarray([query], dtype=np.float32), 1)
+        assert HashEmbeddings().embed_query(chunks.text(int(found[0][0]))) == query
+
+
+def test_update_copies_published_rows_without_stale_ones(tmp_path):
+    source = tmp_path / "v1"
+    vector_store.build_faiss_vectorstore(iter(_chunks(6)), source).close()
+
+    writer = vector_store.open_vectorstore_update(source, tmp_path / "v2", {"c1", "c4"})
+    added = vector_store.add_chunks_to_index(writer, iter(_chunks(8)[6:]), HashEmbeddings())
+    assert added == 2
+    assert writer.close() == 6
+
+    chunks = ChunkStore(tmp_path / "v2")
+    assert [chunks.chunk_id(row) for row in range(6)] == ["c0", "c2", "c3", "c5", "c6", "c7"]
+    assert vector_store.faiss.read_index(str(tmp_path / "v2" / vector_store.INDEX_FILE)).ntotal == 6
+
+
+def test_training_sample_spans_the_whole_corpus():
+    stream = np.arange(10000, dtype=np.float32).reshape(-1, 1)
+    sample = np.empty((200, 1), dtype=np.float32)
+    rng = np.random.default_rng(0)
+
+    seen = 0
+    for start in range(0, len(stream), 256):
+        seen = vector_store._reservoir_update(sample, seen, stream[start:start + 256], rng)
+
+    assert seen == 10000
+    assert len(np.unique(sample)) == 200
+    assert 4000 < sample.mean() < 6000
+    assert (sample >= 9000).sum() > 5
+
+
+def test_training_scratch_file_is_removed(tmp_path):
+    writer = vector_store.build_faiss_vectorstore(
+        iter(_chunks(30)), tmp_path, batch_size=7, index_spec="SQ8", train_size=10
+    )
+    assert writer.close() == 30
+    assert not (tmp_path / vector_store.TRAIN_SPILL_FILE).exists()